@@ -0,0 +1,431 @@
+"""
+Índice aproximado (IVF) para recuperar los top-N candidatos.
+
+Los embeddings persistidos en la matriz compartida se agrupan con k-means
+esférico en ~sqrt(N) listas. Una consulta solo compara contra los vectores
+de las `nprobe` listas más cercanas, así que su coste deja de crecer
+linealmente con el corpus. `nprobe` es la perilla recall/latencia: más listas,
+más recall y más tiempo. Las inserciones y bajas son incrementales (se
+agregan al final de un archivo binario compartido por los workers) y el
+entrenamiento corre en segundo plano en un solo worker; hasta que termina,
+se responde con la búsqueda exacta.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+try:
+    from projectAron.embedding_matrix import (MATRIX_GRACE_SECONDS, _FileLock, candidate_rows,
+                                              candidate_embeddings, get_embedding_matrix)
+    from projectAron.embedding_store import encode_with_store, text_hash
+except ImportError:
+    from embedding_matrix import (MATRIX_GRACE_SECONDS, _FileLock, candidate_rows,
+                                  candidate_embeddings, get_embedding_matrix)
+    from embedding_store import encode_with_store, text_hash
+
+
+ANN_NPROBE = int(os.environ.get('ARON_ANN_NPROBE', 8))
+# Con menos candidatos que esto la búsqueda exacta es igual de rápida
+ANN_MIN_ROWS = int(os.environ.get('ARON_ANN_MIN_ROWS', 5000))
+# Se reentrena cuando el índice crece este factor respecto al entrenamiento
+ANN_RETRAIN_GROWTH = float(os.environ.get('ARON_ANN_RETRAIN_GROWTH', 4))
+# Textos codificados entre dos rankings provisionales (ver streamed_top_n)
+STREAM_CHUNK = int(os.environ.get('ARON_STREAM_CHUNK', 64))
+
+# Registro de asignación: sha256 del texto (id de fila) y lista, o -1 si se dio de baja
+_RECORD = np.dtype([('id', 'V32'), ('list', '<i4')])
+_GENERATION_FILES = ('.npy', '.json', '.assign')
+
+
+def _normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def spherical_kmeans(vectors, nlist, iterations=10, seed=0):
+    """k-means sobre vectores normalizados usando similitud de coseno"""
+    rng = np.random.default_rng(seed)
+    vectors = _normalize_rows(vectors)
+    centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for list_no in range(nlist):
+            members = vectors[assignment == list_no]
+            if len(members):
+                centroids[list_no] = members.sum(axis=0)
+            else:
+                # Lista vacía: se reinicia con un punto al azar
+                centroids[list_no] = vectors[rng.integers(len(vectors))]
+        centroids = _normalize_rows(centroids)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Índice IVF sobre una EmbeddingMatrix, con listas de ids por centroide.
+
+    Cada entrenamiento publica una generación (`<gen>.npy` con los centroides,
+    `<gen>.json` con sus metadatos y `<gen>.assign` con las asignaciones) y
+    la activa reemplazando CURRENT. Las altas y bajas posteriores se agregan
+    al final de `<gen>.assign` como registros binarios de tamaño fijo; cada
+    worker lee solo los registros nuevos desde su última lectura.
+    """
+
+    def __init__(self, matrix, directory=None):
+        self.matrix = matrix
+        self.directory = directory or os.path.join(matrix.directory, 'ivf')
+        os.makedirs(self.directory, exist_ok=True)
+        self._current_path = os.path.join(self.directory, 'CURRENT')
+        self.centroids = None
+        self._lists = []
+        self._assignment = {}
+        self._trained_rows = 0
+        self._generation = None
+        self._current_stamp = None
+        self._offset = 0
+        # (generación, filas) de la matriz en la última sincronización completa
+        self._synced = None
+        self._training = None
+        self._lock = threading.RLock()
+        self.refresh()
+
+    # -- persistencia -----------------------------------------------------
+
+    def refresh(self):
+        """Carga la generación activa si cambió y aplica las asignaciones nuevas"""
+        try:
+            stat = os.stat(self._current_path)
+        except OSError:
+            return
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            if stamp != self._current_stamp:
+                with open(self._current_path) as f:
+                    generation = f.read().strip()
+                if generation and generation != self._generation:
+                    try:
+                        self._load(generation)
+                    except (OSError, ValueError) as e:
+                        print(f"No se pudo cargar el índice IVF {generation}: {e}")
+                        return
+                self._current_stamp = stamp
+            if self._generation is not None:
+                self._read_records()
+
+    def _load(self, generation):
+        base = os.path.join(self.directory, generation)
+        centroids = np.load(base + '.npy')
+        with open(base + '.json') as f:
+            meta = json.load(f)
+        self.centroids = centroids
+        self._trained_rows = meta.get('trained_rows', 0)
+        self._lists = [set() for _ in range(len(centroids))]
+        self._assignment = {}
+        self._offset = 0
+        self._synced = None
+        self._generation = generation
+
+    def _read_records(self):
+        path = os.path.join(self.directory, self._generation + '.assign')
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        count = (size - self._offset) // _RECORD.itemsize
+        if count <= 0:
+            return
+        records = np.fromfile(path, dtype=_RECORD, count=count, offset=self._offset)
+        self._offset += count * _RECORD.itemsize
+        for digest, list_no in zip(records['id'].tolist(), records['list'].tolist()):
+            row_id = digest.hex()
+            previous = self._assignment.pop(row_id, None)
+            if previous is not None:
+                self._lists[previous].discard(row_id)
+            if list_no >= 0:
+                self._assignment[row_id] = list_no
+                self._lists[list_no].add(row_id)
+
+    def _append_records(self, row_ids, list_nos):
+        """Agrega registros a la generación activa; requiere el cerrojo de escritura"""
+        if not row_ids:
+            return
+        records = np.empty(len(row_ids), dtype=_RECORD)
+        records['id'] = [bytes.fromhex(row_id) for row_id in row_ids]
+        records['list'] = list_nos
+        with open(os.path.join(self.directory, self._generation + '.assign'), 'r+b') as f:
+            # Descarta un registro a medio escribir por un worker interrumpido
+            end = f.seek(0, os.SEEK_END)
+            f.truncate(end - end % _RECORD.itemsize)
+            f.seek(0, os.SEEK_END)
+            f.write(records.tobytes())
+            f.flush()
+        self._read_records()
+
+    def _write_lock(self):
+        return _FileLock(os.path.join(self.directory, '.lock'))
+
+    # -- mantenimiento ----------------------------------------------------
+
+    def __len__(self):
+        return len(self._assignment)
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def train(self, iterations=10, max_sample=50000):
+        """
+        Entrena centroides con la matriz actual, asigna todas las filas y
+        publica el resultado como generación nueva. Solo un worker entrena a
+        la vez: si otro ya lo está haciendo, no hace nada.
+        """
+        with _FileLock(os.path.join(self.directory, 'train.lock'), blocking=False) as lock:
+            if not lock.acquired:
+                return
+            _, _, ids, vectors = self.matrix.snapshot()
+            if not len(ids):
+                return
+            start = time.time()
+            nlist = max(1, int(np.sqrt(len(ids))))
+            sample = vectors
+            if len(ids) > max_sample:
+                rows = np.sort(np.random.default_rng(0).choice(len(ids), size=max_sample, replace=False))
+                sample = vectors[rows]
+            centroids = spherical_kmeans(np.asarray(sample), nlist, iterations)
+            records = np.empty(len(ids), dtype=_RECORD)
+            records['id'] = [bytes.fromhex(row_id) for row_id in ids]
+            for offset in range(0, len(ids), 4096):
+                chunk = _normalize_rows(vectors[offset:offset + 4096])
+                records['list'][offset:offset + 4096] = np.argmax(chunk @ centroids.T, axis=1)
+
+            generation = f"gen-{time.time_ns()}-{os.getpid()}"
+            base = os.path.join(self.directory, generation)
+            with open(base + '.npy', 'wb') as f:
+                np.save(f, centroids)
+            with open(base + '.json', 'w') as f:
+                json.dump({'trained_rows': len(ids)}, f)
+            with open(base + '.assign', 'wb') as f:
+                f.write(records.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            with self._write_lock():
+                previous = self._generation
+                fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+                with os.fdopen(fd, 'w') as f:
+                    f.write(generation)
+                os.replace(temp_path, self._current_path)
+                if previous is not None:
+                    for ext in _GENERATION_FILES:
+                        try:
+                            os.utime(os.path.join(self.directory, previous + ext))
+                        except OSError:
+                            pass
+            self.refresh()
+            self._cleanup(current=generation)
+            print(f"Índice IVF entrenado: {len(ids)} filas, {nlist} listas en {time.time() - start:.1f}s")
+
+    def train_in_background(self):
+        """Lanza el entrenamiento en un hilo; mientras tanto se usa el índice anterior o la búsqueda exacta"""
+        with self._lock:
+            if self._training is not None and self._training.is_alive():
+                return
+            self._training = threading.Thread(target=self._train_safely, name='aron-ivf-train', daemon=True)
+            self._training.start()
+
+    def _train_safely(self):
+        try:
+            self.train()
+        except Exception as e:
+            print(f"Error entrenando el índice IVF: {e}")
+
+    def _cleanup(self, current, grace=MATRIX_GRACE_SECONDS):
+        """Borra generaciones reemplazadas hace más de `grace` segundos"""
+        now = time.time()
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if ext in _GENERATION_FILES and stem.startswith('gen-') and stem != current:
+                path = os.path.join(self.directory, name)
+                try:
+                    if now - os.stat(path).st_mtime > grace:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def add(self, ids, vectors):
+        """Inserta (o reubica) filas sin reentrenar"""
+        ids = list(ids)
+        with self._lock, self._write_lock():
+            self.refresh()
+            if self.centroids is None:
+                return
+            vectors = np.asarray(vectors, dtype=np.float32)
+            changed_ids, list_nos = [], []
+            for offset in range(0, len(ids), 4096):
+                chunk = _normalize_rows(vectors[offset:offset + 4096])
+                nearest = np.argmax(chunk @ self.centroids.T, axis=1)
+                for row_id, list_no in zip(ids[offset:offset + 4096], nearest.tolist()):
+                    # Otro worker pudo haberla agregado ya
+                    if self._assignment.get(row_id) != list_no:
+                        changed_ids.append(row_id)
+                        list_nos.append(list_no)
+            self._append_records(changed_ids, list_nos)
+
+    def remove(self, ids):
+        """Da de baja filas del índice"""
+        with self._lock, self._write_lock():
+            self.refresh()
+            if self.centroids is None:
+                return
+            gone = [row_id for row_id in dict.fromkeys(ids) if row_id in self._assignment]
+            self._append_records(gone, [-1] * len(gone))
+
+    def sync(self):
+        """
+        Agrega al índice las filas nuevas de la matriz. Si no hay índice o la
+        matriz creció mucho desde el entrenamiento, entrena en segundo plano.
+        Si la matriz no cambió desde la última sincronización no hace nada.
+        """
+        with self._lock:
+            self.refresh()
+            generation, rows, ids, _ = self.matrix.snapshot()
+            if self.centroids is None or rows > self._trained_rows * ANN_RETRAIN_GROWTH:
+                self.train_in_background()
+                if self.centroids is None:
+                    return
+            if self._synced == (generation, rows):
+                return
+            # Filas que salieron de la matriz al compactarla
+            current = set(ids)
+            gone = [row_id for row_id in self._assignment if row_id not in current]
+            if gone:
+                self.remove(gone)
+            new_ids = [row_id for row_id in ids if row_id not in self._assignment]
+            if new_ids:
+                vectors, _ = self.matrix.gather(new_ids)
+                if vectors is None:
+                    # La matriz cambió entre medio: se reintenta en la próxima consulta
+                    return
+                self.add(new_ids, vectors)
+            self._synced = (generation, rows)
+
+    # -- consulta ---------------------------------------------------------
+
+    def search(self, query, k, allowed_ids=None, nprobe=ANN_NPROBE):
+        """
+        Devuelve hasta k pares (id, similitud coseno) ordenados de mayor a
+        menor, mirando solo las `nprobe` listas más cercanas a la consulta.
+        """
+        self.refresh()
+        with self._lock:
+            if self.centroids is None:
+                return []
+            query = _normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+            nprobe = max(1, min(nprobe, len(self.centroids)))
+            probed = np.argsort(-(self.centroids @ query))[:nprobe]
+            candidates = set()
+            for list_no in probed.tolist():
+                candidates |= self._lists[list_no]
+        if allowed_ids is not None:
+            candidates &= allowed_ids
+        if not candidates:
+            return []
+        candidates = list(candidates)
+        vectors, _ = self.matrix.gather(candidates)
+        if vectors is None:
+            return []
+        return _top_k(candidates, _normalize_rows(vectors) @ query, k)
+
+
+def _top_k(ids, scores, k):
+    k = min(k, len(ids))
+    if k <= 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(ids[i], float(scores[i])) for i in top]
+
+
+def exact_search(vectors, query, k):
+    """Búsqueda exacta por coseno; devuelve [(posición, similitud)]"""
+    query = _normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+    scores = _normalize_rows(vectors) @ query
+    return _top_k(list(range(len(scores))), scores, k)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_ann_index(matrix):
+    """Índice IVF del proceso para una matriz de embeddings"""
+    with _indexes_lock:
+        if matrix.directory not in _indexes:
+            _indexes[matrix.directory] = IVFIndex(matrix)
+        return _indexes[matrix.directory]
+
+
+def top_n_candidates(model, model_name, texts, query_embedding, top_n, nprobe=ANN_NPROBE):
+    """
+    Devuelve [(posición en texts, similitud)] de los top_n textos más
+    parecidos a la consulta. Con pocos candidatos, mientras el índice se
+    entrena o si no llega a top_n resultados, se usa la búsqueda exacta.
+    """
+    matrix, row_ids = candidate_rows(model, model_name, texts)
+    positions_by_id = {}
+    for position, row_id in enumerate(row_ids):
+        positions_by_id.setdefault(row_id, []).append(position)
+
+    index = get_ann_index(matrix) if len(positions_by_id) >= ANN_MIN_ROWS else None
+    if index is not None:
+        index.sync()
+        if not index.trained:
+            print("El índice IVF se está entrenando, usando búsqueda exacta")
+    if index is not None and index.trained:
+        start = time.time()
+        found = index.search(query_embedding, top_n, allowed_ids=set(positions_by_id), nprobe=nprobe)
+        results = [(position, score) for row_id, score in found for position in positions_by_id[row_id]][:top_n]
+        if len(results) >= min(top_n, len(row_ids)):
+            print(f"Top-{top_n} por IVF (nprobe={nprobe}) en {(time.time() - start) * 1000:.0f} ms")
+            return results
+        print("El índice IVF no devolvió suficientes candidatos, usando búsqueda exacta")
+
+    vectors, _ = matrix.gather(row_ids)
+    if vectors is None:
+        vectors, _ = candidate_embeddings(model, model_name, texts)
+    return exact_search(vectors, query_embedding, top_n)
+
+
+def streamed_top_n(model, model_name, texts, query_embedding, top_n, on_partial, chunk_size=None):
+    """
+    Como top_n_candidates, pero codifica los textos por tramos y llama a
+    `on_partial(top, codificados, total)` con el top-N provisional después de
+    cada tramo. Si todos los textos ya están en la matriz no hay nada que
+    esperar y se delega en top_n_candidates.
+    """
+    matrix = get_embedding_matrix(model_name, getattr(model, 'max_seq_length', 0))
+    missing = sum(row is None for row in matrix.rows_for([text_hash(text) for text in texts]))
+    if not missing:
+        return top_n_candidates(model, model_name, texts, query_embedding, top_n)
+
+    chunk_size = max(1, chunk_size or STREAM_CHUNK)
+    query = _normalize_rows(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+    scores = np.empty(len(texts), dtype=np.float32)
+    top = []
+    for start in range(0, len(texts), chunk_size):
+        # El almacén guarda cada tramo; la matriz se amplía una sola vez al final
+        chunk = texts[start:start + chunk_size]
+        scores[start:start + len(chunk)] = _normalize_rows(encode_with_store(model, model_name, chunk)) @ query
+        done = start + len(chunk)
+        top = _top_k(list(range(done)), scores[:done], top_n)
+        on_partial(top, done, len(texts))
+
+    # Los vectores ya están en el almacén: esto solo agrega las filas nuevas
+    candidate_rows(model, model_name, texts)
+    return top
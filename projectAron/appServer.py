@@ -1,5 +1,6 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash
-from codigoARONconIA import get_candidates, create_new_sheet, get_all_sheets
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, session, flash
+from codigoARONconIA import run_search, run_batch_matching, find_jobs_for_candidate, get_sheets_metadata
+from jobs import get_job_manager, JobLimitError, open_event_stream
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -118,18 +119,23 @@ def google_auth_callback():
 @login_required
 def get_sheets(spreadsheet_name):
     try:
-        # Utilizar tu función get_all_sheets para obtener las hojas
-        sheet_names = get_all_sheets(spreadsheet_name)
+        # Hojas desde la cache de metadatos (TTL + revalidación con Drive)
+        metadata = get_sheets_metadata(spreadsheet_name)
+        sheet_names = metadata["sheets"]
         
         if not sheet_names:
             return jsonify({"error": "No sheets found or access error."}), 400
         
-        return jsonify({"sheets": sheet_names})
+        # ETag para que el navegador revalide con If-None-Match (304 si no cambió)
+        response = jsonify({"sheets": sheet_names})
+        response.set_etag(metadata["etag"])
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
     
     except Exception as e:
         return jsonify({"error": f"Error al obtener las hojas: {str(e)}"}), 500
 
-# Ruta para obtener candidatos (protegida)
+# Ruta para obtener candidatos (protegida): encola la búsqueda y devuelve el id del trabajo
 @app.route('/get_candidates', methods=['POST'])
 @login_required
 def get_candidates_route():
@@ -138,15 +144,98 @@ def get_candidates_route():
     sheet_names = request.form.getlist('sheet_names')
     top_n = int(request.form.get('top_n'))
     job_description = request.form.get('job_description')
+    scoring_mode = request.form.get('scoring_mode')  # opcional: "dense" o "cascade"
 
-    # Llamar a la función get_candidates con los parámetros proporcionados
+    # La búsqueda corre en segundo plano; el cliente consulta /jobs/<id>
     try:
-        candidates = get_candidates(spreadsheet_name, sheet_names, job_description, top_n)
-        new_sheet_url = create_new_sheet(spreadsheet_name, candidates)
-        return jsonify({"url": new_sheet_url})
+        job = get_job_manager().submit(session['user'], run_search, spreadsheet_name, sheet_names,
+                                       job_description, top_n, scoring_mode)
+    except JobLimitError as e:
+        return jsonify({"error": str(e)}), 429
+    return jsonify({"job_id": job.id, "status_url": url_for('job_status', job_id=job.id),
+                    "stream_url": url_for('job_stream', job_id=job.id),
+                    "cancel_url": url_for('job_cancel', job_id=job.id)}), 202
+
+# Búsqueda inversa (protegida): puestos más afines a un candidato (E-mail o idResume).
+# Usa embeddings ya calculados, así que responde en la misma petición
+@app.route('/candidate_jobs', methods=['GET'])
+@login_required
+def candidate_jobs_route():
+    spreadsheet_name = request.args.get('spreadsheet_name')
+    candidate = request.args.get('candidate')
+    top_n = int(request.args.get('top_n', 5))
+    if not spreadsheet_name or not candidate:
+        return jsonify({"error": "Se requieren spreadsheet_name y candidate"}), 400
+
+    try:
+        return jsonify(find_jobs_for_candidate(spreadsheet_name, candidate, top_n))
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
+        print(f"Error en la búsqueda inversa: {e}")
         return jsonify({"error": str(e)}), 500
 
+# Búsqueda por lotes (protegida): todos los puestos de la columna JOB DESCRIPTION,
+# una pestaña de resultados por puesto; corre como trabajo igual que /get_candidates
+@app.route('/batch_match', methods=['POST'])
+@login_required
+def batch_match_route():
+    spreadsheet_name = request.form.get('spreadsheet_name')
+    sheet_names = request.form.getlist('sheet_names')
+    top_n = int(request.form.get('top_n'))
+
+    try:
+        job = get_job_manager().submit(session['user'], run_batch_matching, spreadsheet_name, sheet_names, top_n)
+    except JobLimitError as e:
+        return jsonify({"error": str(e)}), 429
+    return jsonify({"job_id": job.id, "status_url": url_for('job_status', job_id=job.id),
+                    "stream_url": url_for('job_stream', job_id=job.id),
+                    "cancel_url": url_for('job_cancel', job_id=job.id)}), 202
+
+# Estado de un trabajo de búsqueda: etapa, progreso y URL del resultado al terminar
+@app.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    job = get_job_manager().get(job_id, session['user'])
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+# Eventos del trabajo (Server-Sent Events): etapas, top-N provisional y resultado
+@app.route('/jobs/<job_id>/stream', methods=['GET'])
+@login_required
+def job_stream(job_id):
+    job = get_job_manager().get(job_id, session['user'])
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    stream = open_event_stream(job)
+    if stream is None:
+        # Sin cupo para otro stream: el cliente consulta el estado
+        return jsonify({"error": "Too many open streams"}), 503, {'Retry-After': '5'}
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Cancelar una búsqueda en curso: se detiene en su próxima etapa
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def job_cancel(job_id):
+    manager = get_job_manager()
+    job = manager.get(job_id, session['user'])
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    # Si otros usuarios siguen la misma búsqueda, solo se deja de seguirla
+    cancelled = manager.cancel(job, session['user'])
+    return jsonify({"id": job.id, "cancelled": cancelled}), 202
+
+# Estado del worker: modelo cargado, tiempo de carga y memoria
+@app.route('/health')
+def health_check():
+    try:
+        from projectAron.model_manager import model_stats
+    except ImportError:
+        from model_manager import model_stats
+    return jsonify({"status": "ok", "models": model_stats()})
+
 def refresh_credentials(credentials):
     """ Refresca las credenciales utilizando el refresh_token """
     if credentials and credentials.expired and credentials.refresh_token:
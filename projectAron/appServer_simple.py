@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, session
 import os
 import json
 import secrets
@@ -67,7 +67,7 @@ def logout():
 def get_sheets(spreadsheet_name):
     try:
         # Import here to avoid initial load issues
-        from projectAron.codigoARON_simple import get_all_sheets
+        from projectAron.codigoARON_simple import get_sheets_metadata
         
         # Print debugging information - this will show in Heroku logs
         app.logger.info(f"Fetching sheets for spreadsheet: {spreadsheet_name}")
@@ -98,27 +98,45 @@ def get_sheets(spreadsheet_name):
             spreadsheet_name = "1EqsYq50pfSoZ5YM4AHKvqEUWT18CzCdgol6mWtRPTfU"
             app.logger.info(f"Using ARONDB spreadsheet ID: {spreadsheet_name}")
             
-        # Utilizar la función get_all_sheets para obtener las hojas
-        sheet_names = get_all_sheets(spreadsheet_name)
+        # Sheets from the metadata cache (TTL + Drive modifiedTime revalidation)
+        metadata = get_sheets_metadata(spreadsheet_name)
+        sheet_names = metadata["sheets"]
         
         app.logger.info(f"Found sheets: {sheet_names}")
         
         if not sheet_names:
             return jsonify({"error": "No sheets found or access error."}), 400
         
-        return jsonify({"sheets": sheet_names})
+        # ETag lets the browser revalidate with If-None-Match (304 when unchanged)
+        response = jsonify({"sheets": sheet_names})
+        response.set_etag(metadata["etag"])
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
     
     except Exception as e:
         app.logger.error(f"Error getting sheets: {str(e)}")
         app.logger.error(traceback.format_exc())
         return jsonify({"error": f"Error al obtener las hojas: {str(e)}"}), 500
 
-# Ruta para obtener candidatos
+def _job_owner(create=False):
+    """
+    Jobs belong to the logged-in user or, without a login, to a random token
+    kept in the session cookie (set on the first submit). The client address
+    is not used: behind the Heroku router every request comes from it.
+    """
+    if session.get('user'):
+        return session['user']
+    if create and 'job_owner' not in session:
+        session['job_owner'] = secrets.token_urlsafe(16)
+    return session.get('job_owner')
+
+# Ruta para obtener candidatos: encola la búsqueda y devuelve el id del trabajo
 @app.route('/get_candidates', methods=['POST'])
 def get_candidates_route():
     try:
         # Import here to avoid initial load issues
-        from projectAron.codigoARON_simple import get_candidates, create_new_sheet
+        from projectAron.codigoARON_simple import run_search
+        from projectAron.jobs import get_job_manager, JobLimitError
         
         # Obtener los datos del formulario
         spreadsheet_name = request.form.get('spreadsheet_name')
@@ -126,10 +144,15 @@ def get_candidates_route():
         top_n = int(request.form.get('top_n'))
         job_description = request.form.get('job_description')
 
-        # Llamar a la función get_candidates con los parámetros proporcionados
-        candidates = get_candidates(spreadsheet_name, sheet_names, job_description, top_n)
-        new_sheet_url = create_new_sheet(spreadsheet_name, candidates)
-        return jsonify({"url": new_sheet_url})
+        # The search runs in the background; the client polls /jobs/<id>
+        try:
+            job = get_job_manager().submit(_job_owner(create=True), run_search, spreadsheet_name, sheet_names,
+                                           job_description, top_n)
+        except JobLimitError as e:
+            return jsonify({"error": str(e)}), 429
+        return jsonify({"job_id": job.id, "status_url": url_for('job_status', job_id=job.id),
+                        "stream_url": url_for('job_stream', job_id=job.id),
+                        "cancel_url": url_for('job_cancel', job_id=job.id)}), 202
     except ImportError as e:
         app.logger.error(f"Import error: {str(e)}")
         app.logger.error(traceback.format_exc())
@@ -139,6 +162,41 @@ def get_candidates_route():
         app.logger.error(traceback.format_exc())
         return jsonify({"error": str(e)}), 500
 
+# Search job status: stage, progress and the result URL once finished
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    from projectAron.jobs import get_job_manager
+    job = get_job_manager().get(job_id, _job_owner())
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+# Search job events (Server-Sent Events): stages, provisional top-N and result
+@app.route('/jobs/<job_id>/stream', methods=['GET'])
+def job_stream(job_id):
+    from projectAron.jobs import get_job_manager, open_event_stream
+    job = get_job_manager().get(job_id, _job_owner())
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    stream = open_event_stream(job)
+    if stream is None:
+        # No stream slot left: the client falls back to polling
+        return jsonify({"error": "Too many open streams"}), 503, {'Retry-After': '5'}
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Cancel a running search: it stops at its next stage
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def job_cancel(job_id):
+    from projectAron.jobs import get_job_manager
+    manager = get_job_manager()
+    job = manager.get(job_id, _job_owner())
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    # If other users follow the same search, this only detaches the caller
+    cancelled = manager.cancel(job, _job_owner())
+    return jsonify({"id": job.id, "cancelled": cancelled}), 202
+
 # Health check endpoint
 @app.route('/health')
 def health_check():
@@ -0,0 +1,168 @@
+"""
+Búsqueda por lotes: todos los puestos de la columna JOB DESCRIPTION a la vez.
+
+Se juntan las descripciones distintas de las hojas elegidas, se codifican en
+un solo encode por lotes y se calcula una única matriz puesto×candidato con
+un top-k vectorizado por fila. Cada puesto recibe su propia pestaña de
+resultados ("Matches NN - ..."), así que refrescar todos los puestos abiertos
+cuesta una sola pasada por el corpus. Las pestañas generadas se marcan con
+metadatos de desarrollador (BATCH_METADATA_KEY) y cada corrida borra solo
+esas: una pestaña creada a mano con el mismo prefijo no se toca.
+
+Uso (por ejemplo desde un scheduler nocturno):
+
+    python batch_matching.py ARONDB --sheets "Hoja 1" "Hoja 2" --top-n 10
+"""
+import argparse
+import json
+import os
+import random
+import re
+
+import numpy as np
+
+try:
+    from projectAron.text_store import normalize_text
+    from projectAron.sheet_reader import _quote
+except ImportError:
+    from text_store import normalize_text
+    from sheet_reader import _quote
+
+
+BATCH_TAB_PREFIX = "Matches "
+# Clave de los metadatos de desarrollador que marcan las pestañas generadas
+BATCH_METADATA_KEY = "aron-batch-result"
+# Máximo de pestañas (puestos) que escribe una corrida
+BATCH_MAX_TABS = int(os.environ.get('ARON_BATCH_MAX_TABS', 50))
+# Puestos por bloque del producto matricial (acota la memoria con corpus grandes)
+JOB_BLOCK = 256
+# Caracteres que no se usan en los nombres de pestañas generados
+_UNSAFE_TITLE = re.compile(r"[\[\]:*?/\\'\s]+")
+
+
+def distinct_job_descriptions(values):
+    """Descripciones no vacías y sin repetir (tras normalizar), en orden de aparición"""
+    return list(dict.fromkeys(text for text in (normalize_text(value) for value in values) if text))
+
+
+def top_k_per_job(job_vectors, candidate_vectors, k, block=JOB_BLOCK):
+    """
+    Para cada puesto devuelve [(posición del candidato, similitud)] con los
+    k candidatos más parecidos por coseno, ordenados de mayor a menor.
+    """
+    jobs = np.asarray(job_vectors, dtype=np.float32)
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    k = min(k, len(candidates))
+    if k <= 0 or not len(jobs):
+        return [[] for _ in range(len(jobs))]
+
+    job_norms = np.linalg.norm(jobs, axis=1, keepdims=True)
+    candidate_norms = np.linalg.norm(candidates, axis=1, keepdims=True)
+    jobs = jobs / np.where(job_norms == 0, 1, job_norms)
+    candidates = candidates / np.where(candidate_norms == 0, 1, candidate_norms)
+
+    results = []
+    for start in range(0, len(jobs), block):
+        scores = jobs[start:start + block] @ candidates.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        results.extend(
+            [(int(position), float(score)) for position, score in zip(positions, row_scores)]
+            for positions, row_scores in zip(top.tolist(), top_scores.tolist())
+        )
+    return results
+
+
+def tab_title(number, job_description, max_length=100):
+    """Nombre de la pestaña de resultados de un puesto (Sheets admite hasta 100 caracteres)"""
+    snippet = _UNSAFE_TITLE.sub(" ", job_description).strip()
+    return f"{BATCH_TAB_PREFIX}{number:02d} - {snippet}"[:max_length].rstrip()
+
+
+def generated_tab_ids(spreadsheet):
+    """(sheetIds de las pestañas que creó una corrida anterior, {sheetId: título} de las demás)"""
+    metadata = spreadsheet.fetch_sheet_metadata(
+        {"fields": "sheets(properties(sheetId,title),developerMetadata(metadataKey))"})
+    generated, others = [], {}
+    for sheet in metadata.get("sheets", []):
+        properties = sheet["properties"]
+        if any(item.get("metadataKey") == BATCH_METADATA_KEY for item in sheet.get("developerMetadata", [])):
+            generated.append(properties["sheetId"])
+        else:
+            others[properties["sheetId"]] = properties.get("title", "")
+    return generated, others
+
+
+def _unique_title(title, taken, max_length=100):
+    candidate, copy = title, 2
+    while candidate in taken:
+        suffix = f" ({copy})"
+        candidate = title[:max_length - len(suffix)] + suffix
+        copy += 1
+    taken.add(candidate)
+    return candidate
+
+
+def write_result_tabs(spreadsheet, tabs):
+    """
+    Reemplaza las pestañas generadas por la corrida anterior por `tabs`
+    [(título, filas)] con una llamada batchUpdate para la estructura y otra
+    para los valores. Un título que ya usa una pestaña ajena recibe un sufijo.
+    Devuelve [(sheetId, título)] de cada pestaña nueva, en orden.
+    """
+    generated, others = generated_tab_ids(spreadsheet)
+    requests = [{"deleteSheet": {"sheetId": sheet_id}} for sheet_id in generated]
+
+    # sheetIds elegidos de antemano para marcar cada pestaña en el mismo batchUpdate
+    taken_ids = set(generated) | set(others)
+    taken_titles = set(others.values())
+    written = []
+    for title, rows in tabs:
+        sheet_id = random.randrange(1, 2 ** 31 - 1)
+        while sheet_id in taken_ids:
+            sheet_id = random.randrange(1, 2 ** 31 - 1)
+        taken_ids.add(sheet_id)
+        title = _unique_title(title, taken_titles)
+        written.append((sheet_id, title, rows))
+        requests.append({"addSheet": {"properties": {
+            "sheetId": sheet_id,
+            "title": title,
+            "gridProperties": {"rowCount": max(len(rows), 1), "columnCount": max(len(rows[0]) if rows else 1, 1)},
+        }}})
+        requests.append({"createDeveloperMetadata": {"developerMetadata": {
+            "metadataKey": BATCH_METADATA_KEY,
+            "metadataValue": title,
+            "location": {"sheetId": sheet_id},
+            "visibility": "DOCUMENT",
+        }}})
+    if not requests:
+        return []
+    spreadsheet.batch_update({"requests": requests})
+
+    data = [{"range": f"{_quote(title)}!A1", "values": rows} for _, title, rows in written if rows]
+    if data:
+        spreadsheet.values_batch_update({"valueInputOption": "RAW", "data": data})
+    return [(sheet_id, title) for sheet_id, title, _ in written]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Busca los mejores candidatos para cada puesto de la columna JOB DESCRIPTION')
+    parser.add_argument('spreadsheet', help='ID o nombre de la planilla (o "ARONDB")')
+    parser.add_argument('--sheets', nargs='+', required=True, help='Hojas de candidatos a considerar')
+    parser.add_argument('--top-n', type=int, default=10, help='Candidatos por puesto')
+    args = parser.parse_args()
+
+    try:
+        from projectAron.codigoARONconIA import run_batch_matching
+    except ImportError:
+        from codigoARONconIA import run_batch_matching
+
+    result = run_batch_matching(args.spreadsheet, args.sheets, args.top_n)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Búsqueda en cascada: filtro léxico barato y embeddings solo para los mejores.
+
+Primero se ordenan todos los candidatos con TF-IDF disperso (milisegundos,
+sin modelo) y solo los K mejores pasan al modelo denso. La puntuación final
+combina ambas similitudes. Cuando los embeddings aún no están cacheados,
+esto reduce el trabajo del transformer en un orden de magnitud en hojas
+grandes.
+"""
+import os
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import linear_kernel
+
+try:
+    from projectAron.embedding_matrix import candidate_embeddings
+except ImportError:
+    from embedding_matrix import candidate_embeddings
+
+
+CASCADE_K = int(os.environ.get('ARON_CASCADE_K', 100))
+# Peso de la similitud léxica en la puntuación combinada (0 = solo densa)
+CASCADE_LEXICAL_WEIGHT = float(os.environ.get('ARON_CASCADE_LEXICAL_WEIGHT', 0.2))
+
+
+def lexical_scores(job_description, texts):
+    """Similitud de coseno TF-IDF entre la descripción del puesto y cada texto"""
+    vectorizer = TfidfVectorizer(stop_words='english', sublinear_tf=True)
+    try:
+        matrix = vectorizer.fit_transform(list(texts) + [job_description])
+    except ValueError:
+        # Vocabulario vacío (textos sin palabras útiles)
+        return np.zeros(len(texts))
+    # Las filas de TfidfVectorizer ya están normalizadas (L2): el producto es el coseno
+    return linear_kernel(matrix[-1], matrix[:-1]).ravel()
+
+
+def cascade_top_n(model, model_name, job_description, texts, top_n, k=None, lexical_weight=None,
+                  on_partial=None):
+    """
+    Devuelve ([(posición, puntuación)], informe) con los top_n textos. El
+    informe incluye el K usado y los tiempos de cada etapa. Si se indica,
+    `on_partial(top, puntuados, total)` recibe el ranking léxico como top-N
+    provisional antes de pasar al modelo denso.
+    """
+    k = k or CASCADE_K
+    lexical_weight = CASCADE_LEXICAL_WEIGHT if lexical_weight is None else lexical_weight
+    report = {"candidates": len(texts)}
+    if not texts:
+        return [], report
+
+    start = time.time()
+    lexical = lexical_scores(job_description, texts)
+    report["lexical_seconds"] = round(time.time() - start, 3)
+
+    k = max(top_n, min(k, len(texts)))
+    survivors = np.argpartition(-lexical, k - 1)[:k] if k < len(texts) else np.arange(len(texts))
+    report["k"] = int(len(survivors))
+    if on_partial is not None:
+        provisional = np.argsort(-lexical[survivors])[:top_n]
+        on_partial([(int(survivors[i]), float(lexical[survivors[i]])) for i in provisional], len(texts), len(texts))
+
+    start = time.time()
+    job_embedding = np.asarray(model.encode(job_description, convert_to_numpy=True), dtype=np.float32)
+    vectors, _ = candidate_embeddings(model, model_name, [texts[i] for i in survivors.tolist()])
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(job_embedding) or 1)
+    norms[norms == 0] = 1
+    dense = (vectors @ job_embedding) / norms
+    report["dense_seconds"] = round(time.time() - start, 3)
+
+    # La similitud léxica se reescala a [0, 1] dentro de los supervivientes
+    survivor_lexical = lexical[survivors]
+    peak = survivor_lexical.max() if len(survivor_lexical) else 0
+    if peak > 0:
+        survivor_lexical = survivor_lexical / peak
+    fused = (1 - lexical_weight) * dense + lexical_weight * survivor_lexical
+
+    order = np.argsort(-fused)[:top_n]
+    print(f"Cascada: {report['candidates']} candidatos, K={report['k']}, "
+          f"léxico {report['lexical_seconds']}s, denso {report['dense_seconds']}s")
+    return [(int(survivors[i]), float(fused[i])) for i in order], report
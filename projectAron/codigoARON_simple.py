@@ -11,45 +11,125 @@ try:
     import pandas as pd
 except ImportError:
     print("Error importing pandas. Using alternative implementation.")
-    # Simple DataFrame implementation
+    import heapq
+
+    # Columnar stand-in for the small part of pandas used here
     class DataFrame:
+        """
+        Table stored as one list per column. Projections share the column
+        lists instead of copying rows, filters take a boolean mask and
+        nlargest uses a heap instead of sorting the whole table.
+        """
+        __slots__ = ('columns', '_columns', '_length')
+
         def __init__(self, data=None, columns=None):
-            self.data = data or []
-            self.columns = columns or []
-            
-        def __getitem__(self, col):
-            if isinstance(col, list):
-                # Return a new DataFrame with only the specified columns
-                idx = [self.columns.index(c) for c in col]
-                new_data = []
-                for row in self.data:
-                    new_data.append([row[i] for i in idx])
-                return DataFrame(new_data, col)
-            else:
-                # Return the values for a single column
-                idx = self.columns.index(col)
-                return ColumnSeries([row[idx] for row in self.data])
-        
+            rows = data or []
+            self.columns = list(columns or [])
+            self._columns = {
+                col: [row[i] if i < len(row) else "" for row in rows]
+                for i, col in enumerate(self.columns)
+            }
+            self._length = len(rows)
+
+        @classmethod
+        def _from_columns(cls, columns, values, length):
+            frame = cls.__new__(cls)
+            frame.columns = list(columns)
+            frame._columns = values
+            frame._length = length
+            return frame
+
+        def __len__(self):
+            return self._length
+
+        @property
+        def empty(self):
+            return self._length == 0
+
+        @property
+        def data(self):
+            """Rows as lists (materialized on demand, e.g. to write a sheet)"""
+            return [list(row) for row in zip(*(self._columns[col] for col in self.columns))]
+
+        def __getitem__(self, key):
+            if isinstance(key, str):
+                return ColumnSeries(self._columns[key])
+            if isinstance(key, ColumnSeries):
+                # Boolean mask
+                return self.take([i for i, keep in enumerate(key.data) if keep])
+            # Column projection: the column lists are shared, not copied
+            return DataFrame._from_columns(key, {col: self._columns[col] for col in key}, self._length)
+
+        def __setitem__(self, col, values):
+            values = list(values.data if isinstance(values, ColumnSeries) else values)
+            if len(values) != self._length:
+                raise ValueError(f"Length of values ({len(values)}) does not match length of index ({self._length})")
+            if col not in self._columns:
+                self.columns.append(col)
+            self._columns[col] = values
+
+        def take(self, positions):
+            """New table with the rows at `positions`, in that order"""
+            values = {}
+            for col in self.columns:
+                column = self._columns[col]
+                values[col] = [column[i] for i in positions]
+            return DataFrame._from_columns(self.columns, values, len(positions))
+
+        def copy(self):
+            return DataFrame._from_columns(self.columns, {col: list(self._columns[col]) for col in self.columns}, self._length)
+
         def nlargest(self, n, col):
-            col_idx = self.columns.index(col)
-            sorted_data = sorted(self.data, key=lambda x: float(x[col_idx]) if x[col_idx] else 0, reverse=True)
-            return DataFrame(sorted_data[:n], self.columns)
-    
+            column = self._columns[col]
+
+            def sort_key(i):
+                try:
+                    return float(column[i]) if column[i] != "" else 0.0
+                except (TypeError, ValueError):
+                    return 0.0
+
+            return self.take(heapq.nlargest(n, range(self._length), key=sort_key))
+
     class ColumnSeries:
+        """Column view; comparisons return boolean masks"""
+        __slots__ = ('data',)
+
         def __init__(self, data):
             self.data = data
-        
+
+        def __len__(self):
+            return len(self.data)
+
+        def __iter__(self):
+            return iter(self.data)
+
+        def tolist(self):
+            return list(self.data)
+
         def strip(self):
             return self
-        
+
+        def __eq__(self, other):
+            return ColumnSeries([x == other for x in self.data])
+
         def __ne__(self, other):
-            return [x != other for x in self.data]
+            return ColumnSeries([x != other for x in self.data])
+
+        def __or__(self, other):
+            return ColumnSeries([a or b for a, b in zip(self.data, other.data)])
+
+        def __and__(self, other):
+            return ColumnSeries([a and b for a, b in zip(self.data, other.data)])
+
+        def __invert__(self):
+            return ColumnSeries([not x for x in self.data])
+
+        __hash__ = None
     
     pd = type('', (), {})()
     pd.DataFrame = DataFrame
 
 try:
-    from googleapiclient.discovery import build
     from googleapiclient.http import MediaIoBaseDownload
 except ImportError:
     print("Error importing googleapiclient. Some functionality may be limited.")
@@ -67,72 +147,138 @@ try:
 except ImportError:
     print("Error importing scikit-learn. Using simplified implementation.")
     
+    import math
+    import re
+    from array import array
+
+    # Same token pattern as scikit-learn: words of two or more characters
+    TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+    # Same list as sklearn.feature_extraction.text.ENGLISH_STOP_WORDS
+    ENGLISH_STOP_WORDS = frozenset("""
+        a about above across after afterwards again against all almost alone along
+        already also although always am among amongst amoungst amount an and another any
+        anyhow anyone anything anyway anywhere are around as at back be became because
+        become becomes becoming been before beforehand behind being below beside besides
+        between beyond bill both bottom but by call can cannot cant co con could couldnt
+        cry de describe detail do done down due during each eg eight either eleven else
+        elsewhere empty enough etc even ever every everyone everything everywhere except
+        few fifteen fifty fill find fire first five for former formerly forty found four
+        from front full further get give go had has hasnt have he hence her here
+        hereafter hereby herein hereupon hers herself him himself his how however
+        hundred i ie if in inc indeed interest into is it its itself keep last latter
+        latterly least less ltd made many may me meanwhile might mill mine more moreover
+        most mostly move much must my myself name namely neither never nevertheless next
+        nine no nobody none noone nor not nothing now nowhere of off often on once one
+        only onto or other others otherwise our ours ourselves out over own part per
+        perhaps please put rather re same see seem seemed seeming seems serious several
+        she should show side since sincere six sixty so some somehow someone something
+        sometime sometimes somewhere still such system take ten than that the their them
+        themselves then thence there thereafter thereby therefore therein thereupon
+        these they thick thin third this those though three through throughout thru thus
+        to together too top toward towards twelve twenty two un under until up upon us
+        very via was we well were what whatever when whence whenever where whereafter
+        whereas whereby wherein whereupon wherever whether which while whither who
+        whoever whole whom whose why will with within without would yet you your yours
+        yourself yourselves
+    """.split())
+
+    class SparseRows:
+        """
+        Sparse document-term rows: sorted term indices and weights per row in
+        compact arrays, plus each row's L2 norm computed once at build time.
+        """
+        __slots__ = ('indices', 'values', 'norms')
+
+        def __init__(self, indices=None, values=None, norms=None):
+            self.indices = indices or []
+            self.values = values or []
+            self.norms = norms or []
+
+        def __len__(self):
+            return len(self.indices)
+
+        def __getitem__(self, key):
+            if isinstance(key, slice):
+                return SparseRows(self.indices[key], self.values[key], self.norms[key])
+            return SparseRows([self.indices[key]], [self.values[key]], [self.norms[key]])
+
+        def append(self, weights):
+            """Adds a row from a {term index: weight} dict"""
+            terms = sorted(weights)
+            self.indices.append(array('l', terms))
+            self.values.append(array('d', (weights[t] for t in terms)))
+            self.norms.append(math.sqrt(sum(w * w for w in weights.values())))
+
     def cosine_similarity(a, b):
-        """Very simplified cosine similarity"""
-        import math
-        
-        # Convert sparse matrices to lists
-        if hasattr(a, 'toarray'):
-            a = a.toarray()[0]
-        if hasattr(b, 'toarray'):
-            b_arrays = [x.toarray()[0] for x in b]
-        else:
-            b_arrays = b
-            
+        """Cosine similarity between every row of `a` and every row of `b`, as nested lists"""
         results = []
-        for b_vec in b_arrays:
-            # Calculate dot product
-            dot_product = sum(x*y for x, y in zip(a, b_vec))
-            
-            # Calculate magnitudes
-            mag_a = math.sqrt(sum(x*x for x in a))
-            mag_b = math.sqrt(sum(x*x for x in b_vec))
-            
-            # Calculate cosine similarity
-            if mag_a and mag_b:
-                similarity = dot_product / (mag_a * mag_b)
-            else:
-                similarity = 0
-                
-            results.append(similarity)
-        
-        return [results]
-    
-    # Simplified TF-IDF vectorizer
+        for query_indices, query_values, query_norm in zip(a.indices, a.values, a.norms):
+            query = dict(zip(query_indices, query_values))
+            row_scores = []
+            for indices, values, norm in zip(b.indices, b.values, b.norms):
+                if not (query_norm and norm):
+                    row_scores.append(0.0)
+                    continue
+                get = query.get
+                dot_product = sum(value * get(index, 0.0) for index, value in zip(indices, values))
+                row_scores.append(dot_product / (query_norm * norm))
+            results.append(row_scores)
+        return results
+
     class SimpleTfidfVectorizer:
+        """TF-IDF with smoothed IDF (as scikit-learn) over sparse rows"""
+
         def __init__(self, stop_words=None):
-            self.stop_words = stop_words or []
+            if stop_words == 'english':
+                stop_words = ENGLISH_STOP_WORDS
+            self.stop_words = frozenset(stop_words or ())
             self.vocabulary_ = {}
-            self.idf_ = {}
-            
+            self.idf_ = []
+
+        def fit(self, texts):
+            self.fit_transform(texts)
+            return self
+
         def fit_transform(self, texts):
-            # Tokenize and count
-            all_terms = set()
-            for text in texts:
-                for word in self._tokenize(text):
-                    all_terms.add(word)
-            
-            # Build vocabulary
-            self.vocabulary_ = {term: i for i, term in enumerate(all_terms)}
-            
-            # Build document-term matrix
-            doc_term_matrix = []
-            for text in texts:
-                term_counts = self._count_terms(text)
-                vector = [0] * len(self.vocabulary_
-                )
+            counts = [self._count_terms(text) for text in texts]
+
+            # Vocabulary and document frequency in one pass
+            vocabulary = {}
+            document_frequency = []
+            for term_counts in counts:
+                for term in term_counts:
+                    index = vocabulary.get(term)
+                    if index is None:
+                        index = vocabulary[term] = len(vocabulary)
+                        document_frequency.append(0)
+                    document_frequency[index] += 1
+            self.vocabulary_ = vocabulary
+
+            n_documents = len(counts)
+            self.idf_ = array('d', (math.log((1 + n_documents) / (1 + df)) + 1 for df in document_frequency))
+            return self._weigh(counts)
+
+        def transform(self, texts):
+            return self._weigh(self._count_terms(text) for text in texts)
+
+        def _weigh(self, counts):
+            rows = SparseRows()
+            vocabulary, idf = self.vocabulary_, self.idf_
+            for term_counts in counts:
+                weights = {}
                 for term, count in term_counts.items():
-                    if term in self.vocabulary_:
-                        vector[self.vocabulary_[term]] = count
-                doc_term_matrix.append(vector)
-            
-            return doc_term_matrix
-        
+                    index = vocabulary.get(term)
+                    if index is not None:
+                        weights[index] = count * idf[index]
+                rows.append(weights)
+            return rows
+
         def _tokenize(self, text):
-            """Simple tokenization"""
-            words = text.lower().split()
-            return [w for w in words if w not in self.stop_words]
-        
+            """Lowercased regex tokens without stop words"""
+            stop_words = self.stop_words
+            return [w for w in TOKEN_PATTERN.findall(text.lower()) if w not in stop_words]
+
         def _count_terms(self, text):
             """Count term frequencies"""
             counts = {}
@@ -435,8 +581,79 @@ def authenticate_google_sheets(creds_file="credenciales.json"):
         traceback.print_exc()
         raise
 
-def download_file_from_drive(file_id, destination=None):
-    """Download file from Google Drive and return its content as text"""
+# One authorized gspread client and Drive service per worker process
+_google_clients = None
+
+
+def _get_google_clients():
+    global _google_clients
+    if _google_clients is None:
+        try:
+            from projectAron.google_clients import GoogleClientRegistry
+        except ImportError:
+            from google_clients import GoogleClientRegistry
+        _google_clients = GoogleClientRegistry(authenticate_google_sheets)
+    return _google_clients
+
+
+def get_google_client():
+    """Return the process-wide gspread client"""
+    return _get_google_clients().get_client()
+
+
+def get_drive_service():
+    """Return the process-wide Drive v3 service"""
+    return _get_google_clients().get_drive_service()
+
+
+def _extract_text_simple(file_content, mime_type):
+    """
+    Extract text from an in-memory document with whatever libraries are available.
+    Returns (text, parsed): `parsed` is False when the text comes from the raw-bytes
+    fallback (no parser installed) or extraction failed, so it must not be stored.
+    """
+    # Extract text based on mime type
+    if mime_type == "application/vnd.google-apps.document" or mime_type.endswith(".docx"):
+        try:
+            if docx:
+                doc = docx.Document(file_content)
+                return "\n".join([para.text for para in doc.paragraphs]), True
+            # Simplified text extraction
+            text = file_content.read().decode('utf-8', errors='ignore')
+            text_parts = []
+            for line in text.split('\n'):
+                if len(line.strip()) > 10 and not line.startswith('<?xml'):
+                    text_parts.append(line)
+            return "\n".join(text_parts), False
+        except Exception as e:
+            print(f"Error extracting text from DOCX: {e}")
+    elif mime_type == "application/pdf":
+        try:
+            # Try with PyPDF2 first
+            try:
+                from PyPDF2 import PdfFileReader
+            except ImportError:
+                # If PyPDF2 isn't available, try a simple text extraction
+                print("PyPDF2 not available, using raw PDF bytes")
+                return file_content.read().decode('utf-8', errors='ignore'), False
+            pdf = PdfFileReader(file_content)
+            text = ""
+            for page_num in range(pdf.getNumPages()):
+                text += pdf.getPage(page_num).extractText() + "\n"
+            return text, True
+        except Exception as e:
+            print(f"Error extracting text from PDF: {e}")
+    
+    return "", False
+
+# Extraction backend tag stored next to every extracted text
+EXTRACTION_BACKEND = "simple:python-docx" if docx else "simple:raw"
+
+def download_file_from_drive(file_id, destination=None, metadata=None):
+    """
+    Download file from Google Drive and return its content as text.
+    Pass `metadata` from a batched prefetch to skip the per-file lookup.
+    """
     try:
         if not file_id:
             print("No file ID provided")
@@ -444,37 +661,13 @@ def download_file_from_drive(file_id, destination=None):
             
         print(f"Attempting to download file with ID: {file_id}")
         
-        # Use the same authentication method as authenticate_google_sheets
-        client = authenticate_google_sheets()
-        
-        # Get a fresh credential object
-        if hasattr(client, 'auth'):
-            creds = client.auth
-        else:
-            # Fallback to creating new credentials if client.auth is not available
-            if os.environ.get('GOOGLE_CREDENTIALS'):
-                json_creds = json.loads(os.environ.get('GOOGLE_CREDENTIALS'))
-                scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-                creds = ServiceAccountCredentials.from_json_keyfile_dict(json_creds, scope)
-            elif os.environ.get('GOOGLE_APPLICATION_CREDENTIALS'):
-                creds_path = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
-                scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-                creds = ServiceAccountCredentials.from_json_keyfile_name(creds_path, scope)
-            else:
-                # Try to use the default file
-                creds_file = "credenciales.json"
-                if os.path.exists(creds_file):
-                    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-                    creds = ServiceAccountCredentials.from_json_keyfile_name(creds_file, scope)
-                else:
-                    raise FileNotFoundError("No credentials available for downloading files")
-        
-        # Build the service
-        service = build('drive', 'v3', credentials=creds)
+        # Shared per-process Drive service (no re-authentication per file)
+        service = get_drive_service()
         
-        # Get file metadata
+        # Get file metadata (unless it was prefetched in a batch)
         try:
-            file_metadata = service.files().get(fileId=file_id).execute()
+            file_metadata = metadata or service.files().get(
+                fileId=file_id, fields="id,mimeType,size,modifiedTime,md5Checksum").execute()
             print(f"Successfully retrieved metadata for file: {file_id}")
             mime_type = file_metadata.get("mimeType", "")
             print(f"File mime type: {mime_type}")
@@ -499,6 +692,26 @@ def download_file_from_drive(file_id, destination=None):
                 return "[No se puede acceder al archivo. Verifique permisos del servicio.]"
             return ""
         
+        try:
+            from projectAron.document_cache import get_document_cache
+            from projectAron.drive_metadata import file_version
+            from projectAron.text_store import get_text_store, normalize_text
+        except ImportError:
+            from document_cache import get_document_cache
+            from drive_metadata import file_version
+            from text_store import get_text_store, normalize_text
+        version = file_version(file_metadata)
+        
+        # Reuse the text already extracted for this version (no download, no parsing)
+        store = get_text_store()
+        stored_text = store.get(file_id, version, EXTRACTION_BACKEND)
+        if stored_text is not None:
+            return stored_text
+        
+        # Serve the raw bytes from the local document cache when this version was already downloaded
+        cache = get_document_cache()
+        cached = cache.get(file_id, version)
+        
         # Initialize download request based on mime type
         request = None
         if mime_type == "application/vnd.google-apps.document":
@@ -515,63 +728,32 @@ def download_file_from_drive(file_id, destination=None):
             return ""
         
         # Download the file content
-        file_content = BytesIO()
-        downloader = MediaIoBaseDownload(file_content, request)
-        
-        done = False
-        while not done:
-            try:
-                _, done = downloader.next_chunk()
-            except Exception as e:
-                print(f"Error downloading file chunk: {e}")
-                # If permission error, give specific message
-                if "403" in str(e) or "permission" in str(e).lower():
-                    return "[No se puede acceder al archivo. Verifique permisos del servicio.]"
-                return ""
+        if cached is not None:
+            file_content = BytesIO(cached)
+        else:
+            file_content = BytesIO()
+            downloader = MediaIoBaseDownload(file_content, request)
+            
+            done = False
+            while not done:
+                try:
+                    _, done = downloader.next_chunk()
+                except Exception as e:
+                    print(f"Error downloading file chunk: {e}")
+                    # If permission error, give specific message
+                    if "403" in str(e) or "permission" in str(e).lower():
+                        return "[No se puede acceder al archivo. Verifique permisos del servicio.]"
+                    return ""
+            
+            cache.put(file_id, version, file_content.getvalue())
         
         file_content.seek(0)
         
-        # Extract text based on mime type
-        if mime_type == "application/vnd.google-apps.document" or mime_type.endswith(".docx"):
-            try:
-                if docx:
-                    doc = docx.Document(file_content)
-                    return "\n".join([para.text for para in doc.paragraphs])
-                else:
-                    # Simplified text extraction
-                    content = file_content.read()
-                    try:
-                        text = content.decode('utf-8', errors='ignore')
-                        text_parts = []
-                        for line in text.split('\n'):
-                            if len(line.strip()) > 10 and not line.startswith('<?xml'):
-                                text_parts.append(line)
-                        return "\n".join(text_parts)
-                    except:
-                        return "Text extraction failed - docx module not available"
-            except Exception as e:
-                print(f"Error extracting text from DOCX: {e}")
-        elif mime_type == "application/pdf":
-            try:
-                # Try with PyPDF2 first
-                try:
-                    from pypdf2 import PdfFileReader
-                    pdf = PdfFileReader(file_content)
-                    text = ""
-                    for page_num in range(pdf.getNumPages()):
-                        text += pdf.getPage(page_num).extractText() + "\n"
-                    return text
-                except ImportError:
-                    # If PyPDF2 isn't available, try a simple text extraction
-                    content = file_content.read()
-                    try:
-                        return content.decode('utf-8', errors='ignore')
-                    except:
-                        return "PDF text extraction failed - no PDF library available"
-            except Exception as e:
-                print(f"Error extracting text from PDF: {e}")
-        
-        return ""
+        # Extract text and keep it in the persistent text store for this file version
+        text, parsed = _extract_text_simple(file_content, mime_type)
+        if text and parsed:
+            store.put(file_id, version, EXTRACTION_BACKEND, text)
+        return normalize_text(text)
             
     except Exception as e:
         print(f"Error downloading file: {e}")
@@ -582,10 +764,49 @@ def download_file_from_drive(file_id, destination=None):
             return "[No se puede acceder al archivo. Verifique permisos.]"
         return ""
 
-def get_candidates(spreadsheet_name, sheet_names, job_description, top_n):
+def download_candidate_texts(resume_ids, info_ids, max_workers=None, progress=None):
+    """
+    Download every resume and information file concurrently and return the
+    combined text per candidate, in the same order as the input rows.
+    `progress(stage, **details)` is told how many files are done.
+    """
+    try:
+        from projectAron.fetch_pool import fetch_in_order
+        from projectAron.drive_metadata import fetch_file_metadata
+    except ImportError:
+        from fetch_pool import fetch_in_order
+        from drive_metadata import fetch_file_metadata
+
+    keys = [file_id for file_id in list(resume_ids) + list(info_ids) if file_id]
+
+    # Resolve mimeType and version of every file with batched requests
+    try:
+        metadata = fetch_file_metadata(get_drive_service(), keys)
+    except Exception as e:
+        print(f"Batched metadata lookup failed, falling back to per-file lookups: {e}")
+        metadata = {}
+
+    total = len(set(keys))
+    if progress is not None:
+        progress("documents", done=0, total=total)
+    results = fetch_in_order(
+        keys,
+        lambda file_id: download_file_from_drive(file_id, metadata=metadata.get(file_id)),
+        max_workers=max_workers,
+        label="files",
+        on_progress=(lambda result, done, _: progress("documents", done=done, total=total)) if progress else None,
+    )
+    texts = {result.key: result.value or "" for result in results}
+
+    return [
+        texts.get(resume_id, "") + " " + texts.get(info_id, "")
+        for resume_id, info_id in zip(resume_ids, info_ids)
+    ]
+
+def get_candidates(spreadsheet_name, sheet_names, job_description, top_n, progress=None):
     try:
-        # Use the function without specifying a credentials file path
-        client = authenticate_google_sheets()
+        # Shared per-process client
+        client = get_google_client()
         
         # Handle special case for "arondb" (case-insensitive match)
         if spreadsheet_name.lower() == "arondb":
@@ -593,37 +814,28 @@ def get_candidates(spreadsheet_name, sheet_names, job_description, top_n):
             print(f"Converting 'arondb' to ID: {spreadsheet_name}")
         
         expected_headers = ["Stage", "Applicant", "Resume", "Information", "Interview link", "Phone Number", "E-mail", "Client", "idResume", "idInformation", "JOB DESCRIPTION"]
-        all_candidates = []
         
-        for sheet_name in sheet_names:
-            try:
-                # Try to open the sheet
-                sheet = client.open_by_key(spreadsheet_name).worksheet(sheet_name)
-                data = sheet.get_all_values()
-                
-                if not data:
-                    continue  # Skip empty sheets
-                
-                header_row = data[0]  # First row with headers
-                
-                # Flexible header checking
-                available_headers = set(header_row)
-                missing_headers = [h for h in expected_headers if h not in available_headers]
-                if missing_headers:
-                    print(f"Warning: Sheet '{sheet_name}' is missing headers: {missing_headers}")
-                    continue
-                
-                # Get the column indices for each expected header
-                header_indices = [header_row.index(header) for header in expected_headers]
-                
-                # Filter data rows
-                for row in data[1:]:  # Skip headers
-                    if len(row) >= len(expected_headers):
-                        filtered_row = [row[i] if i < len(row) else "" for i in header_indices]
-                        all_candidates.append(filtered_row)
-            except Exception as sheet_error:
-                print(f"Error processing sheet {sheet_name}: {sheet_error}")
-                continue
+        try:
+            from projectAron.sheet_reader import open_spreadsheet
+            from projectAron.sheet_metadata import drive_modified_time
+            from projectAron.sheet_sync import sync_sheets
+        except ImportError:
+            from sheet_reader import open_spreadsheet
+            from sheet_metadata import drive_modified_time
+            from sheet_sync import sync_sheets
+
+        # Open the spreadsheet once. Sheets are only read (two batchGet calls)
+        # when Drive reports a change since the last sync, and only added,
+        # changed or removed rows are propagated to the caches
+        spreadsheet = open_spreadsheet(client, spreadsheet_name)
+        try:
+            modified_time = drive_modified_time(get_drive_service(), spreadsheet.id)
+        except Exception as e:
+            print(f"Couldn't read the spreadsheet modifiedTime: {e}")
+            modified_time = None
+        all_candidates = sync_sheets(spreadsheet, sheet_names, expected_headers, modified_time).rows
+        if progress is not None:
+            progress("sheets", rows=len(all_candidates))
                 
         # Convert to DataFrame
         df = pd.DataFrame(all_candidates, columns=expected_headers)
@@ -634,105 +846,44 @@ def get_candidates(spreadsheet_name, sheet_names, job_description, top_n):
             empty_df = pd.DataFrame(columns=["Applicant", "Resume", "Information", "Interview link", "Phone Number", "E-mail", "Client", "similarity"])
             return empty_df
         
-        # Detect if we're using real pandas or custom implementation
-        using_real_pandas = not hasattr(df, 'data')
-        
         # Filter candidates without resume or information
-        if using_real_pandas:
-            # Real pandas implementation
-            has_resume = df["idResume"] != ""
-            has_info = df["idInformation"] != ""
-            df_filtered = df[has_resume | has_info].copy()
-            
-            if len(df_filtered) == 0:
-                print("No candidates with resume or information.")
-                empty_df = pd.DataFrame(columns=["Applicant", "Resume", "Information", "Interview link", "Phone Number", "E-mail", "Client", "similarity"])
-                return empty_df
-                
-            # Extract text from files
-            extracted_texts = []
-            for _, row in df_filtered.iterrows():
-                resume_id = row["idResume"]
-                info_id = row["idInformation"]
-                
-                resume_text = download_file_from_drive(resume_id) if resume_id else ""
-                info_text = download_file_from_drive(info_id) if info_id else ""
-                combined_text = resume_text + " " + info_text
-                extracted_texts.append(combined_text)
-                
-            # Add combined_text to df_filtered
-            df_filtered["combined_text"] = extracted_texts
-            
-            # Use TF-IDF and cosine similarity
-            vectorizer = TfidfVectorizer(stop_words='english')
-            documents = [job_description] + df_filtered["combined_text"].tolist()
-            tfidf_matrix = vectorizer.fit_transform(documents)
-            
-            # Calculate similarity
-            job_vector = tfidf_matrix[0:1]
-            candidate_vectors = tfidf_matrix[1:]
-            similarities = cosine_similarity(job_vector, candidate_vectors)[0]
-            
-            # Add similarity to df_filtered
-            df_filtered["similarity"] = similarities
-            
-            # Get top candidates
-            top_candidates = df_filtered.nlargest(top_n, "similarity")
-            result_columns = ["Applicant", "Resume", "Information", "Interview link", "Phone Number", "E-mail", "Client", "similarity"]
-            return top_candidates[result_columns]
-        else:
-            # Custom DataFrame implementation
-            has_resume = df["idResume"] != ""
-            has_info = df["idInformation"] != ""
-            df_filtered = pd.DataFrame([row for i, row in enumerate(df.data) 
-                                      if (has_resume.data[i] or has_info.data[i])])
-            df_filtered.columns = df.columns
-            
-            if not df_filtered.data:
-                print("No candidates with resume or information.")
-                empty_df = pd.DataFrame(columns=["Applicant", "Resume", "Information", "Interview link", "Phone Number", "E-mail", "Client", "similarity"])
-                return empty_df
-                
-            # Extract text from files
-            extracted_texts = []
-            for i, row in enumerate(df_filtered.data):
-                resume_idx = df_filtered.columns.index("idResume") 
-                info_idx = df_filtered.columns.index("idInformation")
-                
-                resume_id = row[resume_idx] if resume_idx < len(row) else ""
-                info_id = row[info_idx] if info_idx < len(row) else ""
-                
-                resume_text = download_file_from_drive(resume_id) if resume_id else ""
-                info_text = download_file_from_drive(info_id) if info_id else ""
-                combined_text = resume_text + " " + info_text
-                extracted_texts.append(combined_text)
-            
-            # Add combined_text to df_filtered
-            df_filtered.columns.append("combined_text")
-            for i, text in enumerate(extracted_texts):
-                if i < len(df_filtered.data):
-                    df_filtered.data[i].append(text)
-            
-            # Use TF-IDF and cosine similarity
-            vectorizer = TfidfVectorizer(stop_words='english')
-            documents = [job_description] + extracted_texts
-            tfidf_matrix = vectorizer.fit_transform(documents)
+        # (same code path for pandas and the columnar fallback)
+        has_resume = df["idResume"] != ""
+        has_info = df["idInformation"] != ""
+        df_filtered = df[has_resume | has_info].copy()
+        
+        if len(df_filtered) == 0:
+            print("No candidates with resume or information.")
+            empty_df = pd.DataFrame(columns=["Applicant", "Resume", "Information", "Interview link", "Phone Number", "E-mail", "Client", "similarity"])
+            return empty_df
             
-            # Calculate similarity
-            job_vector = tfidf_matrix[0:1]
-            candidate_vectors = tfidf_matrix[1:]
-            similarities = cosine_similarity(job_vector, candidate_vectors)[0]
+        # Extract text from files (concurrent downloads, row order preserved)
+        extracted_texts = download_candidate_texts(df_filtered["idResume"].tolist(),
+                                                   df_filtered["idInformation"].tolist(),
+                                                   progress=progress)
+        if progress is not None:
+            progress("scoring", candidates=len(extracted_texts))
             
-            # Add similarity to df_filtered
-            df_filtered.columns.append("similarity")
-            for i, sim in enumerate(similarities):
-                if i < len(df_filtered.data):
-                    df_filtered.data[i].append(sim)
-                    
-            # Get top candidates
-            top_candidates = df_filtered.nlargest(top_n, "similarity")
-            result_columns = ["Applicant", "Resume", "Information", "Interview link", "Phone Number", "E-mail", "Client", "similarity"]
-            return top_candidates[result_columns]
+        # Add combined_text to df_filtered
+        df_filtered["combined_text"] = extracted_texts
+        
+        # Use TF-IDF and cosine similarity
+        vectorizer = TfidfVectorizer(stop_words='english')
+        documents = [job_description] + extracted_texts
+        tfidf_matrix = vectorizer.fit_transform(documents)
+        
+        # Calculate similarity
+        job_vector = tfidf_matrix[0:1]
+        candidate_vectors = tfidf_matrix[1:]
+        similarities = cosine_similarity(job_vector, candidate_vectors)[0]
+        
+        # Add similarity to df_filtered
+        df_filtered["similarity"] = similarities
+        
+        # Get top candidates
+        top_candidates = df_filtered.nlargest(top_n, "similarity")
+        result_columns = ["Applicant", "Resume", "Information", "Interview link", "Phone Number", "E-mail", "Client", "similarity"]
+        return top_candidates[result_columns]
         
     except Exception as e:
         print(f"Error in get_candidates: {e}")
@@ -740,6 +891,13 @@ def get_candidates(spreadsheet_name, sheet_names, job_description, top_n):
         traceback.print_exc()
         raise
 
+def run_search(spreadsheet_name, sheet_names, job_description, top_n, progress=None):
+    """Run a search and publish it to the 'Candidates' sheet; returns {"url": ...}"""
+    candidates = get_candidates(spreadsheet_name, sheet_names, job_description, top_n, progress=progress)
+    if progress is not None:
+        progress("writing", candidates=len(candidates))
+    return {"url": create_new_sheet(spreadsheet_name, candidates)}
+
 def create_new_sheet(spreadsheet_id, results):
     try:
         # Special case for known spreadsheet name
@@ -747,7 +905,7 @@ def create_new_sheet(spreadsheet_id, results):
             spreadsheet_id = "1EqsYq50pfSoZ5YM4AHKvqEUWT18CzCdgol6mWtRPTfU"
             print(f"Using known spreadsheet ID: {spreadsheet_id}")
             
-        client = authenticate_google_sheets()
+        client = get_google_client()
         
         # Try to open by ID first
         try:
@@ -805,38 +963,47 @@ def create_new_sheet(spreadsheet_id, results):
         # Return a fallback URL in case of error
         return f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}"
 
-def get_all_sheets(spreadsheet_name_or_id):
-    """Get all sheets from a Google Sheets document"""
+def _load_sheets_metadata(spreadsheet_name_or_id):
+    """Open the spreadsheet and return (id, sheet names, Drive modifiedTime)"""
     try:
-        # Special case for known spreadsheet name - case insensitive check
-        if isinstance(spreadsheet_name_or_id, str) and spreadsheet_name_or_id.lower() == "arondb":
-            spreadsheet_name_or_id = "1EqsYq50pfSoZ5YM4AHKvqEUWT18CzCdgol6mWtRPTfU"
-            print(f"Converting 'ARONDB' to ID: {spreadsheet_name_or_id}")
-        
-        # Authenticate and get gspread client
-        client = authenticate_google_sheets()
-        
-        # Print debugging info for spreadsheet ID
-        print(f"Attempting to open spreadsheet: {spreadsheet_name_or_id}")
-        
-        # Try to open by ID first
-        try:
-            sheet = client.open_by_key(spreadsheet_name_or_id)
-        except Exception as e:
-            print(f"Couldn't open by key, trying by name: {e}")
-            sheet = client.open(spreadsheet_name_or_id)
-        
-        # Get all worksheets
-        sheets = sheet.worksheets()
-        
-        # Get sheet names
-        sheet_names = [sheet.title for sheet in sheets]
-        print(f"Found sheets: {sheet_names}")
+        from projectAron.sheet_reader import open_spreadsheet
+        from projectAron.sheet_metadata import drive_modified_time
+    except ImportError:
+        from sheet_reader import open_spreadsheet
+        from sheet_metadata import drive_modified_time
 
-        return sheet_names
-        
+    print(f"Attempting to open spreadsheet: {spreadsheet_name_or_id}")
+    sheet = open_spreadsheet(get_google_client(), spreadsheet_name_or_id)
+    sheet_names = [worksheet.title for worksheet in sheet.worksheets()]
+    try:
+        modified_time = drive_modified_time(get_drive_service(), sheet.id)
     except Exception as e:
-        print(f"Error getting sheets: {e}")
-        import traceback
-        traceback.print_exc()
-        return []
+        print(f"Couldn't read modifiedTime for {sheet.id}: {e}")
+        modified_time = None
+    return sheet.id, sheet_names, modified_time
+
+
+def get_sheets_metadata(spreadsheet_name_or_id):
+    """Sheet list from the metadata cache (TTL + Drive modifiedTime revalidation)"""
+    try:
+        from projectAron.sheet_metadata import get_metadata_cache, drive_modified_time
+    except ImportError:
+        from sheet_metadata import get_metadata_cache, drive_modified_time
+
+    # Special case for known spreadsheet name - case insensitive check
+    if isinstance(spreadsheet_name_or_id, str) and spreadsheet_name_or_id.lower() == "arondb":
+        spreadsheet_name_or_id = "1EqsYq50pfSoZ5YM4AHKvqEUWT18CzCdgol6mWtRPTfU"
+        print(f"Converting 'ARONDB' to ID: {spreadsheet_name_or_id}")
+
+    return get_metadata_cache().get(
+        spreadsheet_name_or_id,
+        _load_sheets_metadata,
+        lambda spreadsheet_id: drive_modified_time(get_drive_service(), spreadsheet_id),
+    )
+
+
+def get_all_sheets(spreadsheet_name_or_id):
+    """Get all sheets from a Google Sheets document"""
+    sheet_names = get_sheets_metadata(spreadsheet_name_or_id)["sheets"]
+    print(f"Found sheets: {sheet_names}")
+    return sheet_names
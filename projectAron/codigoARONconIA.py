@@ -1,9 +1,7 @@
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 import pandas as pd
-from sentence_transformers import SentenceTransformer, util
 from googleapiclient.http import MediaIoBaseDownload
-from googleapiclient.discovery import build
 from io import BytesIO
 import requests
 import fitz  
@@ -11,9 +9,51 @@ import docx
 import os
 import json
 import tempfile
+import time
 import traceback
 from google.oauth2.service_account import Credentials
 
+try:
+    from projectAron.google_clients import GoogleClientRegistry
+    from projectAron.fetch_pool import fetch_in_order
+    from projectAron.single_flight import SingleFlight
+    from projectAron.drive_metadata import fetch_file_metadata, file_version, METADATA_FIELDS
+    from projectAron.document_cache import get_document_cache
+    from projectAron.text_store import get_text_store, normalize_text
+    from projectAron.extraction_pool import get_extraction_executor
+    from projectAron.model_manager import get_model, MODEL_NAME
+    from projectAron.ann_index import top_n_candidates, streamed_top_n
+    from projectAron.cascade import cascade_top_n, CASCADE_K, CASCADE_LEXICAL_WEIGHT
+    from projectAron.result_cache import get_result_cache, corpus_version, query_key, RESULT_DEPTH
+    from projectAron.sheet_reader import open_spreadsheet
+    from projectAron.sheet_metadata import get_metadata_cache, drive_modified_time
+    from projectAron.sheet_sync import sync_sheets, get_sheet_snapshot, invalidate_files
+    from projectAron.embedding_matrix import get_embedding_matrix, candidate_rows, candidate_embeddings
+    from projectAron.drive_watcher import DriveChangeFeed, start_drive_watcher, covered_since
+    from projectAron.embedding_store import text_hash, encode_with_store, get_embedding_store
+    from projectAron.job_index import get_job_index
+    from projectAron.batch_matching import BATCH_MAX_TABS, distinct_job_descriptions, top_k_per_job, tab_title, write_result_tabs
+except ImportError:
+    from google_clients import GoogleClientRegistry
+    from fetch_pool import fetch_in_order
+    from single_flight import SingleFlight
+    from drive_metadata import fetch_file_metadata, file_version, METADATA_FIELDS
+    from document_cache import get_document_cache
+    from text_store import get_text_store, normalize_text
+    from extraction_pool import get_extraction_executor
+    from model_manager import get_model, MODEL_NAME
+    from ann_index import top_n_candidates, streamed_top_n
+    from cascade import cascade_top_n, CASCADE_K, CASCADE_LEXICAL_WEIGHT
+    from result_cache import get_result_cache, corpus_version, query_key, RESULT_DEPTH
+    from sheet_reader import open_spreadsheet
+    from sheet_metadata import get_metadata_cache, drive_modified_time
+    from sheet_sync import sync_sheets, get_sheet_snapshot, invalidate_files
+    from embedding_matrix import get_embedding_matrix, candidate_rows, candidate_embeddings
+    from drive_watcher import DriveChangeFeed, start_drive_watcher, covered_since
+    from embedding_store import text_hash, encode_with_store, get_embedding_store
+    from job_index import get_job_index
+    from batch_matching import BATCH_MAX_TABS, distinct_job_descriptions, top_k_per_job, tab_title, write_result_tabs
+
 
 def authenticate_google_sheets(creds_file="credenciales.json"):
     """
@@ -114,71 +154,158 @@ def authenticate_google_sheets(creds_file="credenciales.json"):
         raise
 
 
-def extract_text_from_pdf(pdf_path):
-    """ Extrae texto de un archivo PDF """
-    text = ""
+EXPECTED_HEADERS = ["Stage", "Applicant", "Resume", "Information", "Interview link", "Phone Number", "E-mail", "Client", "idResume", "idInformation", "JOB DESCRIPTION"]
+
+# Modo de puntuación: "dense" (embeddings para todos) o "cascade" (TF-IDF y luego embeddings para los K mejores)
+SCORING_MODE = os.environ.get('ARON_SCORING_MODE', 'dense')
+
+# Un único cliente gspread y servicio de Drive por proceso worker
+_google_clients = GoogleClientRegistry(authenticate_google_sheets)
+
+
+def get_google_client():
+    """ Devuelve el cliente gspread compartido del proceso """
+    return _google_clients.get_client()
+
+
+def get_drive_service():
+    """ Devuelve el servicio de Drive v3 compartido del proceso """
+    return _google_clients.get_drive_service()
+
+
+# Etiqueta del backend de extracción guardada junto a cada texto
+EXTRACTION_BACKEND = "pymupdf+python-docx"
+
+
+def _stored_text(file_id, version):
+    if file_id and version:
+        return get_text_store().get(file_id, version, EXTRACTION_BACKEND)
+    return None
+
+def _store_text(file_id, version, text, verified_at=None):
+    if file_id and version and text:
+        get_text_store().put(file_id, version, EXTRACTION_BACKEND, text, verified_at)
+        return normalize_text(text)
+    return text
+
+def extract_text_from_pdf(pdf_source, file_id=None, version=None):
+    """
+    Extrae texto de un PDF, desde una ruta o directamente desde sus bytes.
+    Con file_id y version se consulta y actualiza el almacén de textos.
+    """
+    stored = _stored_text(file_id, version)
+    if stored is not None:
+        return stored
+    pages = []
     try:
-        with fitz.open(pdf_path) as doc:
+        if isinstance(pdf_source, (bytes, bytearray)):
+            doc = fitz.open(stream=pdf_source, filetype="pdf")
+        else:
+            doc = fitz.open(pdf_source)
+        with doc:
             for page in doc:
-                text += page.get_text("text") + "\n"
+                pages.append(page.get_text("text"))
     except Exception as e:
-        print(f"Error leyendo PDF {pdf_path}: {e}")
-    return text.strip()
+        print(f"Error leyendo PDF {_describe_source(pdf_source)}: {e}")
+    return _store_text(file_id, version, "\n".join(pages).strip())
 
-def extract_text_from_docx(docx_path):
-    """ Extrae texto de un archivo DOCX """
+def extract_text_from_docx(docx_source, file_id=None, version=None):
+    """
+    Extrae texto de un DOCX, desde una ruta o directamente desde sus bytes.
+    Con file_id y version se consulta y actualiza el almacén de textos.
+    """
+    stored = _stored_text(file_id, version)
+    if stored is not None:
+        return stored
     text = ""
     try:
-        doc = docx.Document(docx_path)
+        if isinstance(docx_source, (bytes, bytearray)):
+            # BytesIO sobre bytes comparte el buffer, no lo copia
+            docx_source_io = BytesIO(docx_source)
+        else:
+            docx_source_io = docx_source
+        doc = docx.Document(docx_source_io)
         text = "\n".join([p.text for p in doc.paragraphs])
     except Exception as e:
-        print(f"Error leyendo DOCX {docx_path}: {e}")
-    return text.strip()
+        print(f"Error leyendo DOCX {_describe_source(docx_source)}: {e}")
+    return _store_text(file_id, version, text.strip())
+
+def extract_text_from_bytes(data, extension, file_id=None, version=None):
+    """ Extrae el texto de un documento en memoria según su extensión ("pdf" o "docx") """
+    if extension == "docx":
+        return extract_text_from_docx(data, file_id, version)
+    return extract_text_from_pdf(data, file_id, version)
+
+def _describe_source(source):
+    if isinstance(source, (bytes, bytearray)):
+        return f"en memoria ({len(source)} bytes)"
+    return source
+
+GOOGLE_DOC_MIME = "application/vnd.google-apps.document"
+PDF_MIME = "application/pdf"
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+def download_file_bytes(file_id, metadata=None):
+    """
+    Descarga el contenido de un archivo de Drive a memoria, exportando los
+    Google Docs a DOCX. Devuelve (bytes, extensión) con extensión "pdf" o
+    "docx". Si la versión del archivo ya está en la cache de documentos no
+    se toca el endpoint de descarga de Drive.
+    """
+    # Servicio de Drive compartido (sin re-autenticar ni reconstruir por archivo)
+    service = get_drive_service()
+
+    # Obtener metadatos del archivo (solo si no vienen del prefetch en lote)
+    file_metadata = metadata or service.files().get(fileId=file_id, fields=METADATA_FIELDS).execute()
+    mime_type = file_metadata.get("mimeType", "")
 
-def download_file_from_drive(file_id, destination):
-    """ Descarga el archivo desde Google Drive, exportando si es necesario """
+    if mime_type == GOOGLE_DOC_MIME:  # Es un Google Docs
+        extension = "docx"
+    elif mime_type == PDF_MIME:
+        extension = "pdf"
+    elif mime_type == DOCX_MIME:  # DOCX normal
+        extension = "docx"
+    else:
+        raise ValueError(f"Tipo de archivo no compatible: {mime_type}")
+
+    cache = get_document_cache()
+    version = file_version(file_metadata)
+    data = cache.get(file_id, version)
+    if data is not None:
+        return data, extension
+
+    if mime_type == GOOGLE_DOC_MIME:
+        request = service.files().export_media(fileId=file_id, mimeType=DOCX_MIME)
+    else:
+        request = service.files().get_media(fileId=file_id)
+
+    fh = BytesIO()
+    downloader = MediaIoBaseDownload(fh, request)
+    done = False
+    while not done:
+        status, done = downloader.next_chunk()
+
+    data = fh.getvalue()
+    cache.put(file_id, version, data)
+    return data, extension
+
+
+def download_file_from_drive(file_id, destination, metadata=None):
+    """
+    Descarga el archivo desde Google Drive, exportando si es necesario.
+    Si se pasan los metadatos ya obtenidos en lote, no se consultan de nuevo.
+    """
     try:
         print(f"Descargando archivo con ID: {file_id}")
         
-        # Usar la función de autenticación mejorada
-        client = authenticate_google_sheets()
-        
-        # Acceder a las credenciales desde el cliente gspread
-        if hasattr(client, 'auth'):
-            credentials = client.auth
-        else:
-            # Fallback a la autenticación directa
-            scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-            credentials = Credentials.from_service_account_file("credenciales.json", scopes=scope)
-        
-        service = build('drive', 'v3', credentials=credentials)
-        
-        # Obtener metadatos del archivo
-        file_metadata = service.files().get(fileId=file_id).execute()
-        mime_type = file_metadata.get("mimeType", "")
-        
-        fh = BytesIO()
-        if mime_type == "application/vnd.google-apps.document":  # Es un Google Docs
-            request = service.files().export_media(fileId=file_id, mimeType="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
-            if not destination.endswith(".docx"):  # Evitar doble .docx
-                destination += ".docx"
-        elif mime_type == "application/pdf": #PDF
-            request = service.files().get_media(fileId=file_id)
-        elif mime_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document": #DOCX normal
-            request = service.files().get_media(fileId=file_id)
-        else:
-            print(f"Tipo de archivo no compatible: {mime_type}")
-            return None
-        
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
+        data, extension = download_file_bytes(file_id, metadata)
+        if extension == "docx" and not destination.endswith(".docx"):  # Evitar doble .docx
+            destination += ".docx"
         
         # Escribir el archivo descargado
-        fh.seek(0)
         with open(destination, 'wb') as f:
-            f.write(fh.read())
+            f.write(data)
 
         if os.path.exists(destination):
             print(f"Archivo descargado correctamente: {destination}")
@@ -193,12 +320,40 @@ def download_file_from_drive(file_id, destination):
         return None
 
 
+# Descargas y extracciones en curso, por (archivo, versión)
+_document_flight = SingleFlight()
+
+
+def _fetch_document_text(file_id, metadata=None, checked_at=None):
+    """
+    Devuelve el texto de un documento de Drive. Si esa versión ya se extrajo
+    antes se sirve desde el almacén de textos, sin descargar ni parsear; si
+    no, se descarga a memoria y se parsea en el pool de procesos de
+    extracción, sin pasar por disco. `checked_at` es el momento previo a la
+    lectura de `metadata`; con él se guarda el texto.
+    Lanza una excepción si la descarga falla, para que el pool la reporte.
+    """
+    if metadata is None:
+        checked_at = time.time()
+        metadata = get_drive_service().files().get(fileId=file_id, fields=METADATA_FIELDS).execute()
+    version = file_version(metadata)
+    stored = _stored_text(file_id, version)
+    if stored is not None:
+        return stored
+
+    def download_and_extract():
+        data, extension = download_file_bytes(file_id, metadata)
+        text = get_extraction_executor().extract(data, extension)
+        return _store_text(file_id, version, text, checked_at)
+
+    # Búsquedas simultáneas con el mismo archivo comparten una sola descarga
+    return _document_flight.do((file_id, version), download_and_extract)
+
+
 def extract_text_from_pdf_online(file_id):
     """ Extrae texto de un archivo PDF desde Google Drive usando el ID """
     try:
-        pdf_file_path = "./temp_pdf_file.pdf"
-        download_file_from_drive(file_id, pdf_file_path)
-        return extract_text_from_pdf(pdf_file_path)  # Extrae el texto después de descargar
+        return _fetch_document_text(file_id)
     except Exception as e:
         print(f"Error procesando el PDF con ID {file_id}: {e}")
         return ""
@@ -206,105 +361,402 @@ def extract_text_from_pdf_online(file_id):
 def extract_text_from_docx_online(file_id):
     """ Extrae texto de un archivo DOCX desde Google Drive usando el ID """
     try:
-        docx_file_path = "./temp_docx_file.docx"
-        download_file_from_drive(file_id, docx_file_path)
-        text = extract_text_from_docx(docx_file_path)  # Extrae el texto después de descargar
-
-        # 🔥 Eliminar el archivo después de extraer el texto
-        if os.path.exists(docx_file_path):
-            os.remove(docx_file_path)
-            print(f"Archivo temporal eliminado: {docx_file_path}")
-
-        return text
+        return _fetch_document_text(file_id)
     except Exception as e:
         print(f"Error procesando el DOCX con ID {file_id}: {e}")
         return ""
 
 
-def get_candidates(spreadsheet_name, sheet_names, job_description, top_n):
-    # Usar la función de autenticación mejorada sin especificar ruta
-    client = authenticate_google_sheets()
+def _report(progress, stage, **details):
+    # Informa el avance de una búsqueda si hay quien lo escuche (trabajos, streaming)
+    if progress is not None:
+        progress(stage, **details)
+
+
+def extract_candidate_texts(resume_ids, info_ids, max_workers=None, progress=None):
+    """
+    Descarga en paralelo el CV (PDF) y la información (DOCX) de cada
+    candidato y devuelve el texto combinado en el mismo orden de las filas.
+    Los archivos que fallan aportan texto vacío sin abortar el lote.
+    """
+    keys = [file_id for file_id in list(resume_ids) + list(info_ids) if file_id]
+    total = len(set(keys))
+
+    # Con el vigilante de Drive activo, los textos guardados desde que cubre
+    # los cambios están al día: no hace falta consultar sus versiones
+    texts = {}
+    since = covered_since()
+    if since is not None:
+        texts = get_text_store().get_latest_many(keys, EXTRACTION_BACKEND, since)
+        keys = [file_id for file_id in keys if file_id not in texts]
+
+    # Resolver en lote el mimeType y la versión de los documentos restantes.
+    # Los textos se guardan como verificados en este momento (antes de leer
+    # las versiones): si un archivo cambia mientras se descarga, el cambio
+    # registrado por el vigilante es posterior y el texto no queda como vigente
+    checked_at = time.time()
+    metadata = fetch_file_metadata(get_drive_service(), keys)
+
+    cached = len(texts)
+    _report(progress, "documents", done=cached, total=total)
+    results = fetch_in_order(
+        keys,
+        lambda file_id: _fetch_document_text(file_id, metadata.get(file_id), checked_at),
+        max_workers=max_workers,
+        label="documentos",
+        on_progress=lambda result, done, _: _report(progress, "documents", done=cached + done, total=total),
+    )
+    texts.update((result.key, result.value or "") for result in results)
+    if since is not None:
+        # Lo recién validado contra Drive queda cubierto por el vigilante
+        get_text_store().touch([result.key for result in results if result.error is None and result.key in metadata],
+                               checked_at)
+
+    return [
+        texts.get(resume_id, "") + " " + texts.get(info_id, "")
+        for resume_id, info_id in zip(resume_ids, info_ids)
+    ]
+
+
+def _record_text_hashes(sync, row_positions, hashes):
+    # Guarda en la instantánea el hash del texto de las filas nuevas o cuyo texto cambió
+    updates = []
+    for position, hash_ in zip(row_positions, hashes):
+        if sync.text_hashes[position] != hash_:
+            sheet, key = sync.keys[position]
+            updates.append((sheet, key, hash_))
+    if updates:
+        get_sheet_snapshot().set_text_hashes(sync.spreadsheet_id, updates)
+
+
+def _rank_candidates(model, mode, job_description, texts, top_n, applicants, progress=None):
+    """
+    Devuelve ([(posición, puntuación)], informe) con al menos top_n
+    posiciones; con puntuación densa se ordenan hasta RESULT_DEPTH y con la
+    cascada todos los K que pasan el filtro léxico.
+    """
+    def report_partial(top, done, total):
+        # Top-N provisional para quien sigue la búsqueda en vivo
+        _report(progress, "partial", done=done, total=total, top=[
+            {"applicant": applicants[position], "similarity": round(similarity, 4)}
+            for position, similarity in top[:top_n]
+        ])
+
+    def report_encoded(top, done, total):
+        _report(progress, "encoding", done=done, total=total)
+        report_partial(top, done, total)
+
+    # Sin nadie siguiendo la búsqueda no se calculan rankings provisionales
+    on_partial = report_partial if progress is not None else None
+    on_encoded = report_encoded if progress is not None else None
+
+    if mode == "cascade":
+        # Cascada: TF-IDF sobre todos, embeddings solo para los K mejores
+        depth = max(top_n, min(CASCADE_K, len(texts)))
+        return cascade_top_n(model, MODEL_NAME, job_description, texts, depth, on_partial=on_partial)
+
+    # Top-N por similitud de coseno: índice IVF sobre la matriz compartida de
+    # embeddings (solo se codifican los textos nuevos), exacto con pocos candidatos
+    depth = max(top_n, min(RESULT_DEPTH, len(texts)))
+    job_embedding = model.encode(job_description, convert_to_numpy=True)
+    if on_encoded is not None:
+        # Con textos nuevos se codifica por tramos publicando rankings provisionales
+        return streamed_top_n(model, MODEL_NAME, texts, job_embedding, depth, on_encoded), None
+    return top_n_candidates(model, MODEL_NAME, texts, job_embedding, depth), None
+
+
+def _load_candidates(spreadsheet_name, sheet_names, progress=None):
+    """
+    Sincroniza las hojas y extrae el texto de cada candidato. Devuelve
+    (sync, df, hashes): el DataFrame de candidatos con CV o ficha, con su
+    texto en "combined_text", y el hash de cada texto en el mismo orden.
+    No carga el modelo: los textos que dejaron de usarse quedan en
+    sync.stale_text_hashes para que los descarte quien puntúe con embeddings
+    (ver _discard_stale_embeddings).
+    """
+    # Cliente compartido del proceso
+    client = get_google_client()
     
-    expected_headers = ["Stage", "Applicant", "Resume", "Information", "Interview link", "Phone Number", "E-mail", "Client", "idResume", "idInformation", "JOB DESCRIPTION"]
-    all_candidates = []
+    expected_headers = EXPECTED_HEADERS
     
     # Manejar caso especial para "arondb" (insensible a mayúsculas/minúsculas)
     if isinstance(spreadsheet_name, str) and spreadsheet_name.lower() == "arondb":
         spreadsheet_name = "1EqsYq50pfSoZ5YM4AHKvqEUWT18CzCdgol6mWtRPTfU"
         print(f"Usando ID conocido para ARONDB: {spreadsheet_name}")
     
-    for sheet_name in sheet_names:
-        try:
-            # Intentar abrir primero por ID, luego por nombre
-            try:
-                sheet = client.open_by_key(spreadsheet_name).worksheet(sheet_name)
-            except:
-                sheet = client.open(spreadsheet_name).worksheet(sheet_name)
-                
-            data = sheet.get_all_values()
-            
-            if not data:
-                continue  # Saltar hojas vacías
-            
-            header_row = data[0]  # Primera fila con los encabezados
-            
-            # Verificación flexible de encabezados
-            available_headers = set(header_row)
-            missing_headers = [h for h in expected_headers if h not in available_headers]
-            if missing_headers:
-                print(f"Advertencia: La hoja '{sheet_name}' no tiene algunos encabezados esperados: {missing_headers}")
-                continue
-            
-            # Obtener índices de columnas para cada encabezado esperado
-            header_indices = [header_row.index(header) for header in expected_headers]
-            
-            # Filtrar las filas de datos
-            for row in data[1:]:  # Omitir encabezados
-                if len(row) >= len(expected_headers):
-                    filtered_row = [row[i] if i < len(row) else "" for i in header_indices]
-                    all_candidates.append(filtered_row)
-        except Exception as e:
-            print(f"Error procesando hoja {sheet_name}: {e}")
-            continue
+    # La planilla se abre una vez; las hojas solo se leen (en dos batchGet) si
+    # Drive informa cambios desde la última sincronización, y solo las filas
+    # nuevas, modificadas o eliminadas se propagan a las caches
+    spreadsheet = open_spreadsheet(client, spreadsheet_name)
+    try:
+        modified_time = drive_modified_time(get_drive_service(), spreadsheet.id)
+    except Exception as e:
+        print(f"No se pudo obtener la fecha de modificación de la planilla: {e}")
+        modified_time = None
+    sync = sync_sheets(spreadsheet, sheet_names, expected_headers, modified_time)
+    _report(progress, "sheets", rows=len(sync.rows), added=len(sync.added),
+            changed=len(sync.changed), removed=len(sync.removed))
     
     # Convertir a DataFrame
-    df = pd.DataFrame(all_candidates, columns=expected_headers)
+    df = pd.DataFrame(sync.rows, columns=expected_headers)
     # Filtrar candidatos que no tienen ni idResume ni idInformation
     df = df[(df["idResume"].str.strip() != "") | (df["idInformation"].str.strip() != "")]
 
     if df.empty:
-        print("No hay candidatos disponibles en las hojas especificadas.")
-        return pd.DataFrame(columns=["Applicant", "Resume", "Information", "Interview link", "Phone Number", "E-mail", "Client", "similarity"])
+        return sync, df, []
     
-    # Cargar modelo de embeddings
-    #model = SentenceTransformer("paraphrase-MiniLM-L6-v2")
-    #model = SentenceTransformer("BAAI/bge-large-en")
-    model = SentenceTransformer("sentence-transformers/all-MPNet-base-v2")  # Captura relaciones semánticas más detalladas
-
-    # Extraer texto real de los archivos
-    extracted_texts = []
-    for _, row in df.iterrows():
-        resume_text = extract_text_from_pdf_online(row["idResume"]) if row["idResume"] else ""
-        info_text = extract_text_from_docx_online(row["idInformation"]) if row["idInformation"] else ""
-        combined_text = resume_text + " " + info_text
-        extracted_texts.append(combined_text)
+    # Extraer texto real de los archivos (descargas concurrentes, en orden de filas)
+    extracted_texts = extract_candidate_texts(df["idResume"].tolist(), df["idInformation"].tolist(),
+                                              progress=progress)
     
     df["combined_text"] = extracted_texts
     
-    job_embedding = model.encode(job_description, convert_to_tensor=True)
-    candidate_embeddings = model.encode(df["combined_text"].tolist(), convert_to_tensor=True)
+    hashes = [text_hash(text) for text in extracted_texts]
+    _record_text_hashes(sync, df.index, hashes)
+    return sync, df, hashes
+
+
+def _discard_stale_embeddings(model, sync):
+    # Textos de filas eliminadas o modificadas que ya no usa ningún candidato
+    if sync.stale_text_hashes:
+        get_embedding_matrix(MODEL_NAME, getattr(model, 'max_seq_length', 0)).discard(sync.stale_text_hashes)
+
+
+def get_candidates(spreadsheet_name, sheet_names, job_description, top_n, scoring_mode=None, progress=None):
+    sync, df, hashes = _load_candidates(spreadsheet_name, sheet_names, progress)
+
+    if df.empty:
+        print("No hay candidatos disponibles en las hojas especificadas.")
+        return pd.DataFrame(columns=["Applicant", "Resume", "Information", "Interview link", "Phone Number", "E-mail", "Client", "similarity"])
     
-    # Calcular similitud de coseno
-    similarities = util.pytorch_cos_sim(job_embedding, candidate_embeddings).squeeze().tolist()
-    df["similarity"] = similarities
+    # Modelo de embeddings compartido del proceso (se carga una sola vez por worker)
+    model = get_model()
+    _discard_stale_embeddings(model, sync)
+    texts = df["combined_text"].tolist()
+    _report(progress, "scoring", candidates=len(texts))
+
+    # Ranking memorizado para esta consulta y esta versión de filas y textos
+    mode = scoring_mode or SCORING_MODE
+    scorer = [mode, MODEL_NAME, getattr(model, 'max_seq_length', 0)]
+    if mode == "cascade":
+        scorer += [CASCADE_K, CASCADE_LEXICAL_WEIGHT]
+    query = query_key(sync.spreadsheet_id, sheet_names, job_description, scorer)
+    version = corpus_version([sync.keys[position] for position in df.index], hashes)
+    result_cache = get_result_cache()
+    cached = result_cache.get(query, version, top_n)
+    if cached is not None:
+        print(f"Ranking reutilizado para {len(texts)} candidatos")
+        top, report = cached
+    else:
+        top, report = _rank_candidates(model, mode, job_description, texts, top_n, df["Applicant"].tolist(), progress)
+        # Se guarda el ranking completo calculado: sirve para cualquier top_n que no lo supere
+        result_cache.put(query, version, top, len(top) >= len(texts), report)
+        top = top[:top_n]
     
-    top_candidates = df.nlargest(top_n, "similarity")
+    top_candidates = df.iloc[[position for position, _ in top]].copy()
+    top_candidates["similarity"] = [similarity for _, similarity in top]
+    if report:
+        # K elegido y tiempos de cada etapa de la cascada (cached: ranking reutilizado)
+        report = dict(report, cached=cached is not None)
+        top_candidates.attrs["cascade"] = report
+        _report(progress, "cascade", **report)
     return top_candidates[["Applicant", "Resume", "Information", "Interview link", "Phone Number", "E-mail", "Client", "similarity"]]
 
 
+def _warm_rows(rows):
+    # Vuelve a extraer y codificar filas (planilla, hoja, clave, idResume, idInformation, text_hash)
+    rows = [row for row in rows if row[3] or row[4]]
+    if not rows:
+        return
+    texts = extract_candidate_texts([row[3] or "" for row in rows], [row[4] or "" for row in rows])
+    model = get_model()
+    candidate_rows(model, MODEL_NAME, texts)
+
+    snapshot = get_sheet_snapshot()
+    updates = {}
+    old_hashes = set()
+    for row, text in zip(rows, texts):
+        hash_ = text_hash(text)
+        if row[5] != hash_:
+            updates.setdefault(row[0], []).append((row[1], row[2], hash_))
+            if row[5]:
+                old_hashes.add(row[5])
+    for spreadsheet_id, items in updates.items():
+        snapshot.set_text_hashes(spreadsheet_id, items)
+    stale = snapshot.unreferenced_text_hashes(old_hashes)
+    if stale:
+        get_embedding_matrix(MODEL_NAME, getattr(model, 'max_seq_length', 0)).discard(stale)
+    print(f"Caches actualizadas para {len(rows)} candidatos")
+
+
+def handle_drive_changes(changes):
+    """
+    Manejador del vigilante de Drive: invalida los CVs/fichas modificados,
+    resincroniza las planillas que cambiaron y vuelve a extraer y codificar
+    las filas afectadas. La invalidación ocurre primero y sus errores se
+    propagan (el vigilante reintenta); la recarga es el mejor esfuerzo.
+    """
+    snapshot = get_sheet_snapshot()
+    spreadsheet_ids = snapshot.spreadsheet_ids()
+    sheet_changes = [change for change in changes if change.file_id in spreadsheet_ids]
+    file_ids = {change.file_id for change in changes if change.file_id not in spreadsheet_ids}
+
+    referenced = file_ids - snapshot.unreferenced_file_ids(file_ids)
+    if referenced:
+        invalidate_files(referenced)
+    affected = snapshot.rows_referencing(referenced)
+
+    resume_index = EXPECTED_HEADERS.index("idResume")
+    info_index = EXPECTED_HEADERS.index("idInformation")
+    for change in sheet_changes:
+        if change.removed:
+            continue
+        try:
+            spreadsheet = open_spreadsheet(get_google_client(), change.file_id)
+            sheet_names = snapshot.sheets(change.file_id, EXPECTED_HEADERS)
+            sync = sync_sheets(spreadsheet, sheet_names, EXPECTED_HEADERS, (change.metadata or {}).get("modifiedTime"))
+            touched = set(sync.added) | set(sync.changed)
+            # Las filas que conservaron su hash solo cambiaron columnas sin archivos
+            affected += [
+                (change.file_id, sheet, key, row[resume_index], row[info_index], None)
+                for (sheet, key), row, hash_ in zip(sync.keys, sync.rows, sync.text_hashes)
+                if (sheet, key) in touched and hash_ is None
+            ]
+        except Exception as e:
+            print(f"Error resincronizando la planilla {change.file_id}: {e}")
+
+    if referenced or sheet_changes:
+        print(f"Cambios en Drive: {len(referenced)} documentos, {len(sheet_changes)} planillas")
+    try:
+        _warm_rows(affected)
+    except Exception as e:
+        print(f"Error recalentando las caches: {e}")
+
+
+def start_watching_drive():
+    """Arranca el vigilante de cambios de Drive de este proceso"""
+    return start_drive_watcher(DriveChangeFeed(get_drive_service), handle_drive_changes)
+
+
+def run_search(spreadsheet_name, sheet_names, job_description, top_n, scoring_mode=None, progress=None):
+    """
+    Ejecuta una búsqueda y publica el resultado en la hoja 'Candidates'.
+    Devuelve {"url"} y, con la cascada, {"cascade": K y tiempos de cada etapa}.
+    """
+    candidates = get_candidates(spreadsheet_name, sheet_names, job_description, top_n, scoring_mode, progress=progress)
+    report = candidates.attrs.get("cascade")
+    _report(progress, "writing", candidates=len(candidates))
+    result = {"url": create_new_sheet(spreadsheet_name, candidates)}
+    if report:
+        result["cascade"] = report
+    return result
+
+
+def run_batch_matching(spreadsheet_name, sheet_names, top_n, progress=None):
+    """
+    Busca los top_n candidatos de cada puesto distinto de la columna JOB
+    DESCRIPTION de las hojas elegidas y escribe una pestaña por puesto, hasta
+    BATCH_MAX_TABS puestos (los primeros en aparecer).
+    Devuelve {"url": primera pestaña, "tabs": [{"title", "job_description", "url"}],
+    "omitted": puestos que quedaron fuera por el límite}.
+    """
+    sync, df, _ = _load_candidates(spreadsheet_name, sheet_names, progress)
+    description_index = EXPECTED_HEADERS.index("JOB DESCRIPTION")
+    descriptions = distinct_job_descriptions(row[description_index] for row in sync.rows)
+    if df.empty or not descriptions:
+        print("No hay candidatos o descripciones de puesto en las hojas especificadas.")
+        return {"url": None, "tabs": [], "omitted": 0}
+    omitted = max(0, len(descriptions) - BATCH_MAX_TABS)
+    if omitted:
+        print(f"Búsqueda por lotes: se escriben {BATCH_MAX_TABS} puestos y se omiten {omitted}")
+        descriptions = descriptions[:BATCH_MAX_TABS]
+
+    # Un encode por lotes para los puestos y una sola matriz puesto×candidato
+    model = get_model()
+    _discard_stale_embeddings(model, sync)
+    texts = df["combined_text"].tolist()
+    _report(progress, "scoring", candidates=len(texts), jobs=len(descriptions))
+    job_vectors = encode_with_store(model, MODEL_NAME, descriptions)
+    candidate_vectors, _ = candidate_embeddings(model, MODEL_NAME, texts)
+    tops = top_k_per_job(job_vectors, candidate_vectors, top_n)
+
+    columns = ["Applicant", "Resume", "Information", "Interview link", "Phone Number", "E-mail", "Client", "similarity"]
+    tabs = []
+    for number, (description, top) in enumerate(zip(descriptions, tops), start=1):
+        matches = df.iloc[[position for position, _ in top]].copy()
+        matches["similarity"] = [similarity for _, similarity in top]
+        tabs.append((tab_title(number, description), [columns] + matches[columns].values.tolist()))
+
+    _report(progress, "writing", jobs=len(tabs))
+    spreadsheet = open_spreadsheet(get_google_client(), sync.spreadsheet_id)
+    written = write_result_tabs(spreadsheet, tabs)
+    results = [
+        {"title": title, "job_description": description,
+         "url": f"https://docs.google.com/spreadsheets/d/{spreadsheet.id}/edit#gid={sheet_id}"}
+        for (sheet_id, title), description in zip(written, descriptions)
+    ]
+    print(f"Búsqueda por lotes: {len(results)} puestos contra {len(texts)} candidatos")
+    return {"url": results[0]["url"] if results else None, "tabs": results, "omitted": omitted}
+
+
+def _job_index_for(spreadsheet_id, model):
+    # Índice de puestos al día con la instantánea de hojas y el modelo; solo se
+    # reconstruye (y codifica las descripciones nuevas) si alguno cambió
+    snapshot = get_sheet_snapshot()
+    meta = {"snapshot": snapshot.version(spreadsheet_id),
+            "model": [MODEL_NAME, getattr(model, 'max_seq_length', 0)]}
+    index = get_job_index(spreadsheet_id)
+    if not index.is_current(meta):
+        descriptions = distinct_job_descriptions(snapshot.column_values(spreadsheet_id, "JOB DESCRIPTION"))
+        vectors = encode_with_store(model, MODEL_NAME, descriptions) if descriptions else []
+        index.build(descriptions, vectors, meta)
+    return index
+
+
+def find_jobs_for_candidate(spreadsheet_name, candidate, top_n):
+    """
+    Devuelve los top_n puestos (JOB DESCRIPTION) más afines a un candidato
+    buscado por E-mail o idResume. Usa las hojas ya sincronizadas de la
+    planilla y el embedding persistido del candidato; solo si aún no se
+    codificó se extrae y codifica su texto. Lanza LookupError si la planilla
+    o el candidato no están sincronizados.
+    """
+    if isinstance(spreadsheet_name, str) and spreadsheet_name.lower() == "arondb":
+        spreadsheet_name = "1EqsYq50pfSoZ5YM4AHKvqEUWT18CzCdgol6mWtRPTfU"
+    snapshot = get_sheet_snapshot()
+    spreadsheet_id = spreadsheet_name
+    if spreadsheet_id not in snapshot.spreadsheet_ids():
+        # Nombre en lugar de ID: se resuelve abriendo la planilla
+        spreadsheet_id = open_spreadsheet(get_google_client(), spreadsheet_name).id
+        if spreadsheet_id not in snapshot.spreadsheet_ids():
+            raise LookupError("La planilla no tiene hojas sincronizadas; ejecute primero una búsqueda")
+
+    found = snapshot.find_row(spreadsheet_id, candidate)
+    if found is None:
+        raise LookupError(f"No se encontró el candidato {candidate}")
+    sheet, headers, row, hash_ = found
+    record = dict(zip(headers, row))
+
+    model = get_model()
+    vector = None
+    if hash_:
+        vector = get_embedding_store().get_many(
+            [hash_], MODEL_NAME, int(getattr(model, 'max_seq_length', 0) or 0)).get(hash_)
+    if vector is None:
+        text = extract_candidate_texts([record.get("idResume", "")], [record.get("idInformation", "")])[0]
+        vector = encode_with_store(model, MODEL_NAME, [text])[0]
+
+    jobs = _job_index_for(spreadsheet_id, model).search(vector, top_n)
+    return {
+        "candidate": {header: record.get(header, "") for header in ["Applicant", "E-mail", "Client"]},
+        "sheet": sheet,
+        "jobs": [{"job_description": description, "similarity": similarity} for description, similarity in jobs],
+    }
+
+
 def create_new_sheet(spreadsheet_id, results):
-    # Usar la función de autenticación mejorada
-    client = authenticate_google_sheets()
+    # Cliente compartido del proceso
+    client = get_google_client()
     
     # Manejar caso especial para "arondb"
     if isinstance(spreadsheet_id, str) and spreadsheet_id.lower() == "arondb":
@@ -354,31 +806,31 @@ def create_new_sheet(spreadsheet_id, results):
     return direct_url
 
 
-def get_all_sheets(spreadsheet_name):
-    # Obtiene todas las hojas (visibles y ocultas) de un Google Sheets 
+def _load_sheets_metadata(spreadsheet_name):
+    # Abre la planilla (por ID o por nombre) y obtiene sus hojas y su versión en Drive
+    spreadsheet = open_spreadsheet(get_google_client(), spreadsheet_name)
+    sheet_names = [sheet.title for sheet in spreadsheet.worksheets()]
     try:
-        # Autenticarse usando la función mejorada
-        client = authenticate_google_sheets()
-        
-        # Manejar caso especial para "arondb"
-        if isinstance(spreadsheet_name, str) and spreadsheet_name.lower() == "arondb":
-            spreadsheet_name = "1EqsYq50pfSoZ5YM4AHKvqEUWT18CzCdgol6mWtRPTfU"
-            print(f"Usando ID conocido para ARONDB: {spreadsheet_name}")
-        
-        # Intentar abrir primero por ID, luego por nombre
-        try:
-            sheets = client.open_by_key(spreadsheet_name).worksheets()
-        except:
-            sheets = client.open(spreadsheet_name).worksheets()
-        
-        # Obtener los nombres de las hojas
-        sheet_names = [sheet.title for sheet in sheets]
-        print(f"Hojas encontradas: {sheet_names}")
-
-        return sheet_names  # Retorna los nombres de las hojas
-        
+        modified_time = drive_modified_time(get_drive_service(), spreadsheet.id)
     except Exception as e:
-        print(f"Error al obtener las hojas: {e}")
-        traceback.print_exc()
-        return []
+        print(f"No se pudo obtener la fecha de modificación de {spreadsheet.id}: {e}")
+        modified_time = None
+    return spreadsheet.id, sheet_names, modified_time
+
+def get_sheets_metadata(spreadsheet_name):
+    # Hojas de la planilla desde la cache (con TTL y revalidación contra Drive)
+    # Manejar caso especial para "arondb"
+    if isinstance(spreadsheet_name, str) and spreadsheet_name.lower() == "arondb":
+        spreadsheet_name = "1EqsYq50pfSoZ5YM4AHKvqEUWT18CzCdgol6mWtRPTfU"
+    return get_metadata_cache().get(
+        spreadsheet_name,
+        _load_sheets_metadata,
+        lambda spreadsheet_id: drive_modified_time(get_drive_service(), spreadsheet_id),
+    )
+
+def get_all_sheets(spreadsheet_name):
+    # Obtiene todas las hojas (visibles y ocultas) de un Google Sheets 
+    sheet_names = get_sheets_metadata(spreadsheet_name)["sheets"]
+    print(f"Hojas encontradas: {sheet_names}")
+    return sheet_names  # Retorna los nombres de las hojas
 
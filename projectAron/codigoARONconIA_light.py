@@ -11,42 +11,153 @@ import docx
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 from io import BytesIO
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict, namedtuple
 import numpy as np
 
-# El modelo se cargará bajo demanda
-model = None
+try:
+    from projectAron.config import CACHE_DIR
+    from projectAron.codigoARONconIA import _load_candidates, create_new_sheet, get_all_sheets
+    from projectAron.single_flight import SingleFlight
+except ImportError:
+    from config import CACHE_DIR
+    from codigoARONconIA import _load_candidates, create_new_sheet, get_all_sheets
+    from single_flight import SingleFlight
 
-def load_model():
-    """Carga el modelo solo cuando es necesario"""
-    global model
-    if model is None:
-        try:
-            # Intentamos importar sentence_transformers
-            from sentence_transformers import SentenceTransformer
-            # Usamos un modelo más pequeño
-            model = SentenceTransformer('paraphrase-MiniLM-L3-v2')
-            print("Modelo cargado correctamente")
-        except ImportError:
-            print("Error al cargar sentence_transformers, usando alternativa")
-            # Alternativa: usar API remota o implementación más simple
-            model = SimpleSimilarityModel()
-    return model
+# Vocabularios TF-IDF ajustados, uno por corpus (nombre = huella del corpus)
+LIGHT_VOCABULARY_DIR = os.environ.get('ARON_LIGHT_VOCABULARY_DIR', os.path.join(CACHE_DIR, 'tfidf'))
+# Vocabularios que se conservan en disco; los más viejos se borran
+LIGHT_VOCABULARY_MAX_FILES = int(os.environ.get('ARON_LIGHT_VOCABULARY_MAX_FILES', 8))
+# Corpus ajustados que se conservan en memoria por proceso
+LIGHT_FITTED_CACHE = int(os.environ.get('ARON_LIGHT_FITTED_CACHE', 4))
 
-class SimpleSimilarityModel:
-    """Implementación simple de similitud como alternativa al modelo pesado"""
-    def __init__(self):
-        from sklearn.feature_extraction.text import TfidfVectorizer
-        self.vectorizer = TfidfVectorizer(stop_words='english')
-        
-    def encode(self, texts, convert_to_tensor=False):
-        """Codifica textos usando TF-IDF (mucho más ligero)"""
+
+class FittedCorpus(namedtuple('FittedCorpus', ['fingerprint', 'vectorizer', 'matrix'])):
+    """
+    Vocabulario ajustado sobre un corpus y la matriz CSR de ese corpus. No se
+    modifica después de creado, así que varios hilos pueden puntuar con él a
+    la vez sin cerrojos.
+    """
+    __slots__ = ()
+
+    def encode(self, texts):
+        """Filas CSR normalizadas de `texts` en el vocabulario del corpus"""
         if isinstance(texts, str):
             texts = [texts]
-        vectors = self.vectorizer.fit_transform(texts).toarray()
-        return vectors
-    
+        return self.vectorizer.transform(texts)
+
+    def score(self, query):
+        """Similitud de la consulta con cada texto del corpus, como vector denso"""
+        if not self.matrix.shape[0]:
+            return np.zeros(0, dtype=np.float32)
+        return np.asarray((self.matrix @ self.encode(query).T).toarray()).ravel()
+
+
+class SimpleSimilarityModel:
+    """
+    Implementación simple de similitud como alternativa al modelo pesado.
+
+    El vocabulario TF-IDF se ajusta sobre el corpus de candidatos y se guarda
+    por huella del corpus (en memoria y en disco), de modo que búsquedas sobre
+    hojas distintas no se pisan y volver a un corpus ya visto no lo reajusta;
+    las consultas nuevas solo se transforman. Las matrices son CSR de
+    principio a fin y las filas salen normalizadas (L2) del vectorizador, así
+    que la similitud de coseno es un solo producto disperso.
+    """
+    def __init__(self, directory=LIGHT_VOCABULARY_DIR, max_fitted=LIGHT_FITTED_CACHE,
+                 max_files=LIGHT_VOCABULARY_MAX_FILES):
+        self.directory = directory
+        self.max_fitted = max_fitted
+        self.max_files = max_files
+        self._fitted = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    @staticmethod
+    def _fingerprint(corpus):
+        digest = hashlib.sha256()
+        for text in corpus:
+            digest.update(text.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _path(self, fingerprint):
+        return os.path.join(self.directory, f"{fingerprint}.pkl")
+
+    def _load(self, fingerprint):
+        try:
+            with open(self._path(fingerprint), 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            # Archivo ausente, corrupto o de otra versión de scikit-learn:
+            # se trata como si no hubiera vocabulario guardado
+            return None
+
+    def _save(self, fingerprint, vectorizer):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(vectorizer, f)
+        os.replace(temp_path, self._path(fingerprint))
+
+        # Solo se conservan los vocabularios usados más recientemente
+        saved = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                path = os.path.join(self.directory, name)
+                try:
+                    saved.append((os.stat(path).st_mtime, path))
+                except OSError:
+                    pass
+        for _, path in sorted(saved, reverse=True)[self.max_files:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def fit(self, corpus):
+        """
+        Devuelve el FittedCorpus de `corpus`: de memoria, del vocabulario
+        guardado en disco o ajustándolo. Los hilos que piden el mismo corpus a
+        la vez comparten un solo ajuste.
+        """
+        corpus = list(corpus)
+        fingerprint = self._fingerprint(corpus)
+        with self._lock:
+            fitted = self._fitted.get(fingerprint)
+            if fitted is not None:
+                self._fitted.move_to_end(fingerprint)
+                return fitted
+        fitted = self._flight.do(fingerprint, lambda: self._fit(fingerprint, corpus))
+        with self._lock:
+            self._fitted[fingerprint] = fitted
+            self._fitted.move_to_end(fingerprint)
+            while len(self._fitted) > self.max_fitted:
+                self._fitted.popitem(last=False)
+        return fitted
+
+    def _fit(self, fingerprint, corpus):
+        vectorizer = self._load(fingerprint)
+        if vectorizer is not None:
+            # Vocabulario guardado: basta con transformar
+            return FittedCorpus(fingerprint, vectorizer, vectorizer.transform(corpus).tocsr())
+
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        vectorizer = TfidfVectorizer(stop_words='english', sublinear_tf=True, dtype=np.float32)
+        matrix = vectorizer.fit_transform(corpus).tocsr()
+        try:
+            self._save(fingerprint, vectorizer)
+        except OSError as e:
+            print(f"No se pudo guardar el vocabulario TF-IDF: {e}")
+        return FittedCorpus(fingerprint, vectorizer, matrix)
+
     def pytorch_cos_sim(self, a, b):
-        """Implementación simple de similitud de coseno"""
+        """Similitud de coseno entre filas (producto disperso si vienen de encode)"""
+        from scipy import sparse
+        if sparse.issparse(a) and sparse.issparse(b):
+            return (a @ b.T).toarray()
         from sklearn.metrics.pairwise import cosine_similarity
         if len(a.shape) == 1:
             a = a.reshape(1, -1)
@@ -54,17 +165,43 @@ class SimpleSimilarityModel:
             b = b.reshape(1, -1)
         return cosine_similarity(a, b)
 
-# ... Resto de funciones exactamente igual que en codigoARONconIA.py ...
-
-def get_candidates(spreadsheet_name, sheet_names, job_description, top_n):
-    client = authenticate_google_sheets("credenciales.json")
-    
-    expected_headers = ["Stage", "Applicant", "Resume", "Information", "Interview link", "Phone Number", "E-mail", "Client", "idResume", "idInformation", "JOB DESCRIPTION"]
-    all_candidates = []
-    
-    # ... código existente ...
-    
-    # Cargar modelo bajo demanda (solo cuando se necesite)
-    model = load_model()
-    
-    # ... resto del código igual ...
+    def score(self, query, corpus):
+        """Similitud de la consulta con cada texto del corpus, como vector denso"""
+        try:
+            fitted = self.fit(corpus)
+        except ValueError:
+            # Vocabulario vacío (textos sin palabras útiles)
+            return np.zeros(len(corpus), dtype=np.float32)
+        return fitted.score(query)
+
+_scorer = None
+_scorer_lock = threading.Lock()
+
+
+def get_light_scorer():
+    """Modelo TF-IDF del proceso (conserva los vocabularios ajustados entre búsquedas)"""
+    global _scorer
+    with _scorer_lock:
+        if _scorer is None:
+            _scorer = SimpleSimilarityModel()
+        return _scorer
+
+
+def get_candidates(spreadsheet_name, sheet_names, job_description, top_n, progress=None):
+    """
+    Versión ligera: mismas hojas y textos que la versión completa, pero
+    puntuados con TF-IDF (sin transformer). El vocabulario se ajusta una vez
+    por corpus de candidatos y se reutiliza mientras el corpus no cambie.
+    """
+    columns = ["Applicant", "Resume", "Information", "Interview link", "Phone Number", "E-mail", "Client", "similarity"]
+    _, df, _ = _load_candidates(spreadsheet_name, sheet_names, progress)
+    if df.empty:
+        print("No hay candidatos disponibles en las hojas especificadas.")
+        return pd.DataFrame(columns=columns)
+
+    texts = df["combined_text"].tolist()
+    scores = get_light_scorer().score(job_description, texts)
+    order = np.argsort(-scores, kind="stable")[:top_n]
+    top_candidates = df.iloc[order].copy()
+    top_candidates["similarity"] = scores[order].astype(float)
+    return top_candidates[columns]
@@ -3,6 +3,12 @@ import json
 import tempfile
 import traceback
 
+# Local cache directory shared by every worker (downloaded documents, extracted text, ...)
+CACHE_DIR = os.environ.get('ARON_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'aron_cache'))
+
+# Compute threads for the embedding model (torch intra-op threads); None keeps torch's default
+MODEL_THREADS = int(os.environ['ARON_MODEL_THREADS']) if os.environ.get('ARON_MODEL_THREADS') else None
+
 def setup_credentials():
     """Set up the Google credentials from environment variables in production"""
     try:
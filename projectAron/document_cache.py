@@ -0,0 +1,137 @@
+"""
+Cache en disco de documentos descargados de Drive.
+
+Cada entrada guarda los bytes crudos de un archivo y se identifica por el
+id de Drive más su versión (md5Checksum o modifiedTime), de modo que un
+documento modificado nunca devuelve contenido viejo. El tamaño total está
+acotado y se expulsan primero las entradas usadas hace más tiempo (LRU según
+la fecha de acceso del archivo, compartida por todos los workers).
+"""
+import hashlib
+import os
+import tempfile
+import threading
+
+try:
+    from projectAron.config import CACHE_DIR
+except ImportError:
+    from config import CACHE_DIR
+
+
+DOCUMENT_CACHE_MAX_BYTES = int(os.environ.get('ARON_DOCUMENT_CACHE_MB', 512)) * 1024 * 1024
+
+
+class DocumentCache:
+    """Cache LRU de bytes de documentos, acotada por tamaño total"""
+
+    def __init__(self, directory=None, max_bytes=DOCUMENT_CACHE_MAX_BYTES):
+        self.directory = directory or os.path.join(CACHE_DIR, 'documents')
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def cache_key(file_id, version):
+        return hashlib.sha256(f"{file_id}:{version}".encode("utf-8")).hexdigest()
+
+    def _path(self, file_id, version):
+        return os.path.join(self.directory, self.cache_key(file_id, version) + ".bin")
+
+    def get(self, file_id, version):
+        """Devuelve los bytes cacheados o None si no hay entrada para esa versión"""
+        if not file_id or not version:
+            return None
+        path = self._path(file_id, version)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Marcar como usado recientemente para la política LRU
+            os.utime(path, None)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, file_id, version, data):
+        """Guarda los bytes de forma atómica y expulsa entradas si se supera el límite"""
+        if not file_id or not version or data is None:
+            return
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(file_id, version)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"No se pudo guardar {file_id} en la cache de documentos: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.bin'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Elimina las entradas menos usadas hasta quedar por debajo del 90% del límite"""
+        # Se vuelve a leer el directorio porque otros workers también escriben
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for _, size, name in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                total -= size
+                removed += 1
+            except OSError:
+                continue
+        self._total_bytes = total
+        print(f"Cache de documentos: {removed} entradas expulsadas, {total / 1024 / 1024:.1f} MB en uso")
+
+    def invalidate(self, file_id, version):
+        """Elimina la entrada de una versión concreta"""
+        try:
+            os.remove(self._path(file_id, version))
+        except OSError:
+            pass
+
+
+_document_cache = None
+_document_cache_lock = threading.Lock()
+
+
+def get_document_cache():
+    """Cache de documentos compartida por el proceso"""
+    global _document_cache
+    with _document_cache_lock:
+        if _document_cache is None:
+            _document_cache = DocumentCache()
+        return _document_cache
@@ -0,0 +1,68 @@
+"""
+Consulta de metadatos de Drive en lote.
+
+En lugar de un `files().get` por documento solo para conocer el mimeType,
+se resuelven todos los ids de la tabla de candidatos con peticiones batch
+HTTP (hasta 100 por llamada) y una máscara `fields` mínima. La versión
+(md5Checksum / modifiedTime) alimenta las claves de las caches.
+"""
+import time
+
+
+METADATA_FIELDS = "id,mimeType,size,modifiedTime,md5Checksum"
+
+# Límite de Drive para una petición batch
+MAX_BATCH_SIZE = 100
+
+
+def fetch_file_metadata(service, file_ids, batch_size=MAX_BATCH_SIZE):
+    """
+    Devuelve un diccionario {file_id: metadatos} para los ids indicados.
+    Los ids que fallan (permisos, no encontrados) no aparecen en el
+    resultado; quien descarga vuelve entonces a la consulta individual.
+    """
+    unique_ids = [file_id for file_id in dict.fromkeys(file_ids) if file_id]
+    metadata = {}
+    if not unique_ids:
+        return metadata
+
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    failures = {}
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            failures[request_id] = exception
+        else:
+            metadata[request_id] = response
+
+    start = time.time()
+    for offset in range(0, len(unique_ids), batch_size):
+        batch = service.new_batch_http_request(callback=callback)
+        for file_id in unique_ids[offset:offset + batch_size]:
+            batch.add(
+                service.files().get(fileId=file_id, fields=METADATA_FIELDS, supportsAllDrives=True),
+                request_id=file_id,
+            )
+        try:
+            batch.execute()
+        except Exception as e:
+            print(f"Error ejecutando batch de metadatos: {e}")
+
+    print(f"Metadatos obtenidos para {len(metadata)}/{len(unique_ids)} archivos en {time.time() - start:.1f}s")
+    for file_id, error in failures.items():
+        print(f"  ❌ Metadatos de {file_id}: {error}")
+    return metadata
+
+
+def file_version(metadata):
+    """
+    Clave de versión de un archivo de Drive: el md5 del contenido si existe
+    (archivos binarios) o la fecha de modificación (Google Docs).
+    """
+    if not metadata:
+        return None
+    if metadata.get("md5Checksum"):
+        return f"md5:{metadata['md5Checksum']}"
+    if metadata.get("modifiedTime"):
+        return f"mtime:{metadata['modifiedTime']}"
+    return None
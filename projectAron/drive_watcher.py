@@ -0,0 +1,240 @@
+"""
+Vigilancia de cambios en Drive para mantener las caches calientes.
+
+Un hilo en segundo plano consulta el feed `changes.list` de Drive con su
+page token y entrega los cambios a un manejador que invalida y vuelve a
+descargar, extraer y codificar los CVs, fichas y planillas afectados. Así la
+primera búsqueda después de un cambio ya encuentra todo actualizado.
+
+Solo un proceso a la vez consulta el feed (cerrojo de archivo en CACHE_DIR,
+que se reintenta en cada ciclo si el dueño muere); el token persistido hace
+de latido para que los demás sepan que las caches se están manteniendo.
+`FakeDriveChangeFeed` implementa la misma interfaz en memoria.
+"""
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+try:
+    import fcntl
+except ImportError:  # Windows (desarrollo local)
+    fcntl = None
+
+try:
+    from projectAron.config import CACHE_DIR
+    from projectAron.drive_metadata import METADATA_FIELDS
+except ImportError:
+    from config import CACHE_DIR
+    from drive_metadata import METADATA_FIELDS
+
+
+DRIVE_WATCH_INTERVAL = int(os.environ.get('ARON_DRIVE_WATCH_INTERVAL', 60))
+
+CHANGE_FIELDS = f"nextPageToken,newStartPageToken,changes(fileId,removed,file({METADATA_FIELDS},trashed))"
+
+# metadata: metadatos del archivo tal como los devuelve el feed (None si se borró)
+DriveChange = namedtuple('DriveChange', ['file_id', 'removed', 'metadata'])
+
+
+class DriveChangeFeed:
+    """Feed `changes.list` de Drive"""
+
+    def __init__(self, service_factory, page_size=1000):
+        # Se recibe una fábrica para usar el servicio del hilo que consulta
+        self.service_factory = service_factory
+        self.page_size = page_size
+
+    def start_page_token(self):
+        response = self.service_factory().changes().getStartPageToken(supportsAllDrives=True).execute()
+        return response['startPageToken']
+
+    def poll(self, page_token):
+        """Devuelve (cambios, token para la próxima consulta)"""
+        service = self.service_factory()
+        changes = []
+        while True:
+            response = service.changes().list(
+                pageToken=page_token,
+                pageSize=self.page_size,
+                fields=CHANGE_FIELDS,
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+            ).execute()
+            for change in response.get('changes', []):
+                metadata = change.get('file')
+                removed = change.get('removed', False) or bool(metadata and metadata.get('trashed'))
+                changes.append(DriveChange(change.get('fileId'), removed, None if removed else metadata))
+            if 'newStartPageToken' in response:
+                return changes, response['newStartPageToken']
+            page_token = response['nextPageToken']
+
+
+class FakeDriveChangeFeed:
+    """
+    Feed en memoria con la misma interfaz, para pruebas y desarrollo local.
+    `record` agrega un cambio como lo haría Drive; por ejemplo, para probar
+    un manejador con DriveWatcher sin hilo ni credenciales:
+
+    >>> import tempfile
+    >>> feed = FakeDriveChangeFeed()
+    >>> seen = []
+    >>> watcher = DriveWatcher(feed, seen.extend, state_dir=tempfile.mkdtemp())
+    >>> watcher.poll_once()  # primera vez: solo guarda el token
+    0
+    >>> feed.record('cv-1', {'id': 'cv-1', 'md5Checksum': 'abc'})
+    >>> feed.record('cv-2', removed=True)
+    >>> watcher.poll_once()
+    2
+    >>> [(change.file_id, change.removed) for change in seen]
+    [('cv-1', False), ('cv-2', True)]
+    >>> watcher.poll_once()
+    0
+    """
+
+    def __init__(self):
+        self._changes = []
+        self._lock = threading.Lock()
+
+    def record(self, file_id, metadata=None, removed=False):
+        """Registra un cambio como lo haría Drive"""
+        with self._lock:
+            self._changes.append(DriveChange(file_id, removed, None if removed else (metadata or {'id': file_id})))
+
+    def start_page_token(self):
+        with self._lock:
+            return str(len(self._changes))
+
+    def poll(self, page_token):
+        """Devuelve (cambios, token para la próxima consulta)"""
+        with self._lock:
+            return list(self._changes[int(page_token):]), str(len(self._changes))
+
+
+class DriveWatcher:
+    """Hilo que consulta el feed y entrega los cambios a `handler(cambios)`"""
+
+    def __init__(self, feed, handler, interval=DRIVE_WATCH_INTERVAL, state_dir=None):
+        self.feed = feed
+        self.handler = handler
+        self.interval = interval
+        self.state_dir = state_dir or CACHE_DIR
+        os.makedirs(self.state_dir, exist_ok=True)
+        self.token_path = os.path.join(self.state_dir, 'drive_changes.token')
+        self._lock_path = os.path.join(self.state_dir, 'drive_watcher.lock')
+        self._lock_fd = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _load_token(self):
+        try:
+            with open(self.token_path) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _save_token(self, token):
+        fd, temp_path = tempfile.mkstemp(dir=self.state_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(token)
+        os.replace(temp_path, self.token_path)
+
+    def _acquire_leadership(self):
+        """True si este proceso es (o pasa a ser) el que consulta el feed"""
+        if fcntl is None or self._lock_fd is not None:
+            return True
+        fd = os.open(self._lock_path, os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    def poll_once(self):
+        """
+        Consulta el feed una vez y entrega los cambios. El token solo avanza
+        si el manejador terminó sin error, así un fallo no pierde cambios.
+        Devuelve la cantidad de cambios procesados.
+        """
+        token = self._load_token()
+        if token is None:
+            # Primera vez: se cubren los cambios desde ahora; lo guardado antes
+            # sigue validándose por versión (ver covered_since)
+            with open(os.path.join(self.state_dir, 'drive_changes.since'), 'w') as f:
+                f.write(str(time.time()))
+            self._save_token(self.feed.start_page_token())
+            return 0
+        changes, next_token = self.feed.poll(token)
+        if changes:
+            self.handler(changes)
+        self._save_token(next_token)
+        return len(changes)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._acquire_leadership():
+                    self.poll_once()
+            except Exception as e:
+                print(f"Error consultando cambios de Drive: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='aron-drive-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+
+def watcher_is_fresh(state_dir=None, interval=DRIVE_WATCH_INTERVAL):
+    """
+    True si algún proceso consultó el feed hace poco, es decir, si las
+    caches se están invalidando al ritmo de los cambios de Drive.
+    """
+    token_path = os.path.join(state_dir or CACHE_DIR, 'drive_changes.token')
+    try:
+        return time.time() - os.stat(token_path).st_mtime < 3 * interval
+    except OSError:
+        return False
+
+
+def covered_since(state_dir=None, interval=DRIVE_WATCH_INTERVAL):
+    """
+    Momento desde el que el feed cubre todos los cambios, o None si no hay
+    un vigilante activo. Lo guardado en las caches después de ese momento
+    está al día sin consultar versiones a Drive.
+    """
+    state_dir = state_dir or CACHE_DIR
+    if not watcher_is_fresh(state_dir, interval):
+        return None
+    try:
+        with open(os.path.join(state_dir, 'drive_changes.since')) as f:
+            return float(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def start_drive_watcher(feed, handler, interval=DRIVE_WATCH_INTERVAL):
+    """Arranca (una vez por proceso) el hilo de vigilancia"""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = DriveWatcher(feed, handler, interval)
+        return _watcher.start()
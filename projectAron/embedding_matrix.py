@@ -0,0 +1,419 @@
+"""
+Matriz de embeddings compartida entre workers mediante memoria mapeada.
+
+Los vectores de candidatos viven en un archivo float32 (más un índice de ids
+de fila al lado) que cada worker abre con np.memmap, de modo que todos
+comparten las mismas páginas del page cache en lugar de tener cada uno su
+copia. Cada generación se reserva con capacidad de sobra: las filas nuevas se
+escriben a continuación de las existentes y se publican actualizando el
+contador de filas (`<generación>.rows`), así que agregar textos cuesta lo
+que miden esos textos y no la matriz entera. Solo al agotarse la capacidad
+(o al compactar) se escribe una generación nueva, con el doble de lugar, y
+se activa atómicamente reemplazando el puntero CURRENT; los lectores
+detectan el cambio y vuelven a mapear. Las generaciones reemplazadas se
+conservan ARON_MATRIX_GRACE_SECONDS para los lectores que aún las abren.
+"""
+import os
+import re
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows (desarrollo local)
+    fcntl = None
+
+try:
+    from projectAron.config import CACHE_DIR
+    from projectAron.embedding_store import encode_with_store, text_hash
+except ImportError:
+    from config import CACHE_DIR
+    from embedding_store import encode_with_store, text_hash
+
+
+# Fracción de filas obsoletas a partir de la cual se compacta la matriz
+MATRIX_COMPACT_FRACTION = float(os.environ.get('ARON_MATRIX_COMPACT_FRACTION', 0.2))
+# Filas reservadas como mínimo al escribir una generación
+MATRIX_MIN_CAPACITY = int(os.environ.get('ARON_MATRIX_MIN_CAPACITY', 1024))
+# Segundos que se conserva una generación reemplazada antes de borrarla
+MATRIX_GRACE_SECONDS = float(os.environ.get('ARON_MATRIX_GRACE_SECONDS', 600))
+
+_GENERATION_FILES = ('.f32', '.ids', '.rows')
+
+
+class EmbeddingMatrix:
+    """Matriz (filas, dim) float32 mapeada en memoria con su índice id -> fila"""
+
+    def __init__(self, model_name, max_seq_length, directory=None):
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', f"{model_name}-{max_seq_length}")
+        self.directory = directory or os.path.join(CACHE_DIR, 'matrix', slug)
+        os.makedirs(self.directory, exist_ok=True)
+        self._current_path = os.path.join(self.directory, 'CURRENT')
+        self._lock = threading.RLock()
+        self._generation = None
+        self._current_stamp = None
+        self._rows_stamp = None
+        self._mapped = None
+        self._capacity = 0
+        self._dim = 0
+        self._ids_offset = 0
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._ids = []
+        self._row_by_id = {}
+
+    # -- lectura ----------------------------------------------------------
+
+    def refresh(self):
+        """Vuelve a mapear si otro proceso activó una generación nueva o agregó filas"""
+        try:
+            stamp = _stamp(self._current_path)
+        except OSError:
+            return
+        with self._lock:
+            if stamp != self._current_stamp:
+                with open(self._current_path) as f:
+                    generation = f.read().strip()
+                if generation and generation != self._generation:
+                    try:
+                        self._map(generation)
+                    except OSError as e:
+                        # Se reintenta en la próxima lectura
+                        print(f"No se pudo mapear la generación {generation}: {e}")
+                        return
+                self._current_stamp = stamp
+            if self._generation is not None:
+                self._extend()
+
+    def _map(self, generation):
+        base = os.path.join(self.directory, generation)
+        with open(base + '.ids', 'rb') as f:
+            header = f.readline().split()
+            offset = f.tell()
+        capacity, dim = int(header[0]), int(header[1])
+        if capacity and dim:
+            mapped = np.memmap(base + '.f32', dtype=np.float32, mode='r', shape=(capacity, dim))
+        else:
+            mapped = np.zeros((0, dim), dtype=np.float32)
+        self._mapped = mapped
+        self._capacity = capacity if dim else 0
+        self._dim = dim
+        self._ids_offset = offset
+        self._rows_stamp = None
+        self._vectors = mapped[:0]
+        self._ids = []
+        self._row_by_id = {}
+        self._generation = generation
+        self._extend()
+
+    def _extend(self):
+        """Incorpora las filas publicadas desde la última lectura"""
+        base = os.path.join(self.directory, self._generation)
+        try:
+            stamp = _stamp(base + '.rows')
+        except OSError:
+            # Generaciones escritas antes del contador: siempre están llenas
+            stamp, rows = None, self._capacity
+        else:
+            if stamp == self._rows_stamp:
+                return
+            try:
+                with open(base + '.rows') as f:
+                    rows = int(f.read().strip() or 0)
+            except (OSError, ValueError):
+                return
+        if rows > len(self._ids):
+            try:
+                with open(base + '.ids', 'rb') as f:
+                    f.seek(self._ids_offset)
+                    lines = [f.readline() for _ in range(rows - len(self._ids))]
+                    offset = f.tell()
+            except OSError:
+                return
+            new_ids = [line.decode('utf-8').rstrip('\n') for line in lines]
+            for row, row_id in enumerate(new_ids, start=len(self._ids)):
+                self._row_by_id[row_id] = row
+            # Lista nueva: quien ya tomó `ids` no la ve cambiar
+            self._ids = self._ids + new_ids
+            self._ids_offset = offset
+            self._vectors = self._mapped[:rows]
+        self._rows_stamp = stamp
+
+    @property
+    def vectors(self):
+        self.refresh()
+        return self._vectors
+
+    @property
+    def ids(self):
+        self.refresh()
+        return self._ids
+
+    def snapshot(self):
+        """
+        (generación, filas, ids, vectores) leídos de una misma actualización:
+        los ids corresponden fila a fila con los vectores aunque otro worker
+        agregue filas o compacte la matriz a continuación.
+        """
+        self.refresh()
+        with self._lock:
+            return self._generation, len(self._ids), self._ids, self._vectors
+
+    def rows_for(self, row_ids):
+        """Fila de cada id, o None si el id no está en la matriz"""
+        self.refresh()
+        return [self._row_by_id.get(row_id) for row_id in row_ids]
+
+    def gather(self, row_ids):
+        """
+        Devuelve (vectores, ids_ausentes) leyendo filas y vectores de una
+        misma generación. Si falta algún id, los vectores son None.
+        """
+        self.refresh()
+        with self._lock:
+            rows = [self._row_by_id.get(row_id) for row_id in row_ids]
+            missing = [row_id for row_id, row in zip(row_ids, rows) if row is None]
+            if missing:
+                return None, missing
+            return np.asarray(self._vectors[np.asarray(rows, dtype=np.int64)]), []
+
+    # -- escritura --------------------------------------------------------
+
+    def append(self, row_ids, vectors):
+        """
+        Agrega las filas indicadas (los ids que ya estaban se ignoran). Si
+        entran en la capacidad reservada se escriben a continuación de las
+        actuales; si no, se activa una generación nueva con el doble de lugar.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock, _FileLock(os.path.join(self.directory, '.lock')):
+            self.refresh()
+            new_ids = [row_id for row_id in dict.fromkeys(row_ids) if row_id not in self._row_by_id]
+            if not new_ids:
+                return
+            index_by_id = {row_id: i for i, row_id in enumerate(row_ids)}
+            new_vectors = vectors[[index_by_id[row_id] for row_id in new_ids]]
+            old = self._vectors
+            if old.shape[0] and old.shape[1] != new_vectors.shape[1]:
+                raise ValueError(f"Dimensión incompatible: {new_vectors.shape[1]} != {old.shape[1]}")
+            if (self._generation is not None and self._dim == new_vectors.shape[1]
+                    and len(self._ids) + len(new_ids) <= self._capacity):
+                self._append_rows(new_ids, new_vectors)
+            else:
+                self._write_generation(self._ids + new_ids, [old, new_vectors])
+
+    def _append_rows(self, new_ids, new_vectors):
+        """Escribe filas en la capacidad libre de la generación activa y las publica"""
+        base = os.path.join(self.directory, self._generation)
+        rows = len(self._ids)
+        with open(base + '.f32', 'r+b') as f:
+            f.seek(rows * self._dim * 4)
+            for start in range(0, len(new_vectors), 4096):
+                f.write(np.ascontiguousarray(new_vectors[start:start + 4096], dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(base + '.ids', 'r+b') as f:
+            # Desde el final publicado: descarta lo que dejó un escritor interrumpido
+            f.seek(self._ids_offset)
+            f.write(''.join(f"{row_id}\n" for row_id in new_ids).encode('utf-8'))
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+        _write_rows(base, rows + len(new_ids))
+        self._extend()
+
+    def discard(self, row_ids, min_fraction=MATRIX_COMPACT_FRACTION):
+        """
+        Marca filas como obsoletas (sus textos ya no pertenecen a ningún
+        candidato). Se acumulan en el archivo `stale` y la matriz solo se
+        reescribe sin ellas cuando superan `min_fraction` de las filas. Si un
+        texto vuelve a aparecer antes, su fila se sigue usando; si reaparece
+        después, se recupera del almacén de embeddings sin recodificar.
+        """
+        stale_path = os.path.join(self.directory, 'stale')
+        with self._lock, _FileLock(os.path.join(self.directory, '.lock')):
+            self.refresh()
+            try:
+                with open(stale_path) as f:
+                    stale = {line.rstrip('\n') for line in f if line.strip()}
+            except OSError:
+                stale = set()
+            stale |= {row_id for row_id in row_ids if row_id in self._row_by_id}
+            stale &= set(self._row_by_id)
+
+            if stale and len(stale) >= min_fraction * len(self._ids):
+                keep = [row for row, row_id in enumerate(self._ids) if row_id not in stale]
+                vectors = self._vectors
+                blocks = [np.asarray(vectors[keep[start:start + 4096]]) for start in range(0, len(keep), 4096)]
+                if not blocks:
+                    blocks = [np.zeros((0, vectors.shape[1]), dtype=np.float32)]
+                self._write_generation([self._ids[row] for row in keep], blocks)
+                stale = set()
+
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                f.writelines(f"{row_id}\n" for row_id in stale)
+            os.replace(temp_path, stale_path)
+
+    def rebuild(self, row_ids, vectors):
+        """Reemplaza la matriz completa (p. ej. para purgar filas obsoletas)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock, _FileLock(os.path.join(self.directory, '.lock')):
+            self._write_generation(list(row_ids), [vectors])
+
+    def _write_generation(self, ids, blocks):
+        dim = next((block.shape[1] for block in blocks if block.ndim == 2 and block.shape[0]), 0)
+        capacity = max(2 * len(ids), MATRIX_MIN_CAPACITY) if dim else 0
+        generation = f"gen-{time.time_ns()}-{os.getpid()}"
+        base = os.path.join(self.directory, generation)
+
+        with open(base + '.f32', 'wb') as f:
+            for block in blocks:
+                if block.shape[0]:
+                    # Escritura por bloques para no materializar la matriz entera
+                    for start in range(0, block.shape[0], 4096):
+                        f.write(np.ascontiguousarray(block[start:start + 4096], dtype=np.float32).tobytes())
+            # La capacidad libre queda como hueco del archivo hasta que se use
+            f.truncate(capacity * dim * 4)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(base + '.ids', 'w') as f:
+            f.write(f"{capacity} {dim}\n")
+            for row_id in ids:
+                f.write(f"{row_id}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        _write_rows(base, len(ids))
+
+        # Cambio atómico del puntero a la generación activa
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(generation)
+        os.replace(temp_path, self._current_path)
+        print(f"Matriz de embeddings: generación {generation} con {len(ids)} filas (capacidad {capacity})")
+
+        previous = self._generation
+        if previous is not None:
+            # El plazo de gracia de la generación reemplazada corre desde ahora
+            for ext in _GENERATION_FILES:
+                try:
+                    os.utime(os.path.join(self.directory, previous + ext))
+                except OSError:
+                    pass
+        self._current_stamp = None
+        self.refresh()
+        self._cleanup(current=generation)
+
+    def _cleanup(self, current, grace=MATRIX_GRACE_SECONDS):
+        """
+        Borra las generaciones reemplazadas hace más de `grace` segundos. Un
+        lector que acaba de leer CURRENT puede estar por abrir los archivos de
+        la anterior; los que ya la mapearon conservan sus páginas igual.
+        """
+        now = time.time()
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if ext in _GENERATION_FILES and stem.startswith('gen-') and stem != current:
+                path = os.path.join(self.directory, name)
+                try:
+                    if now - os.stat(path).st_mtime > grace:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+
+def _stamp(path):
+    """Identidad de un archivo reemplazado atómicamente: cambia con cada os.replace"""
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _write_rows(base, rows):
+    """Publica el número de filas válidas de una generación"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(base), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        f.write(str(rows))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, base + '.rows')
+
+
+class _FileLock:
+    """
+    Cerrojo entre procesos para que un solo worker escriba a la vez. Con
+    blocking=False no espera: `acquired` indica si se obtuvo.
+    """
+
+    def __init__(self, path, blocking=True):
+        self.path = path
+        self.blocking = blocking
+        self.acquired = False
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is None:
+            self.acquired = True
+            return self
+        self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(self._fd)
+            self._fd = None
+            return self
+        self.acquired = True
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self.acquired = False
+
+
+_matrices = {}
+_matrices_lock = threading.Lock()
+
+
+def get_embedding_matrix(model_name, max_seq_length):
+    """Matriz compartida del proceso para un modelo"""
+    key = (model_name, int(max_seq_length or 0))
+    with _matrices_lock:
+        if key not in _matrices:
+            _matrices[key] = EmbeddingMatrix(*key)
+        return _matrices[key]
+
+
+def candidate_rows(model, model_name, texts):
+    """
+    Garantiza que cada texto tenga su fila en la matriz compartida y devuelve
+    (matriz, ids de fila). Los textos que aún no están se codifican (o se
+    leen del almacén) y se agregan a la matriz.
+    """
+    matrix = get_embedding_matrix(model_name, getattr(model, 'max_seq_length', 0))
+    hashes = [text_hash(text) for text in texts]
+    rows = matrix.rows_for(hashes)
+
+    missing_positions = [i for i, row in enumerate(rows) if row is None]
+    if missing_positions:
+        new_vectors = encode_with_store(model, model_name, [texts[i] for i in missing_positions])
+        try:
+            matrix.append([hashes[i] for i in missing_positions], new_vectors)
+        except Exception as e:
+            print(f"No se pudo actualizar la matriz de embeddings: {e}")
+    return matrix, hashes
+
+
+def candidate_embeddings(model, model_name, texts):
+    """
+    Devuelve (embeddings, ids de fila) de `texts`, leyendo de la matriz
+    compartida y codificando solo los textos que aún no están en ella.
+    """
+    matrix, hashes = candidate_rows(model, model_name, texts)
+    vectors, _ = matrix.gather(hashes)
+    if vectors is None:
+        vectors = encode_with_store(model, model_name, texts)
+    return vectors, hashes
@@ -0,0 +1,165 @@
+"""
+Almacén persistente de embeddings de candidatos.
+
+Cada vector se guarda como float32 crudo en SQLite, indexado por el hash del
+texto normalizado, el modelo y su max_seq_length (un cambio de cualquiera de
+los tres produce embeddings distintos). Así una búsqueda solo codifica los
+candidatos nuevos o modificados, en un único encode por lotes.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+try:
+    from projectAron.config import CACHE_DIR
+    from projectAron.text_store import normalize_text
+    from projectAron.single_flight import SingleFlight
+except ImportError:
+    from config import CACHE_DIR
+    from text_store import normalize_text
+    from single_flight import SingleFlight
+
+
+EMBEDDING_STORE_PATH = os.environ.get('ARON_EMBEDDING_STORE', os.path.join(CACHE_DIR, 'embeddings.sqlite3'))
+ENCODE_BATCH_SIZE = int(os.environ.get('ARON_ENCODE_BATCH_SIZE', 32))
+
+
+def text_hash(text, normalized=False):
+    """Hash estable del texto normalizado"""
+    if not normalized:
+        text = normalize_text(text)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """Mapa persistente (hash de texto, modelo, max_seq_length) -> vector float32"""
+
+    def __init__(self, path=EMBEDDING_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " text_hash TEXT NOT NULL,"
+                " model TEXT NOT NULL,"
+                " max_seq_length INTEGER NOT NULL,"
+                " dim INTEGER NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (text_hash, model, max_seq_length))"
+            )
+
+    def _connection(self):
+        """Una conexión por hilo; sqlite3 no permite compartirlas entre hilos"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_many(self, hashes, model, max_seq_length):
+        """Devuelve {hash: vector} para los hashes que ya tienen embedding"""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        conn = self._connection()
+        # SQLite limita el número de parámetros por consulta
+        for offset in range(0, len(unique), 500):
+            chunk = unique[offset:offset + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT text_hash, dim, vector FROM embeddings"
+                f" WHERE model = ? AND max_seq_length = ? AND text_hash IN ({placeholders})",
+                [model, max_seq_length] + chunk,
+            )
+            for hash_, dim, blob in rows:
+                found[hash_] = np.frombuffer(blob, dtype=np.float32, count=dim)
+        return found
+
+    def put_many(self, items, model, max_seq_length):
+        """Guarda pares (hash, vector)"""
+        now = time.time()
+        rows = []
+        for hash_, vector in items:
+            vector = np.ascontiguousarray(vector, dtype=np.float32).reshape(-1)
+            rows.append((hash_, model, max_seq_length, vector.shape[0], vector.tobytes(), now))
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (text_hash, model, max_seq_length, dim, vector, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+
+_embedding_store = None
+_embedding_store_lock = threading.Lock()
+
+
+def get_embedding_store():
+    """Almacén de embeddings compartido por el proceso"""
+    global _embedding_store
+    with _embedding_store_lock:
+        if _embedding_store is None:
+            _embedding_store = EmbeddingStore()
+        return _embedding_store
+
+
+# Codificaciones en curso, por (modelo, max_seq_length, hash del texto)
+_encode_flight = SingleFlight()
+
+
+def encode_with_store(model, model_name, texts, store=None, batch_size=ENCODE_BATCH_SIZE):
+    """
+    Devuelve una matriz float32 (len(texts), dim) con el embedding de cada
+    texto. Los que ya están en el almacén se leen de ahí; el resto se
+    codifica en un único encode por lotes y se guarda. Los textos que otra
+    búsqueda ya está codificando no se repiten: se espera su resultado.
+    """
+    store = store or get_embedding_store()
+    max_seq_length = int(getattr(model, 'max_seq_length', 0) or 0)
+    normalized = [normalize_text(text) for text in texts]
+    hashes = [text_hash(text, normalized=True) for text in normalized]
+
+    vectors = store.get_many(hashes, model_name, max_seq_length)
+    missing = list(dict.fromkeys(h for h in hashes if h not in vectors))
+    reused = sum(1 for h in hashes if h in vectors)
+    print(f"Embeddings: {reused}/{len(hashes)} reutilizados, {len(missing)} por codificar")
+
+    if missing:
+        owned, waiting = _encode_flight.acquire([(model_name, max_seq_length, h) for h in missing])
+        own_hashes = [key[2] for key in owned]
+        if own_hashes:
+            text_by_hash = dict(zip(hashes, normalized))
+            start = time.time()
+            try:
+                encoded = model.encode(
+                    [text_by_hash[h] for h in own_hashes],
+                    batch_size=batch_size,
+                    convert_to_numpy=True,
+                    show_progress_bar=False,
+                )
+                encoded = np.asarray(encoded, dtype=np.float32)
+                store.put_many(zip(own_hashes, encoded), model_name, max_seq_length)
+            except Exception as e:
+                _encode_flight.release(owned, error=e)
+                raise
+            print(f"Codificados {len(own_hashes)} textos en {time.time() - start:.1f}s")
+            vectors.update(zip(own_hashes, encoded))
+            _encode_flight.release(owned, dict(zip(owned, encoded)))
+        if waiting:
+            print(f"Esperando {len(waiting)} textos que ya codifica otra búsqueda")
+            for key, call in waiting.items():
+                vectors[key[2]] = call.wait()
+
+    if not hashes:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.vstack([vectors[h] for h in hashes]).astype(np.float32, copy=False)
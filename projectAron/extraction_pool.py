@@ -0,0 +1,181 @@
+"""
+Extracción de texto de PDF/DOCX en un pool de procesos.
+
+El parseo con PyMuPDF es CPU-bound y retiene el GIL durante mucho tiempo en
+CVs grandes, así que una vez que las descargas son concurrentes pasa a ser el
+siguiente cuello de botella serial. Este módulo recibe los bytes crudos de
+cada documento, los parsea en procesos aparte (partiendo los PDF muy largos
+en rangos de páginas) y devuelve el texto en orden.
+
+Reparto de núcleos por defecto: el pool usa la mitad de los núcleos del
+proceso (al menos dos si hay dos o más) y el modelo conserva los hilos que
+torch elige solo. Ambos no compiten mucho porque en una búsqueda la
+extracción termina antes de codificar. Si ARON_MODEL_THREADS fija los hilos
+del modelo, el pool toma los núcleos restantes; ARON_EXTRACTION_PROCESSES
+fija el tamaño del pool directamente.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+try:
+    from projectAron.config import MODEL_THREADS
+except ImportError:
+    from config import MODEL_THREADS
+
+
+# 0 = automático (ver default_pool_size)
+EXTRACTION_PROCESSES = int(os.environ.get('ARON_EXTRACTION_PROCESSES', 0))
+# Los PDF con más páginas que esto se reparten en rangos entre procesos
+PDF_SPLIT_PAGES = int(os.environ.get('ARON_PDF_SPLIT_PAGES', 40))
+
+
+def available_cores():
+    """Núcleos realmente asignados al proceso (el dyno puede tener menos que la máquina)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def default_pool_size():
+    """Procesos del pool según el reparto descrito en el módulo"""
+    if EXTRACTION_PROCESSES > 0:
+        return EXTRACTION_PROCESSES
+    cores = available_cores()
+    if MODEL_THREADS:
+        return max(1, cores - MODEL_THREADS)
+    return max(min(cores, 2), cores // 2)
+
+
+def extract_pdf_pages(data, start=0, end=None):
+    """Extrae el texto de las páginas [start, end) de un PDF en memoria"""
+    import fitz
+    pages = []
+    try:
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            end = doc.page_count if end is None else min(end, doc.page_count)
+            for page_number in range(start, end):
+                pages.append(doc.load_page(page_number).get_text("text"))
+    except Exception as e:
+        print(f"Error leyendo PDF en memoria ({len(data)} bytes, páginas {start}-{end}): {e}")
+    return "\n".join(pages).strip()
+
+
+def extract_docx(data):
+    """Extrae el texto de los párrafos de un DOCX en memoria"""
+    import docx
+    try:
+        doc = docx.Document(BytesIO(data))
+        return "\n".join(p.text for p in doc.paragraphs).strip()
+    except Exception as e:
+        print(f"Error leyendo DOCX en memoria ({len(data)} bytes): {e}")
+        return ""
+
+
+def pdf_page_count(data):
+    import fitz
+    try:
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            return doc.page_count
+    except Exception:
+        return 0
+
+
+class ExtractionExecutor:
+    """
+    Pool de procesos para extraer texto. Con un solo proceso disponible la
+    extracción se hace en el propio hilo, sin coste de serialización.
+    """
+
+    def __init__(self, processes=None, split_pages=PDF_SPLIT_PAGES):
+        self.processes = processes or default_pool_size()
+        self.split_pages = split_pages
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        if self.processes <= 1:
+            return None
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                # forkserver: hacer fork de un proceso con hilos activos puede bloquearse
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context(method),
+                )
+                self._pid = os.getpid()
+                print(f"Pool de extracción iniciado con {self.processes} procesos ({method})")
+            return self._pool
+
+    def _submit(self, fn, *args):
+        pool = self._get_pool()
+        if pool is None:
+            return _CompletedCall(fn, *args)
+        return pool.submit(fn, *args)
+
+    def submit(self, data, extension):
+        """
+        Encola la extracción de un documento ("pdf" o "docx") y devuelve un
+        objeto con `result()` que entrega el texto.
+        """
+        if extension == "docx":
+            return self._submit(extract_docx, data)
+
+        page_count = pdf_page_count(data) if self.processes > 1 else 0
+        if page_count <= self.split_pages:
+            return self._submit(extract_pdf_pages, data)
+
+        ranges = range(0, page_count, self.split_pages)
+        return _JoinedResult([self._submit(extract_pdf_pages, data, start, start + self.split_pages) for start in ranges])
+
+    def extract(self, data, extension):
+        """Extrae y devuelve el texto de un documento, esperando el resultado"""
+        return self.submit(data, extension).result()
+
+    def extract_many(self, documents):
+        """Extrae en paralelo una lista de (bytes, extensión) y devuelve los textos en orden"""
+        futures = [self.submit(data, extension) for data, extension in documents]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+class _CompletedCall:
+    """Ejecución en línea con la misma interfaz que un Future"""
+
+    def __init__(self, fn, *args):
+        self._value = fn(*args)
+
+    def result(self):
+        return self._value
+
+
+class _JoinedResult:
+    """Une en orden los textos de los rangos de páginas de un mismo PDF"""
+
+    def __init__(self, futures):
+        self._futures = futures
+
+    def result(self):
+        return "\n".join(part for part in (f.result() for f in self._futures) if part).strip()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_extraction_executor():
+    """Pool de extracción compartido por el proceso"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ExtractionExecutor()
+        return _executor
@@ -0,0 +1,64 @@
+"""
+Pool acotado de descargas concurrentes.
+
+Las descargas de Drive están dominadas por la latencia de red, así que se
+solapan en un ThreadPoolExecutor de tamaño configurable. Los resultados se
+devuelven en el mismo orden que las claves de entrada y los errores de cada
+archivo se reportan sin abortar el lote.
+"""
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+DEFAULT_WORKERS = int(os.environ.get('ARON_DOWNLOAD_WORKERS', 8))
+
+FetchResult = namedtuple('FetchResult', ['key', 'value', 'error'])
+
+
+def fetch_in_order(keys, fetch_fn, max_workers=None, label="archivos", on_progress=None):
+    """
+    Ejecuta `fetch_fn(key)` para cada clave con como mucho `max_workers`
+    hilos y devuelve una lista de FetchResult en el orden de `keys`.
+
+    Las claves repetidas se descargan una sola vez. Si `fetch_fn` lanza una
+    excepción, el resultado de esa clave lleva `value=None` y el error.
+    `on_progress(resultado, terminadas, total)` se llama al completar cada clave.
+    """
+    keys = list(keys)
+    if not keys:
+        return []
+
+    unique_keys = list(dict.fromkeys(keys))
+    workers = max(1, min(max_workers or DEFAULT_WORKERS, len(unique_keys)))
+
+    def run(key):
+        try:
+            return FetchResult(key, fetch_fn(key), None)
+        except Exception as e:
+            return FetchResult(key, None, e)
+
+    start = time.time()
+    results = {}
+
+    def collect(result):
+        results[result.key] = result
+        if on_progress is not None:
+            on_progress(result, len(results), len(unique_keys))
+
+    if workers == 1:
+        for key in unique_keys:
+            collect(run(key))
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='aron-fetch') as pool:
+            for future in as_completed([pool.submit(run, key) for key in unique_keys]):
+                collect(future.result())
+
+    failures = [r for r in results.values() if r.error is not None]
+    print(f"Descargados {len(unique_keys) - len(failures)}/{len(unique_keys)} {label} "
+          f"con {workers} workers en {time.time() - start:.1f}s")
+    for failure in failures:
+        print(f"  ❌ {failure.key}: {failure.error}")
+
+    return [results[key] for key in keys]
@@ -0,0 +1,172 @@
+"""
+Registro de clientes de Google compartido por todo el proceso.
+
+Mantiene un único cliente gspread autorizado y un único servicio de Drive por
+proceso worker, en lugar de volver a leer las credenciales y reconstruir el
+documento de discovery en cada llamada. El token se refresca en segundo plano
+antes de expirar, así las peticiones nunca pagan ese round-trip.
+"""
+import copy
+import datetime
+import os
+import threading
+import traceback
+
+import httplib2
+import google_auth_httplib2
+from google.auth.transport.requests import Request
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+
+
+SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+# Segundos antes de la expiración en los que se refresca el token
+REFRESH_MARGIN_SECONDS = int(os.environ.get('ARON_TOKEN_REFRESH_MARGIN', 300))
+
+
+class GoogleClientRegistry:
+    """
+    Cache thread-safe del cliente gspread y del servicio de Drive.
+
+    `client_factory` es la función de autenticación del módulo que lo usa
+    (por ejemplo `authenticate_google_sheets`) y solo se invoca una vez por
+    proceso. Tras un fork (gunicorn) el registro detecta el cambio de PID y
+    vuelve a autenticar, porque los sockets heredados no se pueden compartir.
+    """
+
+    def __init__(self, client_factory, refresh_margin=REFRESH_MARGIN_SECONDS):
+        self._client_factory = client_factory
+        self._refresh_margin = refresh_margin
+        self._lock = threading.RLock()
+        # Un solo refresco de token a la vez, sin bloquear a quien pide clientes
+        self._refresh_lock = threading.Lock()
+        self._local = threading.local()
+        self._pid = None
+        self._client = None
+        self._drive_service = None
+        self._refresher = None
+        self._stop = threading.Event()
+
+    def _ensure_process(self):
+        """Descarta el estado heredado si estamos en un proceso nuevo"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._client = None
+            self._drive_service = None
+            self._local = threading.local()
+            self._refresher = None
+            self._stop = threading.Event()
+
+    def get_client(self):
+        """Devuelve el cliente gspread del proceso, autenticando si hace falta"""
+        with self._lock:
+            self._ensure_process()
+            if self._client is None:
+                self._client = self._client_factory()
+                self._start_refresher()
+            return self._client
+
+    def get_credentials(self):
+        """Credenciales del cliente gspread (google.auth u oauth2client)"""
+        client = self.get_client()
+        return getattr(client, 'auth', None)
+
+    def get_drive_service(self):
+        """
+        Devuelve el servicio de Drive v3 del proceso.
+
+        El objeto se construye una sola vez, pero cada petición se ejecuta
+        sobre un httplib2.Http propio del hilo, porque httplib2 no es
+        thread-safe y el servicio se usa desde el pool de descargas.
+        """
+        with self._lock:
+            self._ensure_process()
+            if self._drive_service is None:
+                credentials = self.get_credentials()
+                if credentials is None:
+                    raise RuntimeError("El cliente de Google no expone credenciales para Drive")
+                self._drive_service = build(
+                    'drive', 'v3',
+                    http=self._thread_http(),
+                    requestBuilder=self._build_request,
+                    cache_discovery=False,
+                )
+            return self._drive_service
+
+    def _thread_http(self):
+        """httplib2.Http autorizado y exclusivo del hilo actual"""
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            credentials = self.get_credentials()
+            if hasattr(credentials, 'authorize'):
+                # oauth2client
+                http = credentials.authorize(httplib2.Http())
+            else:
+                http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http())
+            self._local.http = http
+        return http
+
+    def _build_request(self, http, *args, **kwargs):
+        return HttpRequest(self._thread_http(), *args, **kwargs)
+
+    def refresh(self, force=False):
+        """
+        Refresca el token si está por expirar (o siempre, con force=True). La
+        petición de red se hace sobre una copia de las credenciales y sin el
+        cerrojo del registro; solo el cambio de token se hace con él tomado.
+        """
+        with self._lock:
+            credentials = self.get_credentials()
+        if credentials is None or not hasattr(credentials, 'expiry'):
+            return False
+        with self._refresh_lock:
+            # Otro hilo pudo haberlo refrescado mientras se esperaba el cerrojo
+            if not force and credentials.valid and self._seconds_to_expiry(credentials) > self._refresh_margin:
+                return False
+            fresh = copy.copy(credentials)
+            fresh.refresh(Request())
+            with self._lock:
+                credentials.token = fresh.token
+                credentials.expiry = fresh.expiry
+        print(f"Token de Google refrescado, expira en {credentials.expiry}")
+        return True
+
+    @staticmethod
+    def _seconds_to_expiry(credentials):
+        if credentials.expiry is None:
+            return 0
+        expiry = credentials.expiry
+        if expiry.tzinfo is None:
+            # google-auth guarda la expiración como UTC sin zona horaria
+            expiry = expiry.replace(tzinfo=datetime.timezone.utc)
+        return (expiry - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+
+    def _start_refresher(self):
+        if self._refresher is not None:
+            return
+        if not hasattr(getattr(self._client, 'auth', None), 'expiry'):
+            # oauth2client refresca por su cuenta al recibir un 401
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, name='google-token-refresh', daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self):
+        stop = self._stop
+        while not stop.is_set():
+            try:
+                self.refresh()
+                credentials = self.get_credentials()
+                wait = max(self._seconds_to_expiry(credentials) - self._refresh_margin, 30)
+            except Exception as e:
+                print(f"Error refrescando el token de Google: {e}")
+                traceback.print_exc()
+                wait = 60
+            stop.wait(wait)
+
+    def reset(self):
+        """Olvida el cliente y el servicio; la próxima llamada vuelve a autenticar"""
+        with self._lock:
+            self._stop.set()
+            self._pid = None
+            self._ensure_process()
@@ -0,0 +1,24 @@
+# Configuración de gunicorn para appServer (se lee automáticamente desde este directorio)
+import os
+
+
+def post_worker_init(worker):
+    """Precarga el modelo de embeddings y arranca el vigilante de Drive en cada worker"""
+    if os.environ.get('ARON_WARM_MODEL', '1') == '1':
+        try:
+            # Mismo módulo que usa codigoARONconIA: si no, el modelo se cargaría dos veces
+            try:
+                from projectAron.model_manager import warm_up
+            except ImportError:
+                from model_manager import warm_up
+            warm_up()
+        except Exception as e:
+            worker.log.warning(f"No se pudo precargar el modelo de embeddings: {e}")
+
+    # Solo un worker consulta el feed a la vez; el resto toma el relevo si muere
+    if os.environ.get('ARON_DRIVE_WATCH', '1') == '1':
+        try:
+            from codigoARONconIA import start_watching_drive
+            start_watching_drive()
+        except Exception as e:
+            worker.log.warning(f"No se pudo iniciar el vigilante de cambios de Drive: {e}")
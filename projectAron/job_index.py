@@ -0,0 +1,108 @@
+"""
+Índice de embeddings de descripciones de puesto, para la búsqueda inversa.
+
+Para responder "¿qué puestos abiertos le sirven a este candidato?" sin una
+búsqueda completa por puesto, se guardan normalizados los embeddings de las
+descripciones distintas de la columna JOB DESCRIPTION de cada planilla. Una
+consulta es un producto matriz-vector contra ese índice, usando el embedding
+ya persistido del candidato.
+
+El índice vive en CACHE_DIR (un .npz por planilla, escrito de forma atómica
+y compartido por los workers) y recuerda la versión de la instantánea de
+hojas y el modelo con que se construyó; si las hojas se resincronizaron con
+cambios o cambió el modelo, se reconstruye.
+"""
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+try:
+    from projectAron.config import CACHE_DIR
+except ImportError:
+    from config import CACHE_DIR
+
+
+JOB_INDEX_DIR = os.environ.get('ARON_JOB_INDEX_DIR', os.path.join(CACHE_DIR, 'job_index'))
+
+
+class JobIndex:
+    """Descripciones de puesto de una planilla y sus embeddings normalizados"""
+
+    def __init__(self, spreadsheet_id, directory=None):
+        self.directory = directory or JOB_INDEX_DIR
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"{spreadsheet_id}.npz")
+        self.descriptions = []
+        self.vectors = None
+        self.meta = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """Recarga el archivo si otro proceso lo reconstruyó"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        with np.load(self.path, allow_pickle=False) as data:
+            self.vectors = data["vectors"]
+            self.descriptions = data["descriptions"].tolist()
+            self.meta = json.loads(str(data["meta"]))
+        self._mtime = mtime
+
+    def is_current(self, meta):
+        """True si el índice se construyó con estos metadatos (versión de hojas y modelo)"""
+        with self._lock:
+            self._refresh()
+            return self.meta == meta
+
+    def build(self, descriptions, vectors, meta):
+        """Reemplaza el índice con estas descripciones y sus embeddings"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(descriptions):
+            vectors = np.zeros((0, 0), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, vectors=vectors, descriptions=np.array(descriptions, dtype=str),
+                     meta=np.array(json.dumps(meta)))
+        with self._lock:
+            os.replace(temp_path, self.path)
+            self.vectors = vectors
+            self.descriptions = list(descriptions)
+            self.meta = meta
+            self._mtime = os.stat(self.path).st_mtime
+        print(f"Índice de puestos actualizado: {len(descriptions)} descripciones")
+
+    def search(self, query, k):
+        """[(descripción, similitud)] de los k puestos más parecidos a `query`"""
+        with self._lock:
+            self._refresh()
+            vectors, descriptions = self.vectors, self.descriptions
+        if vectors is None or not len(descriptions) or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        scores = vectors @ (query / norm if norm else query)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(descriptions[i], float(scores[i])) for i in top]
+
+
+_job_indexes = {}
+_job_indexes_lock = threading.Lock()
+
+
+def get_job_index(spreadsheet_id):
+    """Índice de puestos del proceso para una planilla"""
+    with _job_indexes_lock:
+        if spreadsheet_id not in _job_indexes:
+            _job_indexes[spreadsheet_id] = JobIndex(spreadsheet_id)
+        return _job_indexes[spreadsheet_id]
@@ -0,0 +1,325 @@
+"""
+Búsquedas como trabajos en segundo plano.
+
+`/get_candidates` encola la búsqueda y responde enseguida con un id de
+trabajo; el cliente consulta `/jobs/<id>` (o se suscribe a los eventos de
+`/jobs/<id>/stream`) para ver la etapa en curso, el top-N provisional y, al
+terminar, la URL del resultado. Así una búsqueda larga no choca con el
+timeout de gunicorn ni bloquea al único worker.
+
+Los trabajos corren en un pool local de hilos (ARON_JOB_WORKERS) y cada
+usuario tiene un máximo de trabajos simultáneos (ARON_JOB_USER_LIMIT) y de
+trabajos pendientes (ARON_JOB_QUEUE_LIMIT). Una búsqueda idéntica a otra que
+todavía no terminó (mismos argumentos, p. ej. un doble clic o dos
+reclutadores con la misma consulta) no crea un trabajo nuevo: se suma al
+existente y comparte sus eventos y su resultado. El estado vive en la
+memoria del proceso, por eso los Procfile usan un solo worker de gunicorn.
+"""
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+JOB_WORKERS = int(os.environ.get('ARON_JOB_WORKERS', 2))
+JOB_USER_LIMIT = int(os.environ.get('ARON_JOB_USER_LIMIT', 1))
+JOB_QUEUE_LIMIT = int(os.environ.get('ARON_JOB_QUEUE_LIMIT', 5))
+# Segundos que se conservan los trabajos terminados
+JOB_TTL = int(os.environ.get('ARON_JOB_TTL', 3600))
+# "thread" (pool de hilos) o "inline" (en la misma petición, para depurar)
+JOB_EXECUTOR = os.environ.get('ARON_JOB_EXECUTOR', 'thread')
+# Segundos entre comentarios keep-alive del stream de eventos
+JOB_STREAM_KEEPALIVE = int(os.environ.get('ARON_JOB_STREAM_KEEPALIVE', 15))
+# Streams de eventos abiertos a la vez: cada uno ocupa un hilo de gunicorn
+# durante toda la búsqueda, así que se deja lugar para el resto de peticiones
+JOB_STREAM_LIMIT = int(os.environ.get('ARON_JOB_STREAM_LIMIT', 2))
+
+FINAL_STAGES = ("done", "error", "cancelled")
+# Etapas de progreso de las que solo interesa el último evento
+COLLAPSED_STAGES = ("documents", "encoding", "partial")
+
+
+class JobLimitError(Exception):
+    """El usuario ya tiene demasiados trabajos pendientes"""
+
+
+class JobCancelled(Exception):
+    """El trabajo fue cancelado; se lanza desde el siguiente aviso de progreso"""
+
+
+class Job:
+    """Un trabajo y su progreso"""
+
+    def __init__(self, user, fn, args, kwargs, key=None):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        # Usuarios que siguen el trabajo (el que lo creó y los que se sumaron)
+        self.owners = {user}
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.partial = None
+        self.cancelled = False
+        # Eventos numerados: los hitos se guardan todos; de las etapas de
+        # progreso solo el último, así un suscriptor tardío recibe el estado
+        # actual y no toda la historia
+        self.last_seq = 0
+        self._milestones = []
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def report(self, stage, **details):
+        """
+        Callback de progreso: etapa actual y sus detalles (p. ej. done/total).
+        La etapa "partial" lleva un top-N provisional y no reemplaza la etapa
+        en curso; las etapas finales fijan además el estado del trabajo. Si el
+        trabajo fue cancelado, lanza JobCancelled.
+        """
+        with self._changed:
+            if stage == "partial":
+                self.partial = details
+            else:
+                self.stage = stage
+                self.progress = details
+            if stage in FINAL_STAGES:
+                self.status = stage
+            self.last_seq += 1
+            event = dict(details, stage=stage, seq=self.last_seq)
+            if stage in COLLAPSED_STAGES:
+                self._latest[stage] = event
+            else:
+                self._milestones.append(event)
+            self._changed.notify_all()
+            if self.cancelled and stage not in FINAL_STAGES:
+                raise JobCancelled()
+
+    def cancel(self):
+        """Pide detener el trabajo en su próximo aviso de progreso"""
+        with self._changed:
+            self.cancelled = True
+            self._changed.notify_all()
+
+    def wait_events(self, cursor, timeout):
+        """
+        Eventos con número mayor que `cursor`, en orden, esperando hasta
+        `timeout` segundos si no hay nuevos
+        """
+        with self._changed:
+            if self.last_seq <= cursor and not self.finished:
+                self._changed.wait(timeout)
+            events = [event for event in self._milestones if event["seq"] > cursor]
+            events += [event for event in self._latest.values() if event["seq"] > cursor]
+            return sorted(events, key=lambda event: event["seq"])
+
+    @property
+    def finished(self):
+        return self.status in FINAL_STAGES
+
+    def to_dict(self):
+        with self._lock:
+            data = {
+                "id": self.id,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": dict(self.progress),
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "partial": self.partial,
+            }
+        if self.status == "done":
+            data["result"] = self.result
+        elif self.status == "error":
+            data["error"] = self.error
+        return data
+
+
+class JobManager:
+    """Cola de trabajos con límite global de hilos y límites por usuario"""
+
+    def __init__(self, workers=JOB_WORKERS, user_limit=JOB_USER_LIMIT,
+                 queue_limit=JOB_QUEUE_LIMIT, ttl=JOB_TTL, executor=JOB_EXECUTOR):
+        self.user_limit = max(1, user_limit)
+        self.queue_limit = max(self.user_limit, queue_limit)
+        self.ttl = ttl
+        self.inline = executor == "inline"
+        self._pool = None if self.inline else ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix='aron-job')
+        self._jobs = {}
+        self._pending = deque()
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def submit(self, user, fn, *args, **kwargs):
+        """
+        Encola `fn(*args, progress=job.report, **kwargs)`; su valor de retorno
+        queda como resultado del trabajo. Si ya hay un trabajo sin terminar
+        con la misma función y argumentos, el usuario se suma a ese. Lanza
+        JobLimitError si el usuario ya tiene `queue_limit` trabajos sin
+        terminar; solo sumarse a un trabajo que ya está corriendo (o que el
+        usuario ya sigue) no cuenta contra el límite.
+        """
+        key = repr((fn.__module__, fn.__qualname__, args, sorted(kwargs.items())))
+        with self._lock:
+            self._expire()
+            shared = next((job for job in self._jobs.values()
+                           if job.key == key and not job.finished and not job.cancelled), None)
+            if shared is not None and (shared.started_at is not None or user in shared.owners):
+                shared.owners.add(user)
+                print(f"Búsqueda idéntica en curso: se comparte el trabajo {shared.id}")
+                return shared
+            active = sum(1 for job in self._jobs.values() if user in job.owners and not job.finished)
+            if active >= self.queue_limit:
+                raise JobLimitError(f"Ya hay {active} búsquedas en curso para este usuario")
+            if shared is not None:
+                # Trabajo aún en cola: sumarse ocupa un lugar del usuario
+                shared.owners.add(user)
+                print(f"Búsqueda idéntica en cola: se comparte el trabajo {shared.id}")
+                return shared
+            job = Job(user, fn, args, kwargs, key)
+            self._jobs[job.id] = job
+            self._pending.append(job)
+
+        self._dispatch()
+        return job
+
+    def get(self, job_id, user):
+        """Devuelve el trabajo solo si `user` lo sigue (sin usuario, nunca)"""
+        job = self._jobs.get(job_id)
+        if job is None or user is None or user not in job.owners:
+            return None
+        return job
+
+    def cancel(self, job, user):
+        """
+        Deja de seguir el trabajo; si nadie más lo sigue, se cancela. Devuelve
+        True si el trabajo quedó cancelado.
+        """
+        with self._lock:
+            job.owners.discard(user)
+            orphan = not job.owners
+        if orphan:
+            job.cancel()
+        return orphan
+
+    def _dispatch(self):
+        """Arranca los trabajos pendientes cuyo usuario no superó su límite"""
+        ready = []
+        with self._lock:
+            for job in list(self._pending):
+                if self._running.get(job.user, 0) < self.user_limit:
+                    self._pending.remove(job)
+                    self._running[job.user] = self._running.get(job.user, 0) + 1
+                    ready.append(job)
+        for job in ready:
+            if self.inline:
+                self._run(job)
+            else:
+                self._pool.submit(self._run, job)
+
+    def _run(self, job):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.report("started")
+            result = job.fn(*job.args, progress=job.report, **job.kwargs)
+        except JobCancelled:
+            outcome, details = "cancelled", {}
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            outcome, details = "error", {"error": job.error}
+        else:
+            job.result = result
+            outcome, details = "done", {"result": result}
+        job.finished_at = time.time()
+        job.fn = job.args = job.kwargs = None
+        job.report(outcome, **details)
+        with self._lock:
+            self._running[job.user] -= 1
+        self._dispatch()
+
+    def _expire(self):
+        """Olvida los trabajos terminados hace más de `ttl` segundos"""
+        limit = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at < limit]:
+            del self._jobs[job_id]
+
+
+def sse_events(job, keepalive=JOB_STREAM_KEEPALIVE):
+    """
+    Eventos del trabajo en formato Server-Sent Events hasta la etapa final.
+    Sin novedades se envía un comentario keep-alive para que los proxies no
+    corten la conexión (y para notar si el cliente se fue).
+    """
+    cursor = 0
+    while True:
+        events = job.wait_events(cursor, keepalive)
+        for event in events:
+            cursor = event["seq"]
+            yield f"event: {event['stage']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        if job.finished and cursor == job.last_seq:
+            return
+        if not events:
+            yield ": keep-alive\n\n"
+
+
+class _EventStream:
+    """Iterable WSGI que libera su cupo al cerrarse, aunque nunca se haya leído"""
+
+    def __init__(self, events, release):
+        self._events = events
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._events)
+
+    def close(self):
+        self._events.close()
+        if self._release is not None:
+            self._release()
+            self._release = None
+
+
+_stream_slots = threading.BoundedSemaphore(max(1, JOB_STREAM_LIMIT))
+
+
+def open_event_stream(job):
+    """
+    Stream SSE del trabajo, o None si ya hay JOB_STREAM_LIMIT abiertos (el
+    cliente puede consultar /jobs/<id> mientras tanto)
+    """
+    if not _stream_slots.acquire(blocking=False):
+        return None
+    return _EventStream(sse_events(job), _stream_slots.release)
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Gestor de trabajos del proceso"""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager()
+        return _job_manager
@@ -0,0 +1,95 @@
+"""
+Gestor del modelo de embeddings.
+
+Cargar SentenceTransformer cuesta varios segundos y cientos de MB, así que
+cada modelo se carga una sola vez por proceso worker y se comparte entre
+peticiones (y entre la versión completa y la ligera). `warm_up()` se llama
+desde gunicorn al arrancar cada worker para que la primera búsqueda no pague
+la carga.
+"""
+import os
+import threading
+import time
+
+try:
+    from projectAron.config import MODEL_THREADS
+except ImportError:
+    from config import MODEL_THREADS
+
+
+# Alternativas probadas: "paraphrase-MiniLM-L6-v2", "BAAI/bge-large-en"
+# MPNet captura relaciones semánticas más detalladas
+MODEL_NAME = os.environ.get('ARON_MODEL_NAME', "sentence-transformers/all-MPNet-base-v2")
+
+_models = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def _rss_mb():
+    """Memoria residente actual del proceso en MB (0 si no se puede medir)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except Exception:
+        return 0
+
+
+def get_model(name=None):
+    """
+    Devuelve el modelo `name` (por defecto ARON_MODEL_NAME), cargándolo la
+    primera vez que se pide en este proceso. Lanza ImportError si
+    sentence_transformers no está instalado.
+    """
+    name = name or MODEL_NAME
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _models.get(name)
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            import torch
+
+            if MODEL_THREADS:
+                # Solo si se pidió explícitamente; si no, torch usa todos los núcleos
+                torch.set_num_threads(max(1, MODEL_THREADS))
+            rss_before = _rss_mb()
+            start = time.time()
+            model = SentenceTransformer(name)
+            _stats[name] = {
+                "model": name,
+                "pid": os.getpid(),
+                "load_seconds": round(time.time() - start, 2),
+                "memory_mb": round(_rss_mb() - rss_before, 1),
+                "max_seq_length": getattr(model, 'max_seq_length', None),
+                "warm": False,
+            }
+            print(f"Modelo {name} cargado en {_stats[name]['load_seconds']}s "
+                  f"(+{_stats[name]['memory_mb']} MB, pid {os.getpid()})")
+            _models[name] = model
+    return model
+
+
+def warm_up(name=None):
+    """Carga el modelo y ejecuta un encode de prueba para inicializar los kernels"""
+    name = name or MODEL_NAME
+    model = get_model(name)
+    start = time.time()
+    model.encode(["warm up"], convert_to_tensor=True)
+    _stats[name]["warm"] = True
+    _stats[name]["warm_up_seconds"] = round(time.time() - start, 2)
+    return model
+
+
+def model_stats():
+    """Tiempo de carga y memoria de los modelos cargados en este proceso"""
+    return list(_stats.values())
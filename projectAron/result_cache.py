@@ -0,0 +1,136 @@
+"""
+Cache de rankings de búsquedas.
+
+Los reclutadores suelen repetir la misma descripción de puesto contra las
+mismas hojas (por ejemplo, cambiando solo top_n). Cada ranking se guarda en
+SQLite (modo WAL, compartido por todos los workers) con una clave que combina
+planilla, hojas ordenadas, hash de la descripción normalizada, modelo y
+puntuación usados, y la versión del corpus: la secuencia de (fila, hash de
+texto) de los candidatos. Si cambia una fila o el texto de un CV cambia la
+versión, así que la entrada vieja deja de coincidir y se borra al guardar la
+nueva.
+
+Se guarda el ranking completo (hasta ARON_RESULT_DEPTH posiciones), de modo
+que cualquier top_n menor o igual se responde sin volver a puntuar.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    from projectAron.config import CACHE_DIR
+    from projectAron.embedding_store import text_hash
+except ImportError:
+    from config import CACHE_DIR
+    from embedding_store import text_hash
+
+
+RESULT_CACHE_PATH = os.environ.get('ARON_RESULT_CACHE', os.path.join(CACHE_DIR, 'search_results.sqlite3'))
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('ARON_RESULT_CACHE_MAX_ENTRIES', 500))
+# Posiciones del ranking que se calculan y guardan por búsqueda
+RESULT_DEPTH = int(os.environ.get('ARON_RESULT_DEPTH', 1000))
+
+
+def _digest(values):
+    return hashlib.sha256(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def corpus_version(keys, text_hashes):
+    """Versión del corpus: filas (hoja, clave) en orden y el hash del texto de cada una"""
+    return _digest([[list(key), hash_] for key, hash_ in zip(keys, text_hashes)])
+
+
+def query_key(spreadsheet_id, sheet_names, job_description, scorer):
+    """Identidad de la consulta sin la versión del corpus"""
+    return _digest([spreadsheet_id, sorted(sheet_names), text_hash(job_description), scorer])
+
+
+class ResultCache:
+    """Mapa persistente (consulta, versión del corpus) -> ranking [(posición, puntuación)]"""
+
+    def __init__(self, path=RESULT_CACHE_PATH, max_entries=RESULT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_results ("
+                " query TEXT NOT NULL,"
+                " version TEXT NOT NULL,"
+                " ranking TEXT NOT NULL,"
+                " complete INTEGER NOT NULL,"
+                " report TEXT,"
+                " used_at REAL NOT NULL,"
+                " PRIMARY KEY (query, version))"
+            )
+
+    def _connection(self):
+        """Una conexión por hilo; sqlite3 no permite compartirlas entre hilos"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, query, version, top_n):
+        """
+        Devuelve (ranking[:top_n], informe), o None si no hay entrada o si la
+        guardada es más corta que top_n sin cubrir a todos los candidatos.
+        """
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT ranking, complete, report FROM search_results WHERE query = ? AND version = ?",
+                (query, version),
+            ).fetchone()
+            if row is None:
+                return None
+            ranking = [tuple(item) for item in json.loads(row[0])]
+            if len(ranking) < top_n and not row[1]:
+                return None
+            conn.execute(
+                "UPDATE search_results SET used_at = ? WHERE query = ? AND version = ?",
+                (time.time(), query, version),
+            )
+        return ranking[:top_n], json.loads(row[2]) if row[2] else None
+
+    def put(self, query, version, ranking, complete, report=None):
+        """Guarda el ranking y borra las versiones anteriores de la misma consulta"""
+        with self._connection() as conn:
+            conn.execute("DELETE FROM search_results WHERE query = ? AND version != ?", (query, version))
+            conn.execute(
+                "INSERT OR REPLACE INTO search_results (query, version, ranking, complete, report, used_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (query, version, json.dumps([[int(p), float(s)] for p, s in ranking]),
+                 int(bool(complete)), json.dumps(report) if report else None, time.time()),
+            )
+            conn.execute(
+                "DELETE FROM search_results WHERE rowid IN ("
+                " SELECT rowid FROM search_results ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM search_results")
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Cache de rankings compartida por el proceso"""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache()
+        return _result_cache
@@ -0,0 +1,155 @@
+"""
+Cache de metadatos de planillas (lista de hojas) para /get_sheets.
+
+El formulario consulta las hojas mientras el usuario escribe el ID, así que
+la misma planilla se pide muchas veces seguidas. Cada entrada vive
+ARON_SHEETS_TTL segundos; al vencer se revalida con el `modifiedTime` de
+Drive (una llamada liviana) y solo se vuelve a abrir la planilla si cambió.
+Las consultas idénticas en curso se agrupan en una sola, y los fallos (IDs a
+medio escribir) se recuerdan unos segundos para no repetirlos en cada tecla.
+Al guardar se purgan las entradas vencidas (las válidas se conservan un TTL
+más para revalidarlas) y el total se limita a ARON_SHEETS_MAX_ENTRIES,
+descartando las menos usadas.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+SHEETS_TTL = int(os.environ.get('ARON_SHEETS_TTL', 60))
+SHEETS_NEGATIVE_TTL = int(os.environ.get('ARON_SHEETS_NEGATIVE_TTL', 15))
+SHEETS_MAX_ENTRIES = int(os.environ.get('ARON_SHEETS_MAX_ENTRIES', 256))
+
+
+def _etag(spreadsheet_id, sheets):
+    payload = json.dumps([spreadsheet_id, sheets], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:20]
+
+
+def drive_modified_time(service, spreadsheet_id):
+    """Fecha de modificación de la planilla según Drive"""
+    metadata = service.files().get(
+        fileId=spreadsheet_id, fields="modifiedTime", supportsAllDrives=True
+    ).execute()
+    return metadata.get("modifiedTime")
+
+
+class _Pending:
+    """Consulta en curso a la que se suman las peticiones idénticas"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class SpreadsheetMetadataCache:
+    """
+    Mapa planilla -> {"id", "sheets", "modified_time", "etag"} con TTL,
+    revalidación contra Drive y agrupación de consultas concurrentes.
+    """
+
+    def __init__(self, ttl=SHEETS_TTL, negative_ttl=SHEETS_NEGATIVE_TTL, max_entries=SHEETS_MAX_ENTRIES):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, load, modified_time=None):
+        """
+        Devuelve la entrada de `key`. `load(key)` abre la planilla y devuelve
+        (id, hojas, modifiedTime); `modified_time(id)` consulta solo la fecha
+        de modificación para revalidar una entrada vencida.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if time.time() < entry["expires"]:
+                    return entry
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._pending[key] = _Pending()
+
+        if not leader:
+            pending.event.wait()
+            return pending.result
+
+        try:
+            pending.result = self._resolve(key, entry, load, modified_time)
+            return pending.result
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            pending.event.set()
+
+    def _resolve(self, key, entry, load, modified_time):
+        now = time.time()
+        if entry is not None and entry["sheets"] and entry["modified_time"] and modified_time:
+            try:
+                current = modified_time(entry["id"])
+            except Exception as e:
+                print(f"No se pudo revalidar la planilla {key}: {e}")
+                current = None
+            if current == entry["modified_time"]:
+                entry = dict(entry, expires=now + self.ttl)
+                self._store(key, entry)
+                return entry
+
+        try:
+            spreadsheet_id, sheets, modified = load(key)
+            entry = {
+                "id": spreadsheet_id,
+                "sheets": list(sheets),
+                "modified_time": modified,
+                "etag": _etag(spreadsheet_id, list(sheets)),
+                "expires": now + (self.ttl if sheets else self.negative_ttl),
+            }
+        except Exception as e:
+            print(f"Error al obtener las hojas de {key}: {e}")
+            entry = {
+                "id": None,
+                "sheets": [],
+                "modified_time": None,
+                "etag": None,
+                "error": str(e),
+                "expires": now + self.negative_ttl,
+            }
+        self._store(key, entry)
+        return entry
+
+    def _store(self, key, entry):
+        now = time.time()
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            # Fallos vencidos y planillas vencidas hace más de un TTL (ya no se revalidan)
+            expired = [
+                cached_key for cached_key, cached in self._entries.items()
+                if now >= cached["expires"] + (self.ttl if cached["sheets"] else 0)
+            ]
+            for cached_key in expired:
+                del self._entries[cached_key]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Olvida una planilla (o todas)"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+_metadata_cache = SpreadsheetMetadataCache()
+
+
+def get_metadata_cache():
+    """Cache de metadatos de planillas del proceso"""
+    return _metadata_cache
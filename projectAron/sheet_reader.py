@@ -0,0 +1,139 @@
+"""
+Lectura en bloque de las hojas de candidatos.
+
+En lugar de abrir la planilla y descargar cada hoja completa por separado
+(~3 llamadas por hoja y todas las columnas), se abre la planilla una vez, se
+piden las filas de encabezado de todas las hojas en un `values.batchGet` y
+luego, en un segundo `batchGet`, solo las columnas esperadas de todas las
+hojas. Las filas se arman con un índice de columnas precalculado por hoja.
+"""
+try:
+    from gspread.exceptions import APIError
+except ImportError:  # gspread muy antiguo
+    APIError = Exception
+
+
+def open_spreadsheet(client, spreadsheet_name):
+    """Abre la planilla por ID y, si falla, por nombre"""
+    try:
+        return client.open_by_key(spreadsheet_name)
+    except Exception:
+        return client.open(spreadsheet_name)
+
+
+def _quote(sheet_name):
+    """Nombre de hoja citado para notación A1 (las comillas simples se duplican)"""
+    return "'" + sheet_name.replace("'", "''") + "'"
+
+
+def _column_letter(index):
+    """Índice de columna base 0 a letra A1 (0 -> A, 26 -> AA)"""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _column_runs(indices):
+    """Agrupa índices de columna en tramos contiguos [(inicio, fin)]"""
+    runs = []
+    for index in sorted(set(indices)):
+        if runs and index == runs[-1][1] + 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return [tuple(run) for run in runs]
+
+
+def _value_ranges(response):
+    return response.get('valueRanges', []) if response else []
+
+
+def read_header_rows(spreadsheet, sheet_names):
+    """
+    Devuelve {hoja: fila de encabezados} en un único batchGet. Si la llamada
+    falla (p. ej. una hoja no existe), se reintenta hoja por hoja para que
+    solo se omita la hoja problemática.
+    """
+    ranges = [f"{_quote(name)}!1:1" for name in sheet_names]
+    try:
+        value_ranges = _value_ranges(spreadsheet.values_batch_get(ranges))
+        return {
+            name: (value_range.get('values') or [[]])[0]
+            for name, value_range in zip(sheet_names, value_ranges)
+        }
+    except APIError as e:
+        print(f"Lectura en bloque de encabezados falló ({e}), leyendo hoja por hoja")
+
+    headers = {}
+    for name, a1_range in zip(sheet_names, ranges):
+        try:
+            value_ranges = _value_ranges(spreadsheet.values_batch_get([a1_range]))
+            headers[name] = (value_ranges[0].get('values') or [[]])[0] if value_ranges else []
+        except APIError as e:
+            print(f"Error procesando hoja {name}: {e}")
+    return headers
+
+
+def read_sheet_columns(spreadsheet, sheet_names, expected_headers):
+    """
+    Devuelve {hoja: filas} donde cada fila trae solo los valores de
+    `expected_headers`, en ese orden. Las hojas vacías o a las que les faltan
+    encabezados se omiten con una advertencia.
+    """
+    headers = read_header_rows(spreadsheet, sheet_names)
+
+    # Índice de columna de cada encabezado esperado, por hoja
+    layouts = {}
+    for name in sheet_names:
+        header_row = headers.get(name)
+        if not header_row:
+            continue  # Hoja vacía o ilegible
+        positions = {}
+        for index, header in enumerate(header_row):
+            positions.setdefault(header, index)
+        missing_headers = [h for h in expected_headers if h not in positions]
+        if missing_headers:
+            print(f"Advertencia: La hoja '{name}' no tiene algunos encabezados esperados: {missing_headers}")
+            continue
+        layouts[name] = [positions[h] for h in expected_headers]
+
+    if not layouts:
+        return {}
+
+    # Un solo batchGet con los tramos de columnas necesarios de todas las hojas
+    ranges = []
+    range_owners = []
+    for name, header_indices in layouts.items():
+        for first, last in _column_runs(header_indices):
+            ranges.append(f"{_quote(name)}!{_column_letter(first)}2:{_column_letter(last)}")
+            range_owners.append((name, first))
+    try:
+        response = spreadsheet.values_batch_get(ranges, params={'majorDimension': 'COLUMNS'})
+    except APIError as e:
+        print(f"Error leyendo las columnas de las hojas: {e}")
+        return {}
+
+    columns = {name: {} for name in layouts}
+    for (name, first), value_range in zip(range_owners, _value_ranges(response)):
+        for offset, values in enumerate(value_range.get('values', [])):
+            columns[name][first + offset] = values
+
+    rows_by_sheet = {}
+    for name, header_indices in layouts.items():
+        sheet_columns = columns[name]
+        projected = [sheet_columns.get(index, []) for index in header_indices]
+        row_count = max((len(values) for values in projected), default=0)
+        rows_by_sheet[name] = [
+            [values[row] if row < len(values) else "" for values in projected]
+            for row in range(row_count)
+        ]
+    return rows_by_sheet
+
+
+def read_candidate_rows(spreadsheet, sheet_names, expected_headers):
+    """Filas de todas las hojas seleccionadas, concatenadas en su orden"""
+    rows_by_sheet = read_sheet_columns(spreadsheet, sheet_names, expected_headers)
+    return [row for name in sheet_names for row in rows_by_sheet.get(name, [])]
@@ -0,0 +1,383 @@
+"""
+Sincronización incremental de las hojas de candidatos.
+
+Cada fila recibe una identidad estable (hoja + hash del E-mail/idResume, o
+del contenido si no tiene ninguno) y una huella de su contenido. Una
+instantánea local en SQLite guarda ambas, así que en cada búsqueda solo se
+procesan las filas agregadas, modificadas o eliminadas. Si Drive informa que
+la planilla no cambió desde la última sincronización ni siquiera se leen las
+hojas. Los archivos que dejan de estar referenciados se invalidan en las
+caches de descargas y de textos, y los textos obsoletos se informan para
+sacarlos del índice de embeddings.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+try:
+    from projectAron.config import CACHE_DIR
+    from projectAron.document_cache import get_document_cache
+    from projectAron.sheet_reader import read_sheet_columns
+    from projectAron.text_store import get_text_store
+except ImportError:
+    from config import CACHE_DIR
+    from document_cache import get_document_cache
+    from sheet_reader import read_sheet_columns
+    from text_store import get_text_store
+
+
+SHEET_SNAPSHOT_PATH = os.environ.get('ARON_SHEET_SNAPSHOT', os.path.join(CACHE_DIR, 'sheet_snapshot.sqlite3'))
+
+# Columnas que identifican a un candidato, en orden de preferencia
+ROW_KEY_HEADERS = ("E-mail", "idResume")
+FILE_ID_HEADERS = ("idResume", "idInformation")
+
+# rows: filas actuales de las hojas sincronizadas, en orden
+# keys: (hoja, clave) de cada fila; text_hashes: hash del texto combinado
+# guardado en la instantánea (None si la fila es nueva o cambió)
+SyncResult = namedtuple('SyncResult', [
+    'spreadsheet_id', 'rows', 'keys', 'text_hashes',
+    'added', 'changed', 'removed', 'stale_text_hashes', 'from_snapshot',
+])
+
+
+def _digest(values):
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def row_fingerprint(row):
+    """Huella del contenido de una fila"""
+    return _digest(list(row))
+
+
+def row_keys(rows, headers):
+    """
+    Clave estable de cada fila: hash del primer campo de ROW_KEY_HEADERS que
+    tenga valor, o del contenido completo. Las claves repetidas dentro de la
+    hoja se desambiguan por orden de aparición.
+    """
+    positions = [headers.index(h) for h in ROW_KEY_HEADERS if h in headers]
+    seen = {}
+    keys = []
+    for row in rows:
+        identity = next(
+            ((headers[i], row[i].strip().lower()) for i in positions if row[i].strip()),
+            None,
+        )
+        key = _digest(identity) if identity else "row:" + row_fingerprint(row)
+        seen[key] = seen.get(key, 0) + 1
+        keys.append(key if seen[key] == 1 else f"{key}#{seen[key]}")
+    return keys
+
+
+class SheetSnapshot:
+    """Última versión sincronizada de cada fila, por planilla y hoja"""
+
+    def __init__(self, path=SHEET_SNAPSHOT_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sheet_rows ("
+                " spreadsheet_id TEXT NOT NULL,"
+                " sheet TEXT NOT NULL,"
+                " row_key TEXT NOT NULL,"
+                " position INTEGER NOT NULL,"
+                " fingerprint TEXT NOT NULL,"
+                " row_json TEXT NOT NULL,"
+                " resume_id TEXT,"
+                " info_id TEXT,"
+                " text_hash TEXT,"
+                " PRIMARY KEY (spreadsheet_id, sheet, row_key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sheet_rows_resume ON sheet_rows (resume_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sheet_rows_info ON sheet_rows (info_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sheet_rows_text ON sheet_rows (text_hash)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sheet_state ("
+                " spreadsheet_id TEXT NOT NULL,"
+                " sheet TEXT NOT NULL,"
+                " headers TEXT NOT NULL,"
+                " modified_time TEXT,"
+                " synced_at REAL NOT NULL,"
+                " PRIMARY KEY (spreadsheet_id, sheet))"
+            )
+
+    def _connection(self):
+        """Una conexión por hilo; sqlite3 no permite compartirlas entre hilos"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def state(self, spreadsheet_id, sheet):
+        """(encabezados, modifiedTime) de la última sincronización, o None"""
+        row = self._connection().execute(
+            "SELECT headers, modified_time FROM sheet_state WHERE spreadsheet_id = ? AND sheet = ?",
+            (spreadsheet_id, sheet),
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def load(self, spreadsheet_id, sheet):
+        """{clave: (huella, fila, text_hash)} en el orden de la hoja"""
+        rows = self._connection().execute(
+            "SELECT row_key, fingerprint, row_json, text_hash FROM sheet_rows"
+            " WHERE spreadsheet_id = ? AND sheet = ? ORDER BY position",
+            (spreadsheet_id, sheet),
+        )
+        return {key: (fingerprint, json.loads(row_json), hash_) for key, fingerprint, row_json, hash_ in rows}
+
+    def apply(self, spreadsheet_id, sheet, headers, modified_time, rows, keys, upserts, removed, text_hashes=None):
+        """
+        Guarda las filas nuevas o modificadas, borra las eliminadas y actualiza
+        posiciones. `text_hashes` conserva el hash del texto de las filas
+        modificadas cuyos archivos no cambiaron.
+        """
+        text_hashes = text_hashes or {}
+        resume_index = headers.index("idResume") if "idResume" in headers else None
+        info_index = headers.index("idInformation") if "idInformation" in headers else None
+        upserts = set(upserts)
+        with self._connection() as conn:
+            conn.executemany(
+                "DELETE FROM sheet_rows WHERE spreadsheet_id = ? AND sheet = ? AND row_key = ?",
+                [(spreadsheet_id, sheet, key) for key in removed],
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO sheet_rows"
+                " (spreadsheet_id, sheet, row_key, position, fingerprint, row_json, resume_id, info_id, text_hash)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (spreadsheet_id, sheet, key, position, row_fingerprint(row), json.dumps(row, ensure_ascii=False),
+                     row[resume_index] if resume_index is not None else None,
+                     row[info_index] if info_index is not None else None,
+                     text_hashes.get(key))
+                    for position, (key, row) in enumerate(zip(keys, rows)) if key in upserts
+                ],
+            )
+            conn.executemany(
+                "UPDATE sheet_rows SET position = ?"
+                " WHERE spreadsheet_id = ? AND sheet = ? AND row_key = ? AND position != ?",
+                [(position, spreadsheet_id, sheet, key, position)
+                 for position, key in enumerate(keys) if key not in upserts],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO sheet_state (spreadsheet_id, sheet, headers, modified_time, synced_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (spreadsheet_id, sheet, json.dumps(headers), modified_time, time.time()),
+            )
+
+    def set_text_hashes(self, spreadsheet_id, items):
+        """Registra el hash del texto combinado de filas (hoja, clave, hash)"""
+        with self._connection() as conn:
+            conn.executemany(
+                "UPDATE sheet_rows SET text_hash = ? WHERE spreadsheet_id = ? AND sheet = ? AND row_key = ?",
+                [(hash_, spreadsheet_id, sheet, key) for sheet, key, hash_ in items],
+            )
+
+    def spreadsheet_ids(self):
+        """Planillas sincronizadas alguna vez"""
+        rows = self._connection().execute("SELECT DISTINCT spreadsheet_id FROM sheet_state")
+        return {row[0] for row in rows}
+
+    def sheets(self, spreadsheet_id, headers):
+        """Hojas de una planilla sincronizadas con esos encabezados"""
+        rows = self._connection().execute(
+            "SELECT sheet FROM sheet_state WHERE spreadsheet_id = ? AND headers = ?",
+            (spreadsheet_id, json.dumps(headers)),
+        )
+        return [row[0] for row in rows]
+
+    def version(self, spreadsheet_id):
+        """Marca de la última sincronización con cambios de cualquier hoja de la planilla"""
+        row = self._connection().execute(
+            "SELECT MAX(synced_at), COUNT(*) FROM sheet_state WHERE spreadsheet_id = ?", (spreadsheet_id,)
+        ).fetchone()
+        return [row[0], row[1]] if row and row[0] is not None else None
+
+    def column_values(self, spreadsheet_id, header):
+        """Valores de una columna en todas las hojas sincronizadas de la planilla"""
+        conn = self._connection()
+        values = []
+        for sheet, headers in conn.execute(
+            "SELECT sheet, headers FROM sheet_state WHERE spreadsheet_id = ? ORDER BY sheet", (spreadsheet_id,)
+        ).fetchall():
+            headers = json.loads(headers)
+            if header not in headers:
+                continue
+            index = headers.index(header)
+            for (row_json,) in conn.execute(
+                "SELECT row_json FROM sheet_rows WHERE spreadsheet_id = ? AND sheet = ? ORDER BY position",
+                (spreadsheet_id, sheet),
+            ):
+                values.append(json.loads(row_json)[index])
+        return values
+
+    def find_row(self, spreadsheet_id, identifier):
+        """
+        Fila (hoja, encabezados, fila, text_hash) de un candidato buscado por
+        E-mail o idResume, o None si no está en la instantánea
+        """
+        identifier = identifier.strip()
+        keys = [_digest([header, identifier.lower()]) for header in ROW_KEY_HEADERS]
+        row = self._connection().execute(
+            "SELECT r.sheet, s.headers, r.row_json, r.text_hash FROM sheet_rows r"
+            " JOIN sheet_state s ON s.spreadsheet_id = r.spreadsheet_id AND s.sheet = r.sheet"
+            " WHERE r.spreadsheet_id = ? AND (r.row_key IN (?, ?) OR r.resume_id = ?)"
+            " ORDER BY r.sheet, r.position LIMIT 1",
+            (spreadsheet_id, keys[0], keys[1], identifier),
+        ).fetchone()
+        return (row[0], json.loads(row[1]), json.loads(row[2]), row[3]) if row else None
+
+    def rows_referencing(self, file_ids):
+        """Filas (planilla, hoja, clave, idResume, idInformation, text_hash) que usan esos archivos"""
+        conn = self._connection()
+        found = {}
+        for file_id in file_ids:
+            rows = conn.execute(
+                "SELECT spreadsheet_id, sheet, row_key, resume_id, info_id, text_hash FROM sheet_rows"
+                " WHERE resume_id = ? OR info_id = ?",
+                (file_id, file_id),
+            )
+            for row in rows:
+                found[row[:3]] = row
+        return list(found.values())
+
+    def unreferenced_file_ids(self, file_ids):
+        """Los ids de Drive que ya no aparecen en ninguna fila"""
+        conn = self._connection()
+        return {
+            file_id for file_id in file_ids
+            if not conn.execute(
+                "SELECT 1 FROM sheet_rows WHERE resume_id = ? OR info_id = ? LIMIT 1", (file_id, file_id)
+            ).fetchone()
+        }
+
+    def unreferenced_text_hashes(self, hashes):
+        """Los hashes de texto que ya no corresponden a ninguna fila"""
+        conn = self._connection()
+        return {
+            hash_ for hash_ in hashes
+            if not conn.execute("SELECT 1 FROM sheet_rows WHERE text_hash = ? LIMIT 1", (hash_,)).fetchone()
+        }
+
+
+_sheet_snapshot = None
+_sheet_snapshot_lock = threading.Lock()
+
+
+def get_sheet_snapshot():
+    """Instantánea de hojas compartida por el proceso"""
+    global _sheet_snapshot
+    with _sheet_snapshot_lock:
+        if _sheet_snapshot is None:
+            _sheet_snapshot = SheetSnapshot()
+        return _sheet_snapshot
+
+
+def invalidate_files(file_ids):
+    """Saca archivos de Drive de las caches de textos y de descargas"""
+    text_store = get_text_store()
+    document_cache = get_document_cache()
+    for file_id in file_ids:
+        for version in text_store.versions(file_id):
+            document_cache.invalidate(file_id, version)
+        text_store.invalidate(file_id)
+
+
+def sync_sheets(spreadsheet, sheet_names, expected_headers, modified_time=None, snapshot=None):
+    """
+    Devuelve un SyncResult con las filas actuales de `sheet_names`. Si
+    `modified_time` coincide con el de la última sincronización de todas las
+    hojas, las filas salen de la instantánea sin leer la planilla.
+    """
+    snapshot = snapshot or get_sheet_snapshot()
+    spreadsheet_id = spreadsheet.id
+
+    states = {name: snapshot.state(spreadsheet_id, name) for name in sheet_names}
+    if modified_time and all(
+        state is not None and state[0] == expected_headers and state[1] == modified_time
+        for state in states.values()
+    ):
+        rows, keys, hashes = [], [], []
+        for name in sheet_names:
+            for key, (_, row, hash_) in snapshot.load(spreadsheet_id, name).items():
+                rows.append(row)
+                keys.append((name, key))
+                hashes.append(hash_)
+        print(f"Planilla sin cambios desde la última sincronización: {len(rows)} filas desde la instantánea")
+        return SyncResult(spreadsheet_id, rows, keys, hashes, [], [], [], set(), True)
+
+    start = time.time()
+    rows_by_sheet = read_sheet_columns(spreadsheet, sheet_names, expected_headers)
+    rows, keys, hashes = [], [], []
+    added, changed, removed = [], [], []
+    old_file_ids, old_text_hashes = set(), set()
+    file_indices = [expected_headers.index(h) for h in FILE_ID_HEADERS if h in expected_headers]
+
+    for name in sheet_names:
+        if name not in rows_by_sheet:
+            continue  # Hoja ilegible: no se interpreta como si se hubieran borrado sus filas
+        sheet_rows = rows_by_sheet[name]
+        sheet_keys = row_keys(sheet_rows, expected_headers)
+        state = states.get(name)
+        previous = snapshot.load(spreadsheet_id, name) if state and state[0] == expected_headers else {}
+
+        upserts = []
+        carried = {}
+        for key, row in zip(sheet_keys, sheet_rows):
+            old = previous.get(key)
+            if old is None:
+                added.append((name, key))
+                upserts.append(key)
+                hashes.append(None)
+            elif old[0] != row_fingerprint(row):
+                changed.append((name, key))
+                upserts.append(key)
+                if [old[1][i] for i in file_indices] == [row[i] for i in file_indices]:
+                    # Solo cambiaron otras columnas (Stage, teléfono...): el texto es el mismo
+                    hashes.append(old[2])
+                    if old[2]:
+                        carried[key] = old[2]
+                else:
+                    hashes.append(None)
+                    old_file_ids.update(old[1][i] for i in file_indices if old[1][i])
+                    if old[2]:
+                        old_text_hashes.add(old[2])
+            else:
+                hashes.append(old[2])
+            rows.append(row)
+            keys.append((name, key))
+
+        current = set(sheet_keys)
+        sheet_removed = [key for key in previous if key not in current]
+        for key in sheet_removed:
+            _, old_row, old_hash = previous[key]
+            old_file_ids.update(old_row[i] for i in file_indices if old_row[i])
+            if old_hash:
+                old_text_hashes.add(old_hash)
+        removed.extend((name, key) for key in sheet_removed)
+
+        if upserts or sheet_removed or state is None or state[1] != modified_time:
+            snapshot.apply(spreadsheet_id, name, expected_headers, modified_time,
+                           sheet_rows, sheet_keys, upserts, sheet_removed, carried)
+
+    # Los cambios se propagan a las caches de archivos y de embeddings
+    stale_files = snapshot.unreferenced_file_ids(old_file_ids)
+    if stale_files:
+        invalidate_files(stale_files)
+    stale_text_hashes = snapshot.unreferenced_text_hashes(old_text_hashes)
+
+    print(f"Sincronización de hojas en {time.time() - start:.1f}s: {len(added)} nuevas, "
+          f"{len(changed)} modificadas, {len(removed)} eliminadas, {len(stale_files)} archivos invalidados")
+    return SyncResult(spreadsheet_id, rows, keys, hashes, added, changed, removed, stale_text_hashes, False)
@@ -0,0 +1,77 @@
+"""
+Agrupación de trabajo idéntico en curso ("single flight").
+
+Cuando varios hilos piden lo mismo a la vez (la descarga de un archivo, el
+embedding de un texto) solo el primero lo calcula; los demás esperan y
+reciben su resultado, o su excepción. Al terminar la clave se libera: no es
+una cache, de eso se encargan los almacenes persistentes.
+"""
+import threading
+
+
+class _Call:
+    """Cálculo en curso al que se suman los demás hilos"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """Registro de cálculos en curso por clave"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, keys):
+        """
+        Reparte `keys` entre las que calcula este hilo (devueltas en orden) y
+        las que ya calcula otro ({clave: cálculo en curso}). Las propias deben
+        cerrarse con `release`.
+        """
+        owned, waiting = [], {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                call = self._calls.get(key)
+                if call is None:
+                    self._calls[key] = _Call()
+                    owned.append(key)
+                else:
+                    waiting[key] = call
+        return owned, waiting
+
+    def release(self, keys, results=None, error=None):
+        """Publica el resultado (o el error) de las claves propias y las libera"""
+        with self._lock:
+            calls = [(key, self._calls.pop(key, None)) for key in keys]
+        for key, call in calls:
+            if call is None:
+                continue
+            if error is not None:
+                call.error = error
+            elif results is None or key not in results:
+                call.error = KeyError(key)
+            else:
+                call.result = results[key]
+            call.event.set()
+
+    def do(self, key, fn):
+        """Devuelve fn(), compartiendo la llamada con los pedidos simultáneos de `key`"""
+        owned, waiting = self.acquire([key])
+        if not owned:
+            return waiting[key].wait()
+        try:
+            result = fn()
+        except Exception as e:
+            self.release(owned, error=e)
+            raise
+        self.release(owned, {key: result})
+        return result
@@ -0,0 +1,165 @@
+"""
+Almacén persistente de textos extraídos.
+
+Guarda en SQLite (modo WAL, compartido por todos los workers) el texto ya
+normalizado de cada documento, indexado por id de Drive, versión del archivo
+y backend de extracción. Mientras un CV no cambia se evitan tanto la descarga
+como el parseo con PyMuPDF/python-docx.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+
+try:
+    from projectAron.config import CACHE_DIR
+except ImportError:
+    from config import CACHE_DIR
+
+
+TEXT_STORE_PATH = os.environ.get('ARON_TEXT_STORE', os.path.join(CACHE_DIR, 'extracted_text.sqlite3'))
+
+_HORIZONTAL_SPACE = re.compile(r'[^\S\n]+')
+_BLANK_LINES = re.compile(r'\n{2,}')
+
+
+def normalize_text(text):
+    """Colapsa espacios y líneas vacías para que el mismo documento dé siempre el mismo texto"""
+    if not text:
+        return ""
+    text = _HORIZONTAL_SPACE.sub(' ', text.replace('\r', '\n'))
+    text = '\n'.join(line.strip() for line in text.split('\n'))
+    return _BLANK_LINES.sub('\n', text).strip()
+
+
+class TextStore:
+    """Mapa persistente (file_id, versión, backend) -> texto normalizado"""
+
+    def __init__(self, path=TEXT_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS extracted_text ("
+                " file_id TEXT NOT NULL,"
+                " version TEXT NOT NULL,"
+                " backend TEXT NOT NULL,"
+                " text TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (file_id, version, backend))"
+            )
+            # Último cambio conocido de cada archivo (lo registra invalidate)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS file_changes ("
+                " file_id TEXT PRIMARY KEY,"
+                " changed_at REAL NOT NULL)"
+            )
+
+    def _connection(self):
+        """Una conexión por hilo; sqlite3 no permite compartirlas entre hilos"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, file_id, version, backend):
+        """Devuelve el texto guardado o None si no hay entrada para esa versión y backend"""
+        if not file_id or not version:
+            return None
+        row = self._connection().execute(
+            "SELECT text FROM extracted_text WHERE file_id = ? AND version = ? AND backend = ?",
+            (file_id, version, backend),
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, file_id, version, backend, text, verified_at=None):
+        """
+        Guarda el texto normalizado y elimina versiones anteriores del mismo
+        archivo. `verified_at` es el momento en que se leyó la versión en
+        Drive (antes de descargar), no el de la escritura.
+        """
+        if not file_id or not version:
+            return
+        with self._connection() as conn:
+            conn.execute(
+                "DELETE FROM extracted_text WHERE file_id = ? AND backend = ? AND version != ?",
+                (file_id, backend, version),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO extracted_text (file_id, version, backend, text, updated_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (file_id, version, backend, normalize_text(text), verified_at or time.time()),
+            )
+
+    def get_latest_many(self, file_ids, backend, since=0):
+        """
+        {file_id: texto} de la versión guardada de cada archivo, sin validar
+        la versión contra Drive: solo entradas verificadas después de `since`
+        y después del último cambio registrado del archivo
+        """
+        found = {}
+        unique = [file_id for file_id in dict.fromkeys(file_ids) if file_id]
+        conn = self._connection()
+        # SQLite limita el número de parámetros por consulta
+        for offset in range(0, len(unique), 500):
+            chunk = unique[offset:offset + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT t.file_id, t.text FROM extracted_text t"
+                f" LEFT JOIN file_changes c ON c.file_id = t.file_id"
+                f" WHERE t.backend = ? AND t.updated_at >= ? AND t.updated_at > COALESCE(c.changed_at, 0)"
+                f" AND t.file_id IN ({placeholders})",
+                [backend, since] + chunk,
+            )
+            found.update(rows)
+        return found
+
+    def touch(self, file_ids, verified_at):
+        """Marca las entradas de esos archivos como verificadas en `verified_at`"""
+        with self._connection() as conn:
+            conn.executemany(
+                "UPDATE extracted_text SET updated_at = MAX(updated_at, ?) WHERE file_id = ?",
+                [(verified_at, file_id) for file_id in file_ids],
+            )
+
+    def versions(self, file_id):
+        """Versiones guardadas de un archivo (para invalidar también la cache de descargas)"""
+        rows = self._connection().execute(
+            "SELECT DISTINCT version FROM extracted_text WHERE file_id = ?", (file_id,)
+        )
+        return [row[0] for row in rows]
+
+    def invalidate(self, file_id):
+        """
+        Elimina todas las versiones guardadas de un archivo y registra el
+        cambio: un texto verificado antes de ahora (p. ej. por una búsqueda
+        que leyó la versión anterior y la guarda después) no vuelve a servirse
+        sin validar su versión.
+        """
+        with self._connection() as conn:
+            conn.execute("DELETE FROM extracted_text WHERE file_id = ?", (file_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO file_changes (file_id, changed_at) VALUES (?, ?)",
+                (file_id, time.time()),
+            )
+
+
+_text_store = None
+_text_store_lock = threading.Lock()
+
+
+def get_text_store():
+    """Almacén de textos compartido por el proceso"""
+    global _text_store
+    with _text_store_lock:
+        if _text_store is None:
+            _text_store = TextStore()
+        return _text_store